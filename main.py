@@ -1,14 +1,25 @@
-import signal
+import asyncio
 from typing import Any
 
 from common_defs import *
 from config import Config
 import utils
+import change_journal
+import process_control
+import cloud_compression
 from rclone_manager import RcloneManager
+from capture_uploader import CaptureUploader
+from path_scanner import scan_syncpath
+from loop_monitor import LoopMonitor
+from sync_history import SyncHistory
+from target_registry import TargetRegistry
+from log_reader import LogFollower, read_log
+from bandwidth_policy import BandwidthPolicy
 from sync_target import *
 
 
 class Plugin:
+    _background_tasks: set[asyncio.Task] = set()
 
     # rclone.conf Setup
 
@@ -24,13 +35,30 @@ class Plugin:
         logger.debug("Executing get_cloud_type()")
         return RcloneManager.get_cloud_type()
 
-    async def update_rclone(self):
+    async def update_rclone(self) -> dict[str, Any]:
         logger.debug("Executing update_rclone()")
-        return RcloneManager.update_rclone()
+        try:
+            updated = await RcloneManager.update_rclone()
+        except Exception as e:
+            logger.error("Failed to update rclone: %s", e)
+            return {"updated": False, "error": str(e)}
+        if updated:
+            # The binary got replaced, the daemon needs to run the new one
+            self._restart_rclone_daemon()
+        return {"updated": updated, "error": None}
 
     async def create_cloud_destination(self):
         logger.debug("Executing create_cloud_destination()")
-        return RcloneManager.create_cloud_destination()
+        return await RcloneManager.create_cloud_destination()
+
+    async def set_cloud_compression(self, enabled: bool) -> dict[str, Any]:
+        logger.debug("Executing set_cloud_compression(enabled=%s)", enabled)
+        return await cloud_compression.migrate(enabled)
+
+    async def estimate_compression(self, app_id: int) -> dict[str, Any]:
+        logger.debug("Executing estimate_compression(app_id=%d)", app_id)
+        preview = await get_sync_target(app_id).preview_files()
+        return await asyncio.to_thread(cloud_compression.estimate_compression, preview["files"])
 
     # Sync Paths
 
@@ -42,6 +70,10 @@ class Plugin:
         logger.debug("Executing set_target_filters(app_id=%d, path=%s)", app_id, paths)
         return get_sync_target(app_id).set_filters(paths)
 
+    async def preview_target_files(self, app_id: int) -> dict[str, Any]:
+        logger.debug("Executing preview_target_files(app_id=%d)", app_id)
+        return await get_sync_target(app_id).preview_files()
+
     async def get_shared_filters(self) -> list[str]:
         logger.debug("Executing get_shared_filters()")
         return GlobalSyncTarget.get_shared_filter()
@@ -52,22 +84,41 @@ class Plugin:
 
     async def get_available_filters(self) -> list[int]:
         logger.debug("Executing get_available_filters()")
-        return utils.get_available_filters()
+        return TargetRegistry.get_target_ids()
+
+    async def get_sync_targets(self) -> dict[int, dict[str, Any]]:
+        logger.debug("Executing get_sync_targets()")
+        return TargetRegistry.get_targets()
 
     async def test_syncpath(self, path: str) -> int:
         logger.debug("Executing test_syncpath(%s)", path)
-        return utils.test_syncpath(path)
+        result = await scan_syncpath(path, 9000)
+        return -1 if result["truncated"] else result["files"]
+
+    async def scan_syncpath(self, path: str) -> dict[str, Any]:
+        logger.debug("Executing scan_syncpath(%s)", path)
+        return await scan_syncpath(path)
 
     # Syncing
 
-    async def sync_local_first(self, app_id: int) -> int:
-        logger.debug("Executing sync_local_first(app_id=%d)", app_id)
+    async def sync_local_first(self, app_id: int, pid: int | None = None) -> int:
+        logger.debug("Executing sync_local_first(app_id=%d, pid=%s)", app_id, pid)
+        if pid and (app_id > 0):
+            return await GameSyncTarget(app_id).sync(RcloneSyncWinner.LOCAL, pid)
         return await self._sync(RcloneSyncWinner.LOCAL, app_id)
 
     async def sync_cloud_first(self, app_id: int) -> int:
         logger.debug("Executing sync_cloud_first(app_id=%d)", app_id)
         return await self._sync(RcloneSyncWinner.CLOUD, app_id)
 
+    async def sync_many_local_first(self, app_ids: list[int]) -> dict[int, int]:
+        logger.debug("Executing sync_many_local_first(app_ids=%s)", app_ids)
+        return await sync_many(app_ids, RcloneSyncWinner.LOCAL)
+
+    async def sync_many_cloud_first(self, app_ids: list[int]) -> dict[int, int]:
+        logger.debug("Executing sync_many_cloud_first(app_ids=%s)", app_ids)
+        return await sync_many(app_ids, RcloneSyncWinner.CLOUD)
+
     async def resync_local_first(self) -> int:
         logger.debug("Executing resync_local_first()")
         return await GlobalSyncTarget().resync(RcloneSyncWinner.LOCAL)
@@ -78,9 +129,58 @@ class Plugin:
 
     async def sync_screenshot(self, user_id: int, screenshot_url: str) -> int:
         logger.debug("Executing sync_screenshot()")
-        return await CaptureSyncTarget(
+        return await CaptureUploader.upload(
             utils.getLocalScreenshotPath(user_id, screenshot_url)
-        ).sync()
+        )
+
+    async def prefetch_saves(self, app_id: int) -> int:
+        logger.debug("Executing prefetch_saves(app_id=%d)", app_id)
+        return await GameSyncTarget(app_id).prefetch()
+
+    async def start_change_journal(self, app_id: int) -> None:
+        logger.debug("Executing start_change_journal(app_id=%d)", app_id)
+        return await GameSyncTarget(app_id).start_change_journal()
+
+    async def get_sync_progress(self, app_id: int) -> dict[str, Any] | None:
+        logger.debug("Executing get_sync_progress(app_id=%d)", app_id)
+        return get_sync_target(app_id).get_progress()
+
+    async def cancel_sync(self, app_id: int) -> int:
+        logger.debug("Executing cancel_sync(app_id=%d)", app_id)
+        return cancel_sync(app_id)
+
+    async def get_sync_queue_stats(self) -> dict[str, Any]:
+        logger.debug("Executing get_sync_queue_stats()")
+        return SyncScheduler.get_stats()
+
+    async def get_loop_stats(self) -> dict[str, Any]:
+        logger.debug("Executing get_loop_stats()")
+        return LoopMonitor.get_stats()
+
+    async def get_sync_history_stats(self, days: int = 30, group_by: str = "target") -> list[dict[str, Any]]:
+        logger.debug("Executing get_sync_history_stats(days=%d, group_by=%s)", days, group_by)
+        return await SyncHistory.get_duration_stats(days, group_by)
+
+    async def get_sync_daily_bytes(self, days: int = 30) -> list[dict[str, Any]]:
+        logger.debug("Executing get_sync_daily_bytes(days=%d)", days)
+        return await SyncHistory.get_daily_bytes(days)
+
+    async def get_sync_runs(self, app_id: int | None = None, limit: int = 50) -> list[dict[str, Any]]:
+        logger.debug("Executing get_sync_runs(app_id=%s, limit=%d)", app_id, limit)
+        target = None if app_id is None else (str(app_id) if app_id > 0 else GLOBAL_SYNC_ID)
+        return await SyncHistory.get_runs(target, limit)
+
+    async def get_bisync_stats(self) -> dict[str, Any]:
+        logger.debug("Executing get_bisync_stats()")
+        return BisyncFastPath.get_stats()
+
+    async def get_prefetch_stats(self) -> dict[str, Any]:
+        logger.debug("Executing get_prefetch_stats()")
+        return SavePrefetch.get_stats()
+
+    async def get_bandwidth_policy(self) -> dict[str, Any]:
+        logger.debug("Executing get_bandwidth_policy()")
+        return BandwidthPolicy.get_stats()
 
     async def delete_lock_files(self):
         logger.debug("Executing delete_lock_files()")
@@ -93,11 +193,15 @@ class Plugin:
 
     async def pause_process(self, pid: int) -> None:
         logger.debug("Executing pause_process(pid=%d)", pid)
-        utils.send_signal(pid, signal.SIGSTOP)
+        await asyncio.to_thread(process_control.pause, pid)
 
     async def resume_process(self, pid: int) -> None:
         logger.debug("Executing resume_process(pid=%d)", pid)
-        utils.send_signal(pid, signal.SIGCONT)
+        await asyncio.to_thread(process_control.resume, pid)
+
+    async def set_game_running(self, app_id: int, running: bool) -> None:
+        logger.debug("Executing set_game_running(app_id=%d, running=%s)", app_id, running)
+        await BandwidthPolicy.set_game_running(app_id, running)
 
     # Configuration
 
@@ -108,6 +212,11 @@ class Plugin:
     async def set_config(self, key: str, value: Any):
         logger.debug("Executing set_config(key=%s, value=%s)", key, value)
         Config.set_config(key, value)
+        if key == "additional_sync_args":
+            # These are given to the daemon as its global flags
+            self._restart_rclone_daemon()
+        elif key.startswith("bwlimit_"):
+            await BandwidthPolicy.apply()
 
     # Logger
 
@@ -131,6 +240,47 @@ class Plugin:
         logger.debug("Executing get_plugin_log()")
         return utils.get_plugin_log()
 
+    async def read_sync_log(
+        self, app_id: int, offset: int | None = None, length: int | None = None
+    ) -> dict[str, Any] | None:
+        logger.debug("Executing read_sync_log(app_id=%d, offset=%s, length=%s)", app_id, offset, length)
+        return await asyncio.to_thread(get_sync_target(app_id).read_last_sync_log, offset, length)
+
+    async def read_plugin_log(
+        self, offset: int | None = None, length: int | None = None
+    ) -> dict[str, Any]:
+        logger.debug("Executing read_plugin_log(offset=%s, length=%s)", offset, length)
+        return await asyncio.to_thread(read_log, Path(decky.DECKY_PLUGIN_LOG), offset, length)
+
+    async def follow_log(self, app_id: int | None, offset: int) -> None:
+        logger.debug("Executing follow_log(app_id=%s, offset=%d)", app_id, offset)
+        if app_id is None:
+            LogFollower.follow("plugin", lambda: Path(decky.DECKY_PLUGIN_LOG), offset)
+        else:
+            LogFollower.follow(
+                str(app_id), lambda: get_sync_target(app_id).get_last_log_path(), offset
+            )
+
+    async def unfollow_log(self, app_id: int | None) -> None:
+        logger.debug("Executing unfollow_log(app_id=%s)", app_id)
+        LogFollower.unfollow("plugin" if app_id is None else str(app_id))
+
+    def _restart_rclone_daemon(self):
+        # Restarting while syncs run would lose their jobs and run them again as a subprocess,
+        # the daemon is restarted once they are done and the syncs submitted in between wait
+
+        async def restart():
+            await SyncScheduler.hold_when_idle()
+            try:
+                await RcloneManager.start_daemon()
+                await BandwidthPolicy.apply(force=True)
+            finally:
+                SyncScheduler.release()
+
+        task = asyncio.create_task(restart())
+        Plugin._background_tasks.add(task)
+        task.add_done_callback(Plugin._background_tasks.discard)
+
     # Lifecycle
 
     async def _main(self):
@@ -140,9 +290,24 @@ class Plugin:
         logger.debug("rclone bin path: %s", RCLONE_BIN_PATH)
         logger.debug("rclone cfg path: %s", RCLONE_CFG_PATH)
 
+        LoopMonitor.start()
+        SavePrefetch.start(prefetch_likely_targets)
+        await RcloneManager.start_daemon()
+        BandwidthPolicy.start()
+
     async def _unload(self):
-        RcloneManager.kill_current_spawn()
+        for task in list(Plugin._background_tasks):
+            task.cancel()
+        await RcloneManager.kill_current_spawn()
+        change_journal.stop_all_journals()
+        await RcloneManager.stop_daemon()
+        LogFollower.unfollow_all()
+        await LoopMonitor.stop()
+        await SavePrefetch.stop()
+        await BandwidthPolicy.stop()
+        SyncHistory.close()
+        await Config.flush()
 
     async def _migration(self):
         # plugin_config.migrate()
-        pass
+        utils.migrate_state_files()
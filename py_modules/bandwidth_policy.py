@@ -0,0 +1,311 @@
+from asyncio.subprocess import Process
+from datetime import datetime
+from typing import Any
+import asyncio, re, signal, time
+
+from common_defs import *
+from config import Config
+from rclone_manager import RcloneManager
+
+BWLIMIT_CHECK_INTERVAL = 60
+# rclone terminates on SIGUSR2 until its handler is installed at startup
+BWLIMIT_SIGNAL_MIN_AGE = 2.0
+
+_SCHEDULE_ENTRY = re.compile(r"(\d\d?):(\d\d),(\S+)")
+
+
+def parse_schedule(schedule: str) -> list[tuple[int, str]]:
+    """
+    Parses a bandwidth schedule in the timetable format of rclone --bwlimit.
+
+    Parameters:
+    schedule (str): The schedule, e.g. "08:00,512k 19:00,2M 23:30,off".
+
+    Returns:
+    list[tuple[int, str]]: The minute of the day each rate starts at, in order.
+
+    Raises:
+    ValueError: If an entry is malformed.
+    """
+    entries = list()
+    for entry in schedule.split():
+        match = _SCHEDULE_ENTRY.fullmatch(entry)
+        if not match or int(match[1]) > 23 or int(match[2]) > 59:
+            raise ValueError(f"Invalid bandwidth schedule entry {entry}")
+        entries.append((int(match[1]) * 60 + int(match[2]), match[3]))
+    return sorted(entries)
+
+
+def get_scheduled_rate(schedule: str, minute: int) -> str | None:
+    """
+    Returns the rate of a schedule at a time of the day.
+
+    Parameters:
+    schedule (str): The schedule, see parse_schedule.
+    minute (int): The minute of the day.
+
+    Returns:
+    str | None: The rate, the last entry of the day applies before the first one. None if the schedule is empty.
+    """
+    entries = parse_schedule(schedule)
+    if not entries:
+        return None
+    rate = entries[-1][1]
+    for start, entry_rate in entries:
+        if start <= minute:
+            rate = entry_rate
+    return rate
+
+
+class _LimitedProcess:
+    """
+    A background rclone process started with a bandwidth limit.
+    """
+
+    def __init__(self, process: Process, rate: str):
+        self.process = process
+        self.rate = rate
+        self.limited = True
+        self.spawn_time = time.monotonic()
+
+
+class BandwidthPolicy:
+    """
+    Limits the bandwidth of the background syncs, i.e. global bisyncs, capture uploads and
+    prefetches, after "bwlimit_game_running" while a game runs, otherwise after the time of
+    day of "bwlimit_schedule" or "bwlimit_idle". Game syncs, which the user waits for, lift
+    the limit while they run, as the limit of the daemon applies to every job.
+
+    The limit is set on the rc daemon through core/bwlimit. Background rclone processes start
+    with the limit of the moment, and get it toggled on and off through SIGUSR2 afterwards,
+    as it can't be changed to another rate.
+    """
+
+    _games: set[int] = set()
+    _runs: dict[int, bool] = dict()
+    _run_seq = 0
+    _processes: dict[int, _LimitedProcess] = dict()
+    _daemon_rate: str | None = None
+    _task: asyncio.Task | None = None
+
+    @classmethod
+    def get_policy_rate(cls) -> str | None:
+        """
+        Returns the limit of the background syncs according to the settings.
+
+        Returns:
+        str | None: The rate, e.g. "512k" or "off". None if no limit is set up.
+        """
+        game_rate, schedule, idle_rate = Config.get_config_items(
+            "bwlimit_game_running", "bwlimit_schedule", "bwlimit_idle"
+        )
+        if not (game_rate or schedule or idle_rate):
+            return None
+        if cls._games and game_rate:
+            return game_rate
+
+        now = datetime.now()
+        try:
+            scheduled_rate = get_scheduled_rate(schedule, now.hour * 60 + now.minute)
+        except ValueError as e:
+            logger.warning("Ignoring the bandwidth schedule: %s", e)
+            scheduled_rate = None
+        if scheduled_rate:
+            return scheduled_rate
+        if (not cls._games) and idle_rate:
+            return idle_rate
+        return "off"
+
+    @classmethod
+    def get_rate(cls) -> str | None:
+        """
+        Returns the limit to apply right now, none while a game sync runs.
+
+        Returns:
+        str | None: The rate, None if no limit is set up.
+        """
+        rate = cls.get_policy_rate()
+        if rate and not all(cls._runs.values()):
+            return "off"
+        return rate
+
+    @classmethod
+    async def set_game_running(cls, app_id: int, running: bool):
+        """
+        Records a game launch or exit and adjusts the limit.
+
+        Parameters:
+        app_id (int): The app ID of the game.
+        running (bool): Whether the game is running.
+        """
+        if running:
+            cls._games.add(app_id)
+        else:
+            cls._games.discard(app_id)
+        await cls.apply()
+
+    @classmethod
+    async def begin(cls, background: bool) -> int:
+        """
+        Registers a sync about to start and adjusts the limit.
+        The sync is unregistered again if this gets interrupted.
+
+        Parameters:
+        background (bool): Whether it's a background sync the limit applies to.
+
+        Returns:
+        int: ID of the run.
+        """
+        cls._run_seq += 1
+        run_id = cls._run_seq
+        cls._runs[run_id] = background
+        if not background:
+            try:
+                await cls.apply()
+            except BaseException:
+                cls._runs.pop(run_id, None)
+                raise
+        return run_id
+
+    @classmethod
+    async def end(cls, run_id: int | None):
+        """
+        Unregisters a finished sync and adjusts the limit.
+
+        Parameters:
+        run_id (int | None): ID of the run, None or an unknown ID if it never got registered.
+        """
+        if cls._runs.pop(run_id, True) is False:
+            await cls.apply()
+
+    @classmethod
+    def get_process_args(cls, background: bool) -> list[str]:
+        """
+        Returns the arguments limiting an rclone process.
+
+        Parameters:
+        background (bool): Whether the process runs a background sync.
+
+        Returns:
+        list[str]: The --bwlimit argument, empty if the process isn't limited.
+        """
+        rate = cls.get_policy_rate()
+        if (not background) or (rate in (None, "off")):
+            return []
+        return ["--bwlimit", rate]
+
+    @classmethod
+    def attach(cls, process: Process, args: list[str]):
+        """
+        Records an rclone process started with a limit, so that it can be toggled.
+
+        Parameters:
+        process (Process): The rclone process.
+        args (list[str]): The arguments returned by get_process_args.
+        """
+        if args:
+            cls._processes[process.pid] = _LimitedProcess(process, args[1])
+
+    @classmethod
+    def detach(cls, process: Process):
+        """
+        Forgets an rclone process that finished.
+
+        Parameters:
+        process (Process): The rclone process.
+        """
+        cls._processes.pop(process.pid, None)
+
+    @classmethod
+    async def apply(cls, force: bool = False):
+        """
+        Applies the current limit to the rc daemon and the running background rclone processes.
+
+        Parameters:
+        force (bool): Set the limit of the daemon even if it didn't change, e.g. after a restart.
+        """
+        rate = cls.get_rate()
+        if rate is None:
+            return
+
+        if RcloneManager.daemon_available() and (force or rate != cls._daemon_rate):
+            try:
+                await RcloneManager.rc_call("core/bwlimit", {"rate": rate})
+                if rate != cls._daemon_rate:
+                    logger.info("Bandwidth limit set to %s", rate)
+                cls._daemon_rate = rate
+            except Exception as e:
+                logger.warning("Failed to set the bandwidth limit: %s", e)
+
+        for run in cls._processes.values():
+            if run.process.returncode is not None:
+                continue
+            limited = rate == run.rate
+            if (limited == run.limited) or ((rate != "off") and not limited):
+                # Only the rate the process started with can be toggled
+                continue
+            if time.monotonic() - run.spawn_time < BWLIMIT_SIGNAL_MIN_AGE:
+                continue
+            try:
+                run.process.send_signal(signal.SIGUSR2)
+                run.limited = limited
+                logger.info(
+                    "Bandwidth limit of rclone process %d toggled %s",
+                    run.process.pid,
+                    "on" if limited else "off",
+                )
+            except ProcessLookupError:
+                continue
+
+    @classmethod
+    def get_stats(cls) -> dict[str, Any]:
+        """
+        Retrieves the state of the policy.
+
+        Returns:
+        dict[str, Any]: The current "rate", the "policy_rate" of the background syncs,
+                        the "games" running, the number of syncs running ("runs") and
+                        of rclone processes started with a limit ("processes").
+        """
+        return {
+            "rate": cls.get_rate(),
+            "policy_rate": cls.get_policy_rate(),
+            "games": sorted(cls._games),
+            "runs": len(cls._runs),
+            "processes": len(cls._processes),
+        }
+
+    @classmethod
+    def start(cls):
+        """
+        Starts applying the limit periodically, which follows the schedule.
+        """
+        if cls._task:
+            return
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls):
+        """
+        Stops applying the limit periodically.
+        """
+        if not cls._task:
+            return
+        cls._task.cancel()
+        try:
+            await cls._task
+        except asyncio.CancelledError:
+            pass
+        cls._task = None
+
+    @classmethod
+    async def _run(cls):
+        """
+        Applies the limit every BWLIMIT_CHECK_INTERVAL, forcing it on the daemon in case it restarted.
+        """
+        while True:
+            try:
+                await cls.apply(force=True)
+            except Exception as e:
+                logger.error("Error applying the bandwidth limit: %s", e)
+            await asyncio.sleep(BWLIMIT_CHECK_INTERVAL)
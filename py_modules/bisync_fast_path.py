@@ -0,0 +1,206 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+import json, re
+
+from common_defs import *
+
+LISTING_HEADER = "# bisync listing v1"
+LOCAL_MODTIME_TOLERANCE = 0.001
+REMOTE_MODTIME_TOLERANCE = 1.0
+
+_NON_CANONICAL_CHARS = re.compile(r"[\s\\/:?*]")
+_CONFIG_HASH = re.compile(r"\{[0-9a-zA-Z_-]{1,10}\}")
+_LISTING_LINE = re.compile(r"(\S) +(-?\d+) \S+ \S+ (\S+) (\".*\")")
+_TIME = re.compile(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:?\d\d)")
+
+
+def get_listing_paths(path1: str, path2: str) -> tuple[Path, Path]:
+    """
+    Returns the listing files rclone bisync keeps for a pair of paths.
+
+    Parameters:
+    path1 (str): The first path, e.g. "/".
+    path2 (str): The second path, e.g. "cloud:deck-sync".
+
+    Returns:
+    tuple[Path, Path]: The listings of path1 and path2.
+    """
+    session = f"{_canonical_path(path1)}..{_canonical_path(path2)}"
+    return (
+        RCLONE_BISYNC_CACHE_DIR / f"{session}.path1.lst",
+        RCLONE_BISYNC_CACHE_DIR / f"{session}.path2.lst",
+    )
+
+
+def read_listing(path: Path) -> dict[str, tuple[int, float]] | None:
+    """
+    Reads a listing file of rclone bisync.
+
+    Parameters:
+    path (Path): The listing file.
+
+    Returns:
+    dict[str, tuple[int, float]] | None: Size and modification time by file path,
+                                         None if the listing is missing or cannot be parsed.
+    """
+    files = dict()
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            if not f.readline().startswith(LISTING_HEADER):
+                return None
+            for line in f:
+                match = _LISTING_LINE.fullmatch(line.rstrip("\n"))
+                if not match:
+                    return None
+                flags, size, modtime, quoted_path = match.groups()
+                if flags == "d":
+                    continue
+                files[json.loads(quoted_path)] = (int(size), parse_time(modtime))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.debug("Failed to read bisync listing %s: %s", path, e)
+        return None
+
+    return files
+
+
+def parse_time(text: str) -> float:
+    """
+    Parses a time written by rclone, keeping the nanoseconds Python's datetime would drop.
+
+    Parameters:
+    text (str): The time, e.g. "2024-01-31T12:00:00.123456789+0000".
+
+    Returns:
+    float: The POSIX timestamp.
+
+    Raises:
+    ValueError: If the time is malformed.
+    """
+    match = _TIME.fullmatch(text)
+    if not match:
+        raise ValueError(f"Invalid time {text}")
+    base, fraction, zone = match.groups()
+    if zone == "Z":
+        zone = "+00:00"
+    elif ":" not in zone:
+        zone = f"{zone[:3]}:{zone[3:]}"
+    return datetime.fromisoformat(base + zone).timestamp() + float(f"0.{fraction or 0}")
+
+
+def find_listing_changes(
+    listing: dict[str, tuple[int, float]],
+    current: dict[str, tuple[int, float]],
+    tolerance: float,
+) -> list[str]:
+    """
+    Compares a listing of the last bisync with the current files.
+
+    Parameters:
+    listing (dict[str, tuple[int, float]]): Size and modification time by path from the listing.
+    current (dict[str, tuple[int, float]]): Size and modification time by path now.
+    tolerance (float): Max difference of the modification times in seconds.
+
+    Returns:
+    list[str]: The paths added, removed or changed, at most a few.
+    """
+    changes = list()
+    for path in listing.keys() ^ current.keys():
+        changes.append(path)
+        if len(changes) >= 5:
+            return changes
+    for path, (size, modtime) in current.items():
+        listed = listing.get(path)
+        if listed and (listed[0] != size or abs(listed[1] - modtime) > tolerance):
+            changes.append(path)
+            if len(changes) >= 5:
+                break
+    return changes
+
+
+class BisyncFastPath:
+    """
+    Counts how often a bisync was skipped because neither side changed since the last one,
+    and estimates the time saved from the duration of the bisyncs that did run.
+    """
+
+    _checks = 0
+    _hits = 0
+    _misses: dict[str, int] = dict()
+    _check_seconds = 0.0
+    _full_runs = 0
+    _full_run_seconds = 0.0
+
+    @classmethod
+    def record_check(cls, duration: float, miss_reason: str | None = None):
+        """
+        Records a check of the fast path.
+
+        Parameters:
+        duration (float): Time the check took in seconds.
+        miss_reason (str | None): Why the bisync has to run, None if it was skipped.
+        """
+        cls._checks += 1
+        cls._check_seconds += duration
+        if miss_reason is None:
+            cls._hits += 1
+            logger.info(
+                "Bisync fast path hit in %.3fs, %d of %d checks, ~%.1fs saved so far",
+                duration,
+                cls._hits,
+                cls._checks,
+                cls.get_stats()["saved_seconds"],
+            )
+        else:
+            cls._misses[miss_reason] = cls._misses.get(miss_reason, 0) + 1
+            logger.info("Bisync fast path miss in %.3fs: %s", duration, miss_reason)
+
+    @classmethod
+    def record_full_run(cls, duration: float):
+        """
+        Records the duration of a bisync that ran.
+
+        Parameters:
+        duration (float): Time the bisync took in seconds.
+        """
+        cls._full_runs += 1
+        cls._full_run_seconds += duration
+
+    @classmethod
+    def get_stats(cls) -> dict[str, Any]:
+        """
+        Retrieves the statistics of the fast path since the plugin started.
+
+        Returns:
+        dict[str, Any]: The "checks", "hits", "misses" by reason, "hit_rate", the average
+                        "check_seconds" and "full_run_seconds", and the estimated "saved_seconds",
+                        i.e. the skipped bisyncs minus the time spent checking.
+        """
+        average_check = cls._check_seconds / cls._checks if cls._checks else 0
+        average_full_run = cls._full_run_seconds / cls._full_runs if cls._full_runs else 0
+        return {
+            "checks": cls._checks,
+            "hits": cls._hits,
+            "misses": dict(cls._misses),
+            "hit_rate": cls._hits / cls._checks if cls._checks else 0,
+            "check_seconds": average_check,
+            "full_run_seconds": average_full_run,
+            "saved_seconds": max(0.0, cls._hits * average_full_run - cls._check_seconds),
+        }
+
+
+def _canonical_path(path: str) -> str:
+    """
+    Converts a bisync path to the file name rclone uses for its session files.
+
+    Parameters:
+    path (str): The path, local or "remote:path".
+
+    Returns:
+    str: The canonical name.
+    """
+    if not path.endswith("/"):
+        path += "/"
+    return _CONFIG_HASH.sub("", _NON_CANONICAL_CHARS.sub("_", path.strip("\\/")))
@@ -0,0 +1,110 @@
+import decky
+
+from pathlib import Path
+from collections import defaultdict
+import asyncio, os
+
+from common_defs import *
+from sync_target import CaptureSyncTarget
+
+CAPTURE_DEBOUNCE_SECONDS = 2
+CAPTURE_BATCH_SIZE = 20
+CAPTURE_FILES_FROM_PATH = Path(decky.DECKY_PLUGIN_RUNTIME_DIR) / "captures.files"
+
+
+class CaptureUploader:
+    """
+    Collects the captures to be uploaded and uploads them in batches, either after no
+    new capture arrived for CAPTURE_DEBOUNCE_SECONDS or once CAPTURE_BATCH_SIZE are pending,
+    so that a burst of screenshots costs a single rclone run. Captures that failed to upload
+    stay pending and go with the next batch.
+    """
+
+    _pending: dict[str, list[asyncio.Future]] = dict()
+    _flush_timer: asyncio.TimerHandle | None = None
+    _flush_tasks: set[asyncio.Task] = set()
+    _flush_lock = asyncio.Lock()
+
+    @classmethod
+    async def upload(cls, capture_path: str) -> int:
+        """
+        Queues a capture for upload and waits for its batch to finish.
+
+        Parameters:
+        capture_path (str): Local path of the capture.
+
+        Returns:
+        int: Exit code of the upload of this capture, -1 if it cannot run.
+        """
+        future = asyncio.get_running_loop().create_future()
+        cls._pending.setdefault(capture_path, []).append(future)
+
+        if cls._flush_timer:
+            cls._flush_timer.cancel()
+        delay = 0 if len(cls._pending) >= CAPTURE_BATCH_SIZE else CAPTURE_DEBOUNCE_SECONDS
+        cls._flush_timer = asyncio.get_running_loop().call_later(delay, cls._start_flush)
+
+        return await future
+
+    @classmethod
+    def _start_flush(cls):
+        """
+        Takes over the pending captures and starts uploading them.
+        """
+        cls._flush_timer = None
+        batch, cls._pending = cls._pending, dict()
+        task = asyncio.create_task(cls._flush(batch))
+        cls._flush_tasks.add(task)
+        task.add_done_callback(cls._flush_tasks.discard)
+
+    @classmethod
+    async def _flush(cls, batch: dict[str, list[asyncio.Future]]):
+        """
+        Uploads a batch of captures with one rclone run per capture directory.
+        If a run fails, its captures are retried one by one to tell which ones failed,
+        those are pending again once their callers got the exit code.
+
+        Parameters:
+        batch (dict[str, list[asyncio.Future]]): The captures and the futures waiting for them.
+        """
+        captures_by_dir = defaultdict(list)
+        for capture_path in batch:
+            captures_by_dir[os.path.dirname(capture_path)].append(capture_path)
+
+        async with cls._flush_lock:
+            for capture_dir, capture_paths in captures_by_dir.items():
+                results = await cls._upload_dir(capture_dir, capture_paths)
+                for capture_path in capture_paths:
+                    for future in batch[capture_path]:
+                        if not future.done():
+                            future.set_result(results[capture_path])
+                    # Not retried on its own, the remote may well be unreachable for a while
+                    if results[capture_path] != 0:
+                        cls._pending.setdefault(capture_path, [])
+
+    @classmethod
+    async def _upload_dir(cls, capture_dir: str, capture_paths: list[str]) -> dict[str, int]:
+        """
+        Uploads captures of the same directory.
+
+        Parameters:
+        capture_dir (str): The directory of the captures.
+        capture_paths (list[str]): The captures.
+
+        Returns:
+        dict[str, int]: Exit code of the upload of each capture.
+        """
+        logger.info("Uploading %d captures from %s", len(capture_paths), capture_dir)
+        try:
+            if len(capture_paths) > 1:
+                with CAPTURE_FILES_FROM_PATH.open("w") as f:
+                    f.write("\n".join(os.path.basename(path) for path in capture_paths))
+                result = await CaptureSyncTarget(capture_dir, CAPTURE_FILES_FROM_PATH).sync()
+                if result == 0:
+                    return dict.fromkeys(capture_paths, 0)
+                logger.warning("Batch upload failed with exit code %d, retrying one by one", result)
+
+            return {path: await CaptureSyncTarget(path).sync() for path in capture_paths}
+        except Exception as e:
+            logger.error("Error during capture upload: %s", e)
+            return dict.fromkeys(capture_paths, -1)
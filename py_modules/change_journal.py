@@ -0,0 +1,397 @@
+import decky
+
+from pathlib import Path
+from typing import TextIO
+import asyncio, ctypes, ctypes.util, os, stat, struct
+
+from common_defs import *
+from filter_matcher import FilterMatcher
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+EVENT_HEADER = struct.Struct("iIII")
+MAX_JOURNAL_ENTRIES = 10000
+JOURNAL_DIR = Path(decky.DECKY_PLUGIN_RUNTIME_DIR) / "journals"
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+_active_journals: dict[str, "ChangeJournal"] = dict()
+
+
+class ChangeJournal:
+    """
+    Records the files written under a sync target's filter roots through inotify,
+    so that an upload only needs to look at what changed instead of the whole tree.
+
+    The journal is only usable if the local files were known to be uploaded when it
+    was started, and the watcher kept up with every change since.
+
+    Every changed path is appended to a log as it's recorded, so that the journal can be
+    resumed after the plugin is reloaded or killed, see resume().
+    """
+
+    def __init__(self, id: str, sync_root: str, matcher: FilterMatcher):
+        self._path = JOURNAL_DIR / f"{id}.files"
+        self._log_path = JOURNAL_DIR / f"{id}.log"
+        self._sync_root = sync_root
+        self._matcher = matcher
+        self._fd = -1
+        self._log: TextIO | None = None
+        self._watches: dict[int, str] = dict()
+        self._dirty_paths: set[str] = set()
+        self.valid = False
+
+    def start(self, roots: list[str], valid: bool, fingerprint: str):
+        """
+        Starts watching the roots recursively.
+
+        Parameters:
+        roots (list[str]): The local paths covered by the sync.
+        valid (bool): Whether the local files were in the cloud at this point.
+        fingerprint (str): Fingerprint of the sync target's manifest, see SyncManifest.get_fingerprint.
+        """
+        self.valid = valid
+        self._path.unlink(missing_ok=True)
+        self._log_path.unlink(missing_ok=True)
+        if not valid:
+            logger.info("Local files not uploaded yet, journal %s not started", self._path)
+            return
+
+        self._fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            logger.warning("inotify_init1 failed: %s", os.strerror(ctypes.get_errno()))
+            self.valid = False
+            return
+
+        try:
+            JOURNAL_DIR.mkdir(parents=True, exist_ok=True)
+            self._log = self._log_path.open(
+                "w", encoding="utf-8", errors="surrogateescape", buffering=1
+            )
+            self._log.write(f"{fingerprint}\n")
+        except OSError as e:
+            logger.warning("Failed to create journal log %s: %s", self._log_path, e)
+            self.valid = False
+            self.stop()
+            return
+
+        asyncio.get_running_loop().add_reader(self._fd, self._on_readable)
+        visited_dirs = set()
+        for root in roots:
+            if os.path.isdir(root):
+                self._watch_tree(root, visited_dirs, False)
+            elif os.path.isdir(os.path.dirname(root)):
+                self._add_watch(os.path.dirname(root))
+            else:
+                logger.info("Journal root %s doesn't exist", root)
+                self.valid = False
+
+        if not self.valid:
+            self.stop()
+            return
+        logger.debug("Journal %s watching %d directories", self._path, len(self._watches))
+
+    def stop(self):
+        """
+        Stops watching, the recorded paths are kept, on disk as well if the journal is still usable.
+        """
+        if self._fd >= 0:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            self._drain_events()
+            os.close(self._fd)
+            self._fd = -1
+            self._watches.clear()
+
+        if self._log:
+            self._log.close()
+            self._log = None
+        if not self.valid:
+            self._log_path.unlink(missing_ok=True)
+
+    def resume(self, roots: list[str], fingerprint: str) -> bool:
+        """
+        Loads the paths recorded by an earlier run of the plugin, adding the files changed
+        since its last record as nothing watched them in between.
+
+        Parameters:
+        roots (list[str]): The local paths covered by the sync.
+        fingerprint (str): Fingerprint of the sync target's manifest, the journal is only
+                           usable if it was started with the same one.
+
+        Returns:
+        bool: True if the journal is usable.
+        """
+        try:
+            since_ns = self._log_path.stat().st_mtime_ns
+            with self._log_path.open("r", encoding="utf-8", errors="surrogateescape") as f:
+                content = f.read()
+        except OSError:
+            return False
+
+        # A record cut short by a crash may be a prefix of the changed path
+        lines = content.split("\n")
+        self.valid = (len(lines) > 1) and (lines[0] == fingerprint) and (lines[-1] == "")
+        if self.valid:
+            for path in lines[1:-1]:
+                self._record(path)
+            self._record_changed_since(roots, since_ns)
+        if not self.valid:
+            logger.info("Journal log %s cannot be resumed", self._log_path)
+            self.discard()
+            return False
+
+        logger.info("Journal %s resumed with %d paths", self._path, len(self._dirty_paths))
+        return True
+
+    def discard(self):
+        """
+        Stops watching and deletes the log, once the journal was used for an upload.
+        """
+        self.valid = False
+        self.stop()
+
+    def get_files_from(self) -> Path | None:
+        """
+        Writes the changed files that still exist and pass the filters as a list
+        for rclone --files-from-raw.
+
+        Returns:
+        Path | None: The list file, None if the journal is not usable.
+        """
+        if not self.valid:
+            return None
+
+        files = list()
+        for path in sorted(self._dirty_paths):
+            relative_path = os.path.relpath(path, self._sync_root)
+            if os.path.isfile(path) and self._matcher.include(relative_path):
+                files.append(relative_path)
+
+        with self._path.open("w") as f:
+            f.write("\n".join(files))
+        logger.info("Journal %s lists %d changed files", self._path, len(files))
+        return self._path
+
+    def _add_watch(self, directory: str) -> bool:
+        """
+        Adds an inotify watch on a directory.
+
+        Parameters:
+        directory (str): The directory to watch.
+
+        Returns:
+        bool: True if the watch was added.
+        """
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            logger.warning(
+                "Failed to watch %s: %s", directory, os.strerror(ctypes.get_errno())
+            )
+            self.valid = False
+            return False
+
+        self._watches[wd] = directory
+        return True
+
+    def _watch_tree(self, root: str, visited_dirs: set, record_files: bool):
+        """
+        Watches a directory and everything under it, following symlinks.
+
+        Parameters:
+        root (str): The directory to watch.
+        visited_dirs (set): (device, inode) of the directories already watched.
+        record_files (bool): Whether the existing files are recorded as changed,
+                             for directories created or moved in while watching.
+        """
+        pending_dirs = [root]
+        while pending_dirs and self.valid:
+            current_dir = pending_dirs.pop()
+            try:
+                st = os.stat(current_dir)
+                if ((st.st_dev, st.st_ino) in visited_dirs) or (not self._add_watch(current_dir)):
+                    continue
+                visited_dirs.add((st.st_dev, st.st_ino))
+                with os.scandir(current_dir) as it:
+                    for entry in it:
+                        if entry.is_dir():
+                            pending_dirs.append(entry.path)
+                        elif record_files:
+                            self._record(entry.path)
+            except OSError as e:
+                logger.debug("Failed to watch %s: %s", current_dir, e)
+
+    def _record_changed_since(self, roots: list[str], since_ns: int):
+        """
+        Records the files under the roots changed or moved in since a point in time.
+        A directory whose entries changed since has all of its files recorded, as the
+        files of a directory moved in keep their times.
+
+        Parameters:
+        roots (list[str]): The local paths covered by the sync.
+        since_ns (int): The point in time in nanoseconds.
+        """
+        visited_dirs = set()
+        pending_paths = [(root, False) for root in roots]
+        while pending_paths and self.valid:
+            path, record_all = pending_paths.pop()
+            try:
+                st = os.stat(path)
+                changed = record_all or (max(st.st_mtime_ns, st.st_ctime_ns) >= since_ns)
+                if not stat.S_ISDIR(st.st_mode):
+                    if changed:
+                        self._record(path)
+                    continue
+                if (st.st_dev, st.st_ino) in visited_dirs:
+                    continue
+                visited_dirs.add((st.st_dev, st.st_ino))
+                with os.scandir(path) as it:
+                    pending_paths.extend((entry.path, changed) for entry in it)
+            except OSError as e:
+                logger.debug("Failed to scan %s: %s", path, e)
+
+    def _record(self, path: str):
+        """
+        Records a changed path, invalidating the journal if it grows too large
+        or the path cannot be logged.
+
+        Parameters:
+        path (str): The changed path.
+        """
+        if path in self._dirty_paths:
+            return
+
+        self._dirty_paths.add(path)
+        if len(self._dirty_paths) > MAX_JOURNAL_ENTRIES:
+            logger.info("Journal %s overflowed", self._path)
+            self.valid = False
+        elif self._log:
+            if "\n" in path:
+                logger.info("Journal %s cannot log %r", self._path, path)
+                self.valid = False
+                return
+            try:
+                self._log.write(f"{path}\n")
+            except OSError as e:
+                logger.warning("Failed to write journal log %s: %s", self._log_path, e)
+                self.valid = False
+
+    def _on_readable(self):
+        """
+        Handles the inotify events, stops watching once the journal becomes unusable.
+        """
+        self._drain_events()
+        if not self.valid:
+            self.stop()
+
+    def _drain_events(self):
+        """
+        Reads and handles all pending inotify events.
+        """
+        while self.valid:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                logger.warning("Failed to read inotify events: %s", e)
+                self.valid = False
+                return
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + name_len].rstrip(b"\0"))
+                offset += name_len
+
+                if mask & IN_Q_OVERFLOW:
+                    logger.info("inotify queue of journal %s overflowed", self._path)
+                    self.valid = False
+                    return
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                if (wd not in self._watches) or (not name):
+                    continue
+
+                path = os.path.join(self._watches[wd], name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._watch_tree(path, set(), True)
+                else:
+                    self._record(path)
+
+
+def start_journal(
+    id: str,
+    roots: list[str],
+    sync_root: str,
+    matcher: FilterMatcher,
+    valid: bool,
+    fingerprint: str,
+):
+    """
+    Starts the change journal of a sync target, replacing the running one.
+
+    Parameters:
+    id (str): ID of the sync target.
+    roots (list[str]): The local paths covered by the sync.
+    sync_root (str): The local sync root, paths in the journal are relative to it.
+    matcher (FilterMatcher): The filters of the sync target.
+    valid (bool): Whether the local files were in the cloud at this point.
+    fingerprint (str): Fingerprint of the sync target's manifest.
+    """
+    stop_journal(id)
+    journal = ChangeJournal(id, sync_root, matcher)
+    journal.start(roots, valid, fingerprint)
+    _active_journals[id] = journal
+
+
+def resume_journal(
+    id: str, roots: list[str], sync_root: str, matcher: FilterMatcher, fingerprint: str
+) -> ChangeJournal | None:
+    """
+    Resumes the change journal a sync target had in an earlier run of the plugin.
+
+    Parameters:
+    id (str): ID of the sync target.
+    roots (list[str]): The local paths covered by the sync.
+    sync_root (str): The local sync root, paths in the journal are relative to it.
+    matcher (FilterMatcher): The filters of the sync target.
+    fingerprint (str): Fingerprint of the sync target's manifest.
+
+    Returns:
+    ChangeJournal | None: The stopped journal, None if there is no usable one.
+    """
+    journal = ChangeJournal(id, sync_root, matcher)
+    return journal if journal.resume(roots, fingerprint) else None
+
+
+def stop_journal(id: str) -> ChangeJournal | None:
+    """
+    Stops the change journal of a sync target.
+
+    Parameters:
+    id (str): ID of the sync target.
+
+    Returns:
+    ChangeJournal | None: The stopped journal, None if it was not running.
+    """
+    if journal := _active_journals.pop(id, None):
+        journal.stop()
+    return journal
+
+
+def stop_all_journals():
+    """
+    Stops all change journals.
+    """
+    for id in list(_active_journals):
+        stop_journal(id)
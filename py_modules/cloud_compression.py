@@ -0,0 +1,95 @@
+from typing import Any
+import time, zlib
+
+from config import *
+from utils import *
+from rclone_manager import RcloneManager
+from sync_target import SyncScheduler
+
+ESTIMATE_MAX_BYTES = 64 * 1024 * 1024
+ESTIMATE_CHUNK_SIZE = 1024 * 1024
+# Level rclone's compress remote uses by default
+GZIP_LEVEL = 6
+
+
+async def migrate(enabled: bool) -> dict[str, Any]:
+    """
+    Turns the compression of the sync destination on or off, moving the data already in the cloud.
+    On failure the setting is kept, running the migration again continues where it stopped.
+
+    Parameters:
+    enabled (bool): Whether to compress the data.
+
+    Returns:
+    dict[str, Any]: The rclone "exit_code", the "seconds" it took, and whether the global sync
+                    needs a resync ("resync_required") as its cloud path changed.
+
+    Raises:
+    Exception: If syncs are running or the compress remote cannot be created.
+    """
+    if enabled == bool(Config.get_config_item("cloud_compression")):
+        return {"exit_code": 0, "seconds": 0, "resync_required": False}
+
+    # The syncs submitted while moving wait, then run against the new path
+    SyncScheduler.hold()
+    try:
+        if enabled:
+            await RcloneManager.create_compress_remote()
+        destination = Config.get_config_item("sync_destination")
+        source, target = get_cloud_path(destination, not enabled), get_cloud_path(destination, enabled)
+
+        logger.info("Moving %s to %s", source, target)
+        start_time = time.perf_counter()
+        exit_code = await RcloneManager.move(source, target)
+        duration = time.perf_counter() - start_time
+        if exit_code == 3:
+            logger.info("Nothing to move, %s doesn't exist", source)
+            exit_code = 0
+        if exit_code == 0:
+            Config.set_config("cloud_compression", enabled)
+            logger.info("Cloud compression %s in %.3fs", "enabled" if enabled else "disabled", duration)
+    finally:
+        SyncScheduler.release()
+
+    return {"exit_code": exit_code, "seconds": duration, "resync_required": exit_code == 0}
+
+
+def estimate_compression(paths: list[str], max_bytes: int = ESTIMATE_MAX_BYTES) -> dict[str, Any]:
+    """
+    Measures how well files compress with the gzip settings of the compress remote.
+
+    Parameters:
+    paths (list[str]): The files to compress.
+    max_bytes (int): Stop after reading this many bytes.
+
+    Returns:
+    dict[str, Any]: The "files" and "raw_bytes" read, the "compressed_bytes", the "ratio"
+                    of compressed to raw bytes and the "seconds" it took.
+    """
+    start_time = time.perf_counter()
+    files = 0
+    raw_bytes = 0
+    compressed_bytes = 0
+    for path in paths:
+        if raw_bytes >= max_bytes:
+            break
+        # Every file is a separate gzip stream on the remote
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        try:
+            with open(path, "rb") as f:
+                while (raw_bytes < max_bytes) and (chunk := f.read(ESTIMATE_CHUNK_SIZE)):
+                    raw_bytes += len(chunk)
+                    compressed_bytes += len(compressor.compress(chunk))
+        except OSError as e:
+            logger.debug("Failed to read %s: %s", path, e)
+            continue
+        compressed_bytes += len(compressor.flush())
+        files += 1
+
+    return {
+        "files": files,
+        "raw_bytes": raw_bytes,
+        "compressed_bytes": compressed_bytes,
+        "ratio": compressed_bytes / raw_bytes if raw_bytes else 1.0,
+        "seconds": time.perf_counter() - start_time,
+    }
@@ -1,7 +1,7 @@
 import decky
 
 from pathlib import Path
-from enum import Enum
+from enum import Enum, IntEnum
 from packaging.version import Version
 import ssl, certifi
 
@@ -9,11 +9,29 @@ RCLONE_PORT = 53682
 
 PLUGIN_DEFAULT_CONFIG_PATH = Path(decky.DECKY_PLUGIN_DIR) / "default_config.json"
 PLUGIN_CONFIG_DIR = Path(decky.DECKY_PLUGIN_SETTINGS_DIR)
+# Files the plugin updates on its own, kept out of the config directory whose
+# modification time tells the target registry that the filters changed
+PLUGIN_STATE_DIR = PLUGIN_CONFIG_DIR / "state"
+STATE_FILE_PATTERNS = (
+    "*.manifest",
+    "*.snapshot.json",
+    "targets.json",
+    "rclone_capabilities.json",
+    "sync_history.sqlite3*",
+)
 
 RCLONE_BIN_PATH = Path(decky.DECKY_PLUGIN_RUNTIME_DIR) / "rclone"
 RCLONE_CFG_PATH = PLUGIN_CONFIG_DIR / "rclone.conf"
+RCLONE_RC_SOCKET_PATH = Path(decky.DECKY_PLUGIN_RUNTIME_DIR) / "rclone-rcd.sock"
+RCLONE_RC_LOG_PATH = Path(decky.DECKY_PLUGIN_LOG_DIR) / "rclone-rcd.log"
 RCLONE_BISYNC_CACHE_DIR = Path(decky.HOME) / ".cache/rclone/bisync"
 
+CLOUD_REMOTE_NAME = "cloud"
+COMPRESS_REMOTE_NAME = "cloud-compress"
+COMPRESSED_DESTINATION_SUFFIX = "-compressed"
+CHUNKS_DESTINATION_SUFFIX = "-chunks"
+SNAPSHOTS_DESTINATION_SUFFIX = "-snapshots"
+
 GLOBAL_SYNC_ID = "global"
 SHARED_FILTER_NAME = "shared"
 
@@ -45,3 +63,15 @@ class RcloneSyncWinner(Enum):
 
     LOCAL = "path1"
     CLOUD = "path2"
+
+
+class SyncPriority(IntEnum):
+    """
+    Enum representing the priority of a sync in the scheduler, lower runs first
+    """
+
+    GAME_DOWNLOAD = 0
+    GAME_UPLOAD = 1
+    GLOBAL_SYNC = 2
+    CAPTURE_UPLOAD = 3
+    PREFETCH = 4
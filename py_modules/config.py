@@ -1,11 +1,13 @@
 import decky
 
 from typing import Any
-import json
+import asyncio, json, os
 
 from settings import SettingsManager
 from common_defs import *
 
+CONFIG_WRITE_DELAY = 0.5
+
 
 class Config():
     _config = SettingsManager("config", decky.DECKY_PLUGIN_SETTINGS_DIR)
@@ -16,39 +18,39 @@ class Config():
     except Exception as e:
         logger.error("Failed to load default config: %s", e)
 
+    # Settings merged over the defaults, None is treated as a missing value
+    _snapshot = {
+        **_default_config,
+        **{k: v for k, v in _config.settings.items() if v is not None},
+    }
+    _flush_handle: asyncio.TimerHandle | None = None
+    _flush_tasks: set[asyncio.Task] = set()
+    _flush_lock = asyncio.Lock()
+    _writes = 0
+
     @classmethod
     def get_config(cls) -> dict[str, Any]:
         """
         Retrieves the plugin configuration.
 
         Returns:
-        dict[str, Any]: The plugin configuration.
+        dict[str, Any]: The plugin configuration, entries not set are taken from the default config.
         """
-        if not cls._config.settings:
-            cls._config.settings = cls._default_config
-            cls._config.commit()
-
-        return cls._config.settings
+        return dict(cls._snapshot)
 
     @classmethod
     def get_config_item(cls, key: str) -> Any:
         """
-        Retrieves a configuration item.
+        Retrieves a configuration item from memory.
 
         Parameters:
         key (str): The key to get.
 
         Returns:
         Any: The value of the configuration item.
-             If the config doesn't exist, the default value will be returned.
-             If the entry doesn't exist in the default config, the value from the default config fallback will be returned.
+             If the config doesn't exist, the value from the default config will be returned.
         """
-        value = cls.get_config().get(key)
-        if not value:
-            value = cls._default_config.get(key)
-            cls.set_config(key, value)
-
-        return value
+        return cls._snapshot.get(key)
 
     @classmethod
     def get_config_items(cls, *keys: str)-> tuple[Any, ...]:
@@ -66,10 +68,68 @@ class Config():
     @classmethod
     def set_config(cls, key: str, value: Any):
         """
-        Sets a configuration key-value pair in the plugin configuration file.
+        Sets a configuration key-value pair, the configuration file is written shortly after
+        so that consecutive changes are persisted in one go.
 
         Parameters:
         key (str): The key to set.
-        value (Any): The value to set for the key.
+        value (Any): The value to set for the key, None resets it to the default.
+        """
+        if value is None:
+            cls._snapshot[key] = cls._default_config.get(key)
+            cls._config.settings.pop(key, None)
+        else:
+            cls._snapshot[key] = value
+            cls._config.settings[key] = value
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            cls._write(dict(cls._config.settings))
+            return
+        if not cls._flush_handle:
+            cls._flush_handle = loop.call_later(CONFIG_WRITE_DELAY, cls._start_flush)
+
+    @classmethod
+    def _start_flush(cls):
+        """
+        Starts writing the pending changes once the write delay passed.
+        """
+        cls._flush_handle = None
+        task = asyncio.create_task(cls.flush())
+        cls._flush_tasks.add(task)
+        task.add_done_callback(cls._flush_tasks.discard)
+
+    @classmethod
+    async def flush(cls):
+        """
+        Writes the pending changes to the configuration file in a worker thread.
+        """
+        if cls._flush_handle:
+            cls._flush_handle.cancel()
+            cls._flush_handle = None
+
+        settings = dict(cls._config.settings)
+        # One write at a time, so that the file ends up with the latest settings
+        async with cls._flush_lock:
+            await asyncio.to_thread(cls._write, settings)
+
+    @classmethod
+    def _write(cls, settings: dict[str, Any]):
+        """
+        Writes the settings to the configuration file, replacing it atomically.
+
+        Parameters:
+        settings (dict[str, Any]): The settings set by the user.
         """
-        cls._config.setSetting(key, value)
+        tmp_path = f"{cls._config.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(settings, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, cls._config.path)
+        except OSError as e:
+            logger.error("Failed to write config: %s", e)
+            return
+
+        cls._writes += 1
+        logger.debug("Config written (%d writes since start)", cls._writes)
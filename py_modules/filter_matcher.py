@@ -0,0 +1,445 @@
+import decky
+
+from pathlib import Path
+from typing import Any
+import hashlib, os, re
+
+from common_defs import *
+
+FILTER_CACHE_DIR = Path(decky.DECKY_PLUGIN_RUNTIME_DIR) / "filters"
+FILTER_CACHE_MAX_FILES = 256
+PREVIEW_MAX_ENTRIES = 200000
+PREVIEW_MAX_LISTED_FILES = 500
+HUGE_RULE_FILES = 5000
+HUGE_RULE_BYTES = 1024**3
+
+
+class _FilterRule:
+    def __init__(self, line: str):
+        self.line = line
+        self.is_include = line[0] == "+"
+        self.pattern = line[2:].rstrip("/")
+        self.dir_only = line.endswith("/")
+        self.regex = glob_to_regex(self.pattern)
+
+
+class FilterMatcher:
+    """
+    Python implementation of rclone's filter rules as read by --filter-from,
+    for deciding locally whether rclone would pick up a path.
+    """
+
+    def __init__(self, lines: list[str]):
+        self._rules: list[_FilterRule] = list()
+        for line in normalize_filters(lines):
+            if line[:2] not in ("+ ", "- "):
+                raise ValueError(f"Malformed filter rule: {line}")
+            self._rules.append(_FilterRule(line))
+        self._dir_cache: dict[str, bool] = dict()
+
+    def include(self, path: str) -> bool:
+        """
+        Checks if a file is included by the rules, the first matching rule wins.
+        Files under a directory that rclone would not descend into are excluded.
+
+        Parameters:
+        path (str): Path of the file relative to the sync root, e.g. "home/deck/save.dat".
+
+        Returns:
+        bool: True if rclone would pick up the file.
+        """
+        path = path.lstrip("/")
+        if not self.include_dir(os.path.dirname(path)):
+            return False
+
+        rule = self.match(path)
+        return rule is None or self._rules[rule].is_include
+
+    def match(self, path: str) -> int | None:
+        """
+        Finds the rule deciding on a file, without looking at its directories.
+
+        Parameters:
+        path (str): Path of the file relative to the sync root.
+
+        Returns:
+        int | None: Index of the first matching rule, None if no rule matches.
+        """
+        path = path.lstrip("/")
+        for i, rule in enumerate(self._rules):
+            if (not rule.dir_only) and rule.regex.match(path):
+                return i
+
+        return None
+
+    def include_dir(self, path: str) -> bool:
+        """
+        Checks if a directory may contain included files, rclone doesn't descend into it otherwise.
+        The answer errs on the side of True when the rules cannot be proven to exclude everything.
+
+        Parameters:
+        path (str): Path of the directory relative to the sync root, "" for the root itself.
+
+        Returns:
+        bool: False if no file under the directory can be included.
+        """
+        path = path.strip("/")
+        if not path:
+            return True
+        if (cached := self._dir_cache.get(path)) is not None:
+            return cached
+
+        result = self.include_dir(os.path.dirname(path)) and self._check_dir(path)
+        self._dir_cache[path] = result
+        return result
+
+    def get_rules(self) -> list[str]:
+        """
+        Returns the normalized rules.
+
+        Returns:
+        list[str]: The rules in order.
+        """
+        return [rule.line for rule in self._rules]
+
+    def _check_dir(self, path: str) -> bool:
+        """
+        Checks the rules against a directory whose parent is included.
+
+        Parameters:
+        path (str): Path of the directory relative to the sync root.
+
+        Returns:
+        bool: False if no file under the directory can be included.
+        """
+        segments = path.split("/")
+        for rule in self._rules:
+            if rule.dir_only:
+                if rule.regex.match(path):
+                    return rule.is_include
+            elif rule.is_include:
+                if _may_match_below(rule.pattern, segments):
+                    return True
+            elif _matches_all_below(rule.pattern, segments):
+                return False
+
+        return True
+
+
+def normalize_filters(lines: list[str]) -> list[str]:
+    """
+    Normalizes filter rules without changing what they match: comments, blank lines and
+    rules cleared by "!" are dropped, as well as duplicates and rules after a catch-all
+    exclude, which can never be the first match.
+
+    Parameters:
+    lines (list[str]): The filter lines in order.
+
+    Returns:
+    list[str]: The effective rules.
+    """
+    rules = list()
+    unreachable = False
+    for line in lines:
+        line = line.strip()
+        if (not line) or line.startswith(("#", ";")):
+            continue
+        if line == "!":
+            rules.clear()
+            unreachable = False
+            continue
+        if unreachable or (line in rules):
+            continue
+
+        rules.append(line)
+        unreachable = line in ("- **", "- /**")
+
+    return rules
+
+
+def get_compiled_filter_file(lines: list[str]) -> Path:
+    """
+    Writes the normalized filter rules to a file named after their content hash,
+    so that a sync passes a single --filter-from file which is only written once.
+
+    Parameters:
+    lines (list[str]): The filter lines in order, e.g. shared, target and exclude all.
+
+    Returns:
+    Path: The compiled filter file.
+    """
+    content = "\n".join(normalize_filters(lines)) + "\n"
+    path = FILTER_CACHE_DIR / f"{hashlib.sha1(content.encode()).hexdigest()}.filter"
+    if path.exists():
+        os.utime(path)
+        return path
+
+    FILTER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(content)
+    tmp_path.replace(path)
+    logger.debug("Compiled filter file %s", path)
+
+    cached_files = sorted(FILTER_CACHE_DIR.glob("*.filter"), key=lambda f: f.stat().st_mtime)
+    for old_file in cached_files[:-FILTER_CACHE_MAX_FILES]:
+        old_file.unlink(missing_ok=True)
+    return path
+
+
+def preview_filter_matches(matcher: FilterMatcher, sync_root: str) -> dict[str, Any]:
+    """
+    Enumerates the local files the filters pick up, skipping the directories rclone
+    wouldn't descend into, and counts what every rule decides on.
+
+    Parameters:
+    matcher (FilterMatcher): The filters.
+    sync_root (str): The local sync root the filters are relative to.
+
+    Returns:
+    dict[str, Any]: The first included files ("files"), "total_files", "total_bytes",
+                    "truncated", the files and bytes per rule ("rules"), and the include
+                    rules matching nothing ("unused_rules") or huge trees ("huge_rules").
+    """
+    rule_stats = [{"rule": line, "files": 0, "bytes": 0} for line in matcher.get_rules()]
+    files = list()
+    total_files = 0
+    total_bytes = 0
+    scanned_entries = 0
+    visited_dirs = set()
+    pending_dirs = [sync_root]
+    while pending_dirs and scanned_entries < PREVIEW_MAX_ENTRIES:
+        current_dir = pending_dirs.pop()
+        try:
+            st = os.stat(current_dir)
+            if (st.st_dev, st.st_ino) in visited_dirs:
+                continue
+            visited_dirs.add((st.st_dev, st.st_ino))
+            with os.scandir(current_dir) as it:
+                entries = list(it)
+        except OSError as e:
+            logger.debug("Failed to scan %s: %s", current_dir, e)
+            continue
+
+        for entry in entries:
+            scanned_entries += 1
+            relative_path = os.path.relpath(entry.path, sync_root)
+            try:
+                if entry.is_dir():
+                    if matcher.include_dir(relative_path):
+                        pending_dirs.append(entry.path)
+                    continue
+                size = entry.stat().st_size
+            except OSError:
+                continue
+
+            rule = matcher.match(relative_path)
+            if rule is not None:
+                rule_stats[rule]["files"] += 1
+                rule_stats[rule]["bytes"] += size
+            if rule is None or rule_stats[rule]["rule"][0] == "+":
+                total_files += 1
+                total_bytes += size
+                if len(files) < PREVIEW_MAX_LISTED_FILES:
+                    files.append(entry.path)
+
+    truncated = bool(pending_dirs)
+    unused_rules = [
+        stats["rule"] for stats in rule_stats if stats["rule"][0] == "+" and not stats["files"]
+    ]
+    huge_rules = [
+        stats["rule"]
+        for stats in rule_stats
+        if stats["rule"][0] == "+"
+        and (stats["files"] > HUGE_RULE_FILES or stats["bytes"] > HUGE_RULE_BYTES)
+    ]
+    if unused_rules and not truncated:
+        logger.info("Filter rules matching no file: %s", unused_rules)
+    if huge_rules:
+        logger.warning("Filter rules matching huge trees: %s", huge_rules)
+
+    return {
+        "files": sorted(files),
+        "total_files": total_files,
+        "total_bytes": total_bytes,
+        "truncated": truncated,
+        "rules": rule_stats,
+        "unused_rules": unused_rules if not truncated else [],
+        "huge_rules": huge_rules,
+    }
+
+
+def list_filtered_files(
+    matcher: FilterMatcher,
+    sync_root: str,
+    follow_symlinks: bool,
+    max_entries: int = PREVIEW_MAX_ENTRIES,
+) -> dict[str, tuple[int, int]] | None:
+    """
+    Lists the local files the filters pick up like rclone does.
+
+    Parameters:
+    matcher (FilterMatcher): The filters.
+    sync_root (str): The local sync root the filters are relative to.
+    follow_symlinks (bool): Follow symlinks like rclone --copy-links, otherwise skip them.
+    max_entries (int): Max number of directory entries to scan.
+
+    Returns:
+    dict[str, tuple[int, int]] | None: Size and modification time in nanoseconds by path
+                                       relative to sync_root, None if there are too many entries.
+    """
+    files = dict()
+    scanned_entries = 0
+    visited_dirs = set()
+    pending_dirs = [sync_root]
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        try:
+            st = os.stat(current_dir)
+            if (st.st_dev, st.st_ino) in visited_dirs:
+                continue
+            visited_dirs.add((st.st_dev, st.st_ino))
+            with os.scandir(current_dir) as it:
+                entries = list(it)
+        except OSError as e:
+            logger.debug("Failed to scan %s: %s", current_dir, e)
+            continue
+
+        scanned_entries += len(entries)
+        if scanned_entries > max_entries:
+            return None
+        for entry in entries:
+            relative_path = os.path.relpath(entry.path, sync_root)
+            try:
+                if (not follow_symlinks) and entry.is_symlink():
+                    continue
+                if entry.is_dir():
+                    if matcher.include_dir(relative_path):
+                        pending_dirs.append(entry.path)
+                    continue
+                if matcher.include(relative_path):
+                    st = entry.stat()
+                    files[relative_path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+
+    return files
+
+
+def _may_match_below(pattern: str, dir_segments: list[str]) -> bool:
+    """
+    Checks if a file rule may match a path under a directory.
+
+    Parameters:
+    pattern (str): The glob of the rule.
+    dir_segments (list[str]): The components of the directory path.
+
+    Returns:
+    bool: False only if the rule cannot match anything under the directory.
+    """
+    if (not pattern.startswith("/")) or ("{" in pattern) or ("\\" in pattern):
+        return True
+
+    pattern_segments = pattern[1:].split("/")
+    for i, dir_segment in enumerate(dir_segments):
+        if "**" in pattern_segments[min(i, len(pattern_segments) - 1)]:
+            return True
+        if i >= len(pattern_segments) - 1:
+            return False
+        if not re.fullmatch(_glob_body_to_regex(pattern_segments[i]), dir_segment):
+            return False
+
+    return True
+
+
+def _matches_all_below(pattern: str, dir_segments: list[str]) -> bool:
+    """
+    Checks if a file rule matches every path under a directory.
+
+    Parameters:
+    pattern (str): The glob of the rule.
+    dir_segments (list[str]): The components of the directory path.
+
+    Returns:
+    bool: True only if the rule is proven to match everything under the directory.
+    """
+    if pattern in ("**", "/**"):
+        return True
+    if (not pattern.startswith("/")) or (not pattern.endswith("/**")):
+        return False
+    if ("{" in pattern) or ("\\" in pattern):
+        return False
+
+    prefix_segments = pattern[1:-3].split("/")
+    if len(prefix_segments) > len(dir_segments):
+        return False
+    for prefix_segment, dir_segment in zip(prefix_segments, dir_segments):
+        if ("**" in prefix_segment) or not re.fullmatch(
+            _glob_body_to_regex(prefix_segment), dir_segment
+        ):
+            return False
+
+    return True
+
+
+def glob_to_regex(pattern: str) -> re.Pattern:
+    """
+    Converts an rclone filter glob to a regular expression.
+
+    Parameters:
+    pattern (str): The glob, anchored to the sync root if it starts with "/".
+
+    Returns:
+    re.Pattern: The compiled regular expression matching paths relative to the sync root.
+    """
+    if pattern.startswith("/"):
+        prefix = "^"
+        pattern = pattern[1:]
+    else:
+        prefix = "(^|.*/)"
+
+    return re.compile(prefix + _glob_body_to_regex(pattern) + "$")
+
+
+def _glob_body_to_regex(pattern: str) -> str:
+    """
+    Converts the glob syntax (*, **, ?, [...], {a,b} and \\ escapes) to regular expression.
+
+    Parameters:
+    pattern (str): The glob without the anchoring "/".
+
+    Returns:
+    str: The regular expression source.
+    """
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 1
+        elif char == "*":
+            if pattern.startswith("**", i):
+                regex += ".*"
+                i += 1
+            else:
+                regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end < 0:
+                raise ValueError(f"Unterminated character class in {pattern}")
+            regex += "[" + pattern[i + 1 : end].replace("\\", "\\\\") + "]"
+            i = end
+        elif char == "{":
+            end = pattern.find("}", i + 1)
+            if end < 0:
+                raise ValueError(f"Unterminated alternation in {pattern}")
+            options = pattern[i + 1 : end].split(",")
+            regex += "(" + "|".join(_glob_body_to_regex(option) for option in options) + ")"
+            i = end
+        else:
+            regex += re.escape(char)
+        i += 1
+
+    return regex
@@ -0,0 +1,194 @@
+import decky
+
+from pathlib import Path
+from typing import Any, Callable
+import asyncio, gzip, os, shutil
+
+from common_defs import *
+
+LOG_PAGE_SIZE = 64 * 1024
+LOG_TAIL_LINES = 500
+LOG_FOLLOW_INTERVAL = 0.5
+MAX_COMPRESSED_LOGS = 20
+
+
+def read_log(
+    path: Path,
+    offset: int | None = None,
+    length: int | None = LOG_PAGE_SIZE,
+    tail_lines: int = LOG_TAIL_LINES,
+) -> dict[str, Any]:
+    """
+    Reads a page of a log file without loading the whole file.
+    Rotated logs compressed with gzip are read decompressed.
+
+    Parameters:
+    path (Path): The log file.
+    offset (int | None): Byte offset to read from, None to read the last tail_lines lines.
+    length (int | None): Max number of bytes to read, at most LOG_PAGE_SIZE.
+    tail_lines (int): Number of lines to read from the end if offset is None.
+
+    Returns:
+    dict[str, Any]: The "content", the byte "offset" it starts at, the "next_offset" to continue
+                    reading from and the file "size". A page read from an offset ends at a line
+                    boundary unless a single line is longer than length.
+    """
+    length = min(length or LOG_PAGE_SIZE, LOG_PAGE_SIZE)
+    compressed = path.suffix == ".gz"
+    with (gzip.open(path, "rb") if compressed else path.open("rb")) as f:
+        # The size of a compressed log is only known once it's decompressed
+        size = f.seek(0, os.SEEK_END) if compressed else os.fstat(f.fileno()).st_size
+        if offset is None:
+            offset = _find_tail_offset(f, size, tail_lines, length)
+        elif offset > size:
+            # The file was truncated or replaced, start over
+            offset = 0
+
+        f.seek(offset)
+        data = f.read(length)
+
+    if offset + len(data) < size and (end := data.rfind(b"\n")) >= 0:
+        data = data[: end + 1]
+
+    return {
+        "content": data.decode(errors="replace"),
+        "offset": offset,
+        "next_offset": offset + len(data),
+        "size": size,
+    }
+
+
+def _find_tail_offset(f, size: int, lines: int, max_length: int) -> int:
+    """
+    Finds where the last lines of a file start by reading it backwards in blocks.
+
+    Parameters:
+    f: The file opened in binary mode.
+    size (int): Size of the file.
+    lines (int): Number of lines wanted.
+    max_length (int): The tail is never longer than this.
+
+    Returns:
+    int: The byte offset of the tail.
+    """
+    position = size
+    newlines = 0
+    while position > 0 and size - position < max_length:
+        block_size = min(8192, position)
+        position -= block_size
+        f.seek(position)
+        block = f.read(block_size)
+        # The newline ending the last line doesn't start a new one
+        if position + block_size == size and block.endswith(b"\n"):
+            block = block[:-1]
+        block_newlines = block.count(b"\n")
+        if newlines + block_newlines >= lines:
+            index = len(block)
+            for _ in range(lines - newlines):
+                index = block.rfind(b"\n", 0, index)
+            return position + index + 1
+        newlines += block_newlines
+
+    return max(position, size - max_length)
+
+
+def rotate_logs(log_dir: Path, pattern: str, keep_plain: int):
+    """
+    Compresses all but the newest log files with gzip, deleting the oldest compressed ones.
+
+    Parameters:
+    log_dir (Path): The directory of the log files.
+    pattern (str): The glob matching the log files, sorted by name from oldest to newest.
+    keep_plain (int): Number of newest log files kept uncompressed.
+    """
+    plain_logs = sorted(log_dir.glob(pattern))
+    for log_file in plain_logs[: max(0, len(plain_logs) - keep_plain)]:
+        compressed_file = log_file.with_name(log_file.name + ".gz")
+        try:
+            with log_file.open("rb") as src, gzip.open(compressed_file, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            log_file.unlink()
+            logger.debug("Compressed log %s", log_file)
+        except OSError as e:
+            logger.warning("Failed to compress log %s: %s", log_file, e)
+            compressed_file.unlink(missing_ok=True)
+
+    compressed_logs = sorted(log_dir.glob(pattern + ".gz"))
+    for old_file in compressed_logs[:-MAX_COMPRESSED_LOGS]:
+        old_file.unlink(missing_ok=True)
+
+
+class LogFollower:
+    """
+    Polls log files for appended content and pushes it to the frontend
+    as "log_update" events, with the followed key and the page read.
+    """
+
+    _tasks: dict[str, asyncio.Task] = dict()
+
+    @classmethod
+    def follow(cls, key: str, get_path: Callable[[], Path | None], offset: int):
+        """
+        Starts following a log, replacing the previous follower of the key.
+
+        Parameters:
+        key (str): Identifies the log in the events.
+        get_path (Callable[[], Path | None]): Returns the current log file, which may change,
+                                              e.g. when a new sync starts.
+        offset (int): Byte offset the frontend has read up to.
+        """
+        cls.unfollow(key)
+        cls._tasks[key] = asyncio.create_task(cls._run(key, get_path, offset))
+
+    @classmethod
+    def unfollow(cls, key: str):
+        """
+        Stops following a log.
+
+        Parameters:
+        key (str): Identifies the log.
+        """
+        if task := cls._tasks.pop(key, None):
+            task.cancel()
+
+    @classmethod
+    def unfollow_all(cls):
+        """
+        Stops following all logs.
+        """
+        for key in list(cls._tasks):
+            cls.unfollow(key)
+
+    @classmethod
+    async def _run(cls, key: str, get_path: Callable[[], Path | None], offset: int):
+        """
+        Emits the content appended to a log until cancelled.
+
+        Parameters:
+        key (str): Identifies the log in the events.
+        get_path (Callable[[], Path | None]): Returns the current log file.
+        offset (int): Byte offset to continue from.
+        """
+        path = get_path()
+        while True:
+            await asyncio.sleep(LOG_FOLLOW_INTERVAL)
+            current_path = get_path()
+            reset = current_path != path
+            if reset:
+                path = current_path
+                offset = 0
+            if not path:
+                continue
+
+            try:
+                if (not reset) and path.stat().st_size == offset:
+                    continue
+                page = await asyncio.to_thread(read_log, path, offset)
+            except OSError:
+                continue
+
+            # A truncated file is read again from the start
+            page["reset"] = reset or page["offset"] != offset
+            if page["content"] or page["reset"]:
+                offset = page["next_offset"]
+                await decky.emit("log_update", key, page)
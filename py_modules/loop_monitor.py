@@ -0,0 +1,138 @@
+from collections import deque
+from typing import Any
+import asyncio, sys, threading, time, traceback
+
+from common_defs import *
+
+LOOP_MONITOR_INTERVAL = 0.1
+LOOP_MONITOR_SAMPLES = 3000
+LOOP_MONITOR_REPORT_INTERVAL = 300
+LOOP_STALL_THRESHOLD = 0.25
+
+
+class LoopMonitor:
+    """
+    Measures how late the event loop runs a periodic heartbeat, which is how long any
+    request had to wait for the loop. A watchdog thread logs the stack of the loop thread
+    while a heartbeat is overdue, pointing at the callback that blocks it.
+    """
+
+    _task: asyncio.Task | None = None
+    _watchdog: threading.Thread | None = None
+    _stop_event = threading.Event()
+    _loop_thread_id: int = 0
+    _heartbeat: float = 0
+    _delays: deque[float] = deque(maxlen=LOOP_MONITOR_SAMPLES)
+    _max_delay: float = 0
+    _stalls: int = 0
+
+    @classmethod
+    def start(cls):
+        """
+        Starts the heartbeat on the running loop and the watchdog thread.
+        """
+        if cls._task:
+            return
+
+        cls._loop_thread_id = threading.get_ident()
+        cls._heartbeat = time.monotonic()
+        cls._stop_event.clear()
+        cls._task = asyncio.create_task(cls._run())
+        cls._watchdog = threading.Thread(target=cls._watch, name="loop-watchdog", daemon=True)
+        cls._watchdog.start()
+        logger.debug("Event loop monitor started")
+
+    @classmethod
+    async def stop(cls):
+        """
+        Stops the heartbeat and the watchdog thread, logging the final statistics.
+        """
+        if not cls._task:
+            return
+
+        cls._stop_event.set()
+        cls._task.cancel()
+        try:
+            await cls._task
+        except asyncio.CancelledError:
+            pass
+        cls._task = None
+        cls._log_stats()
+
+    @classmethod
+    def get_stats(cls) -> dict[str, Any]:
+        """
+        Retrieves the scheduling delay of the event loop.
+
+        Returns:
+        dict[str, Any]: Count, average, p50, p95, p99 and max delay in milliseconds
+                        over the recent samples, max over the whole run and the number of stalls.
+        """
+        delays = sorted(cls._delays)
+        if not delays:
+            return {"samples": 0, "stalls": cls._stalls}
+
+        def percentile(p: float) -> float:
+            return round(delays[min(len(delays) - 1, int(len(delays) * p))] * 1000, 2)
+
+        return {
+            "samples": len(delays),
+            "avg_ms": round(sum(delays) / len(delays) * 1000, 2),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(delays[-1] * 1000, 2),
+            "max_ever_ms": round(cls._max_delay * 1000, 2),
+            "stalls": cls._stalls,
+        }
+
+    @classmethod
+    async def _run(cls):
+        """
+        Sleeps for a fixed interval and records how much later than that the loop woke up.
+        """
+        last_report = time.monotonic()
+        while True:
+            expected = time.monotonic() + LOOP_MONITOR_INTERVAL
+            await asyncio.sleep(LOOP_MONITOR_INTERVAL)
+            now = time.monotonic()
+            cls._heartbeat = now
+
+            delay = max(0.0, now - expected)
+            cls._delays.append(delay)
+            cls._max_delay = max(cls._max_delay, delay)
+            if delay > LOOP_STALL_THRESHOLD:
+                logger.warning("Event loop was blocked for %.0f ms", delay * 1000)
+
+            if now - last_report > LOOP_MONITOR_REPORT_INTERVAL:
+                cls._log_stats()
+                last_report = now
+
+    @classmethod
+    def _watch(cls):
+        """
+        Runs in its own thread, logs the stack of the loop thread once per stall.
+        """
+        reported_heartbeat = 0.0
+        while not cls._stop_event.wait(LOOP_MONITOR_INTERVAL):
+            heartbeat = cls._heartbeat
+            overdue = time.monotonic() - heartbeat - LOOP_MONITOR_INTERVAL
+            if overdue < LOOP_STALL_THRESHOLD or heartbeat == reported_heartbeat:
+                continue
+
+            reported_heartbeat = heartbeat
+            cls._stalls += 1
+            frame = sys._current_frames().get(cls._loop_thread_id)
+            if frame:
+                logger.warning(
+                    "Event loop blocked for over %.0f ms in:\n%s",
+                    overdue * 1000,
+                    "".join(traceback.format_stack(frame)),
+                )
+
+    @classmethod
+    def _log_stats(cls):
+        """
+        Writes the delay statistics to the plugin log.
+        """
+        logger.info("Event loop delay: %s", cls.get_stats())
@@ -0,0 +1,155 @@
+from pathlib import Path
+from typing import Any
+import asyncio, os
+
+from common_defs import *
+from config import Config
+
+SCAN_FILE_LIMIT = 100000
+SCAN_CACHE_MAX_DIRS = 100000
+
+
+class _DirEntryCache:
+    """
+    The names a directory directly contains, valid as long as the directory's
+    (device, inode, mtime) stays the same. Files rewritten in place don't change it,
+    so their sizes are not cached.
+    """
+
+    def __init__(self, signature: tuple[int, int, int], files: list[str], subdirs: list[str]):
+        self.signature = signature
+        self.files = files
+        self.subdirs = subdirs
+
+
+class PathScanner:
+    """
+    Counts the files under sync paths off the event loop, caching the content of every
+    directory so that repeated scans only need to stat the directories and the files.
+    """
+
+    _cache: dict[str, _DirEntryCache] = dict()
+
+    @classmethod
+    async def scan(cls, path: str, recursive: bool, limit: int = SCAN_FILE_LIMIT) -> dict[str, Any]:
+        """
+        Scans a directory in a worker thread.
+
+        Parameters:
+        path (str): The directory to scan.
+        recursive (bool): Whether subdirectories are scanned.
+        limit (int): The scan stops once more files than this are found.
+
+        Returns:
+        dict[str, Any]: "files" and "bytes" found, "truncated" if the limit was hit.
+        """
+        return await asyncio.to_thread(cls._scan, path, recursive, limit)
+
+    @classmethod
+    def _scan(cls, path: str, recursive: bool, limit: int) -> dict[str, Any]:
+        """
+        Scans a directory following symlinks, each directory is only visited once.
+
+        Parameters:
+        path (str): The directory to scan.
+        recursive (bool): Whether subdirectories are scanned.
+        limit (int): The scan stops once more files than this are found.
+
+        Returns:
+        dict[str, Any]: "files" and "bytes" found, "truncated" if the limit was hit.
+        """
+        if len(cls._cache) > SCAN_CACHE_MAX_DIRS:
+            cls._cache.clear()
+
+        files = 0
+        total_bytes = 0
+        visited_dirs = set()
+        pending_dirs = [path]
+        while pending_dirs:
+            current_dir = pending_dirs.pop()
+            try:
+                st = os.stat(current_dir)
+            except OSError as e:
+                logger.debug("Failed to stat %s: %s", current_dir, e)
+                continue
+
+            if (st.st_dev, st.st_ino) in visited_dirs:
+                logger.debug("Skipping %s, already visited through a symlink", current_dir)
+                continue
+            visited_dirs.add((st.st_dev, st.st_ino))
+
+            entry = cls._get_dir_entry(current_dir, (st.st_dev, st.st_ino, st.st_mtime_ns))
+            files += len(entry.files)
+            for file_path in entry.files:
+                try:
+                    total_bytes += os.stat(file_path).st_size
+                except OSError:
+                    # Broken symlinks are still counted as files by rclone
+                    continue
+            if files > limit:
+                return {"files": files, "bytes": total_bytes, "truncated": True}
+            if recursive:
+                pending_dirs.extend(entry.subdirs)
+
+        logger.debug("Counted %d files, %d bytes under %s", files, total_bytes, path)
+        return {"files": files, "bytes": total_bytes, "truncated": False}
+
+    @classmethod
+    def _get_dir_entry(cls, directory: str, signature: tuple[int, int, int]) -> _DirEntryCache:
+        """
+        Retrieves what a directory directly contains, from the cache if it didn't change.
+
+        Parameters:
+        directory (str): The directory.
+        signature (tuple[int, int, int]): (device, inode, mtime_ns) of the directory.
+
+        Returns:
+        _DirEntryCache: The content of the directory.
+        """
+        cached = cls._cache.get(directory)
+        if cached and cached.signature == signature:
+            return cached
+
+        files = list()
+        subdirs = list()
+        try:
+            with os.scandir(directory) as it:
+                for dir_entry in it:
+                    try:
+                        is_dir = dir_entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    (subdirs if is_dir else files).append(dir_entry.path)
+        except OSError as e:
+            logger.debug("Failed to scan %s: %s", directory, e)
+
+        entry = _DirEntryCache(signature, files, subdirs)
+        cls._cache[directory] = entry
+        return entry
+
+
+async def scan_syncpath(syncpath: str, limit: int = SCAN_FILE_LIMIT) -> dict[str, Any]:
+    """
+    Scans the files matched by a sync path.
+
+    Parameters:
+    syncpath (str): The path to scan, a directory ending with "/**" is scanned recursively,
+                    one ending with "/*" is scanned without subdirectories.
+    limit (int): The scan stops once more files than this are found.
+
+    Returns:
+    dict[str, Any]: "files" and "bytes" matched, "truncated" if the scan stopped early.
+    """
+    roots = Config.get_config_item("sync_root")
+    if not any(syncpath.startswith(root) for root in roots):
+        raise Exception("Selection is outside of sync root.")
+
+    if syncpath.endswith("/**"):
+        return await PathScanner.scan(syncpath[:-3], True, limit)
+    elif syncpath.endswith("/*"):
+        return await PathScanner.scan(syncpath[:-2], False, limit)
+
+    file_path = Path(syncpath)
+    if file_path.is_file():
+        return {"files": 1, "bytes": file_path.stat().st_size, "truncated": False}
+    return {"files": 0, "bytes": 0, "truncated": False}
@@ -0,0 +1,248 @@
+from pathlib import Path
+import os, signal, time
+
+from common_defs import *
+from config import Config
+
+# Systems on the hybrid hierarchy mount cgroup v2 under "unified"
+CGROUP_ROOT = next(
+    (
+        path
+        for path in (Path("/sys/fs/cgroup"), Path("/sys/fs/cgroup/unified"))
+        if (path / "cgroup.controllers").exists()
+    ),
+    Path("/sys/fs/cgroup"),
+)
+FREEZE_TIMEOUT = 1.0
+SIGNAL_PASSES = 5
+
+# Root pid -> (freezer cgroup, original cgroup of every moved pid)
+_frozen_trees: dict[int, tuple[Path, dict[int, Path]]] = dict()
+
+
+def get_children_map() -> dict[int, list[int]]:
+    """
+    Reads the parent of every process from /proc in a single pass.
+
+    Returns:
+    dict[int, list[int]]: The child pids of every pid.
+    """
+    children = dict()
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+
+        # The command name may contain spaces and parentheses, the fields after it don't
+        fields = stat[stat.rfind(b")") + 2 :].split()
+        children.setdefault(int(fields[1]), []).append(int(entry.name))
+
+    return children
+
+
+def get_process_tree(pid: int) -> list[int]:
+    """
+    Retrieves a process and all of its descendants.
+
+    Parameters:
+    pid (int): The root process ID.
+
+    Returns:
+    list[int]: The process IDs, parents before their children.
+    """
+    children = get_children_map()
+    tree = [pid]
+    for current in tree:
+        tree.extend(children.get(current, []))
+    return tree
+
+
+def pause(pid: int):
+    """
+    Pauses a process tree, through a cgroup v2 freezer if enabled and usable, otherwise with SIGSTOP.
+
+    Parameters:
+    pid (int): The root process ID.
+    """
+    if pid in _frozen_trees:
+        logger.debug("Process %d is frozen already", pid)
+        return
+
+    start = time.monotonic()
+    if Config.get_config_item("cgroup_freezer") and _freeze(pid):
+        mode = "cgroup freezer"
+    else:
+        _signal_tree(pid, signal.SIGSTOP)
+        mode = "SIGSTOP"
+    logger.info("Paused process %d via %s in %.1f ms", pid, mode, (time.monotonic() - start) * 1000)
+
+
+def resume(pid: int):
+    """
+    Resumes a process tree paused by pause().
+
+    Parameters:
+    pid (int): The root process ID.
+    """
+    start = time.monotonic()
+    if pid in _frozen_trees:
+        _thaw(pid)
+        mode = "cgroup freezer"
+    else:
+        _signal_tree(pid, signal.SIGCONT)
+        mode = "SIGCONT"
+    logger.info("Resumed process %d via %s in %.1f ms", pid, mode, (time.monotonic() - start) * 1000)
+
+
+def _signal_tree(pid: int, sig: signal.Signals):
+    """
+    Sends a signal to a process tree. For SIGSTOP the tree is read again after every pass
+    until no new child shows up, to catch processes spawned while stopping it.
+
+    Parameters:
+    pid (int): The root process ID.
+    sig (signal.Signals): The signal to send.
+    """
+    signaled = set()
+    for _ in range(SIGNAL_PASSES):
+        pending = [p for p in get_process_tree(pid) if p not in signaled]
+        if not pending:
+            break
+        for p in pending:
+            try:
+                os.kill(p, sig)
+                logger.debug("Process %d received signal %s", p, sig.name)
+            except OSError as e:
+                logger.warning("Error sending signal %s to process %d: %s", sig.name, p, e)
+            signaled.add(p)
+        if sig != signal.SIGSTOP:
+            break
+
+
+def _get_cgroup(pid: int) -> Path | None:
+    """
+    Retrieves the cgroup v2 directory of a process.
+
+    Parameters:
+    pid (int): The process ID.
+
+    Returns:
+    Path | None: The cgroup directory, None if the process is gone or not on the unified hierarchy.
+    """
+    try:
+        with open(f"/proc/{pid}/cgroup", "r") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return CGROUP_ROOT / line[3:].strip().lstrip("/")
+    except OSError:
+        pass
+    return None
+
+
+def _move_to_cgroup(pid: int, cgroup: Path) -> bool:
+    """
+    Moves a process with all of its threads into a cgroup.
+
+    Parameters:
+    pid (int): The process ID.
+    cgroup (Path): The cgroup directory.
+
+    Returns:
+    bool: True if the process was moved or is already gone.
+    """
+    try:
+        (cgroup / "cgroup.procs").write_text(str(pid))
+        return True
+    except ProcessLookupError:
+        return True
+    except OSError as e:
+        logger.debug("Failed to move process %d to %s: %s", pid, cgroup, e)
+        return False
+
+
+def _freeze(pid: int) -> bool:
+    """
+    Moves a process tree into a new cgroup next to the one of the root process and freezes it,
+    processes forked from then on are created in the frozen cgroup as well.
+
+    Parameters:
+    pid (int): The root process ID.
+
+    Returns:
+    bool: True if the whole tree is frozen, False if the freezer is unusable or any process
+          of the tree could not be moved, then nothing was changed.
+    """
+    cgroup = _get_cgroup(pid)
+    if not cgroup or not (cgroup / "cgroup.freeze").exists() or not os.access(cgroup.parent, os.W_OK):
+        logger.info("cgroup v2 freezer not usable for process %d", pid)
+        return False
+
+    freezer = cgroup.parent / f"game-sync-freeze-{pid}"
+    origins = dict()
+    try:
+        freezer.mkdir(exist_ok=True)
+        # Children forked by a process before it was moved stay behind, read the tree
+        # again until all of it is in the freezer
+        for _ in range(SIGNAL_PASSES):
+            pending = [
+                (p, origin)
+                for p in get_process_tree(pid)
+                if (origin := _get_cgroup(p)) and origin != freezer
+            ]
+            if not pending:
+                break
+            for p, origin in pending:
+                if not _move_to_cgroup(p, freezer):
+                    raise OSError(f"process {p} could not be moved to {freezer}")
+                origins[p] = origin
+        else:
+            raise OSError(f"processes still outside of {freezer}")
+        if pid not in origins:
+            raise OSError(f"process {pid} could not be moved to {freezer}")
+        (freezer / "cgroup.freeze").write_text("1")
+    except OSError as e:
+        logger.warning("Failed to freeze process %d: %s", pid, e)
+        # A tree frozen before keeps its entry, the original cgroups are only recorded there
+        if pid not in _frozen_trees:
+            _frozen_trees[pid] = (freezer, origins)
+            _thaw(pid)
+        return False
+
+    _frozen_trees[pid] = (freezer, origins)
+    deadline = time.monotonic() + FREEZE_TIMEOUT
+    while "frozen 1" not in (freezer / "cgroup.events").read_text():
+        if time.monotonic() > deadline:
+            logger.warning("Process %d not frozen after %.1f s", pid, FREEZE_TIMEOUT)
+            break
+        time.sleep(0.01)
+
+    logger.debug("Froze %d processes of %d in %s", len(origins), pid, freezer)
+    return True
+
+
+def _thaw(pid: int):
+    """
+    Thaws a frozen process tree and moves it back to its original cgroups.
+
+    Parameters:
+    pid (int): The root process ID.
+    """
+    freezer, origins = _frozen_trees.pop(pid)
+    try:
+        (freezer / "cgroup.freeze").write_text("0")
+    except OSError as e:
+        logger.warning("Failed to thaw %s: %s", freezer, e)
+
+    default_origin = origins.get(pid) or next(iter(origins.values()), freezer.parent)
+    try:
+        for line in (freezer / "cgroup.procs").read_text().split():
+            p = int(line)
+            if not _move_to_cgroup(p, origins.get(p, default_origin)):
+                _move_to_cgroup(p, default_origin)
+        freezer.rmdir()
+    except OSError as e:
+        logger.warning("Failed to clean up %s: %s", freezer, e)
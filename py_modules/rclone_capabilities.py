@@ -0,0 +1,209 @@
+from asyncio import create_subprocess_exec, gather, Lock
+from asyncio.subprocess import PIPE, DEVNULL
+from packaging.version import Version, InvalidVersion
+from typing import Any
+import json, re
+
+from common_defs import *
+
+RCLONE_CAPABILITIES_PATH = PLUGIN_STATE_DIR / "rclone_capabilities.json"
+
+_VERSION_PATTERN = re.compile(r"rclone v(\S+)")
+_FLAG_PATTERN = re.compile(r"(?<![\w-])(--[a-z0-9][a-z0-9-]*)")
+_COMMAND_PATTERN = re.compile(r"^  (\w[\w-]*)\s", re.MULTILINE)
+
+
+class RcloneCapabilities:
+    """
+    Knows the version of the installed rclone binary and the commands and flags it supports.
+
+    The probe runs rclone a few times, so its result is kept in memory and in the settings
+    directory, keyed by the size, modification time and inode of the binary.
+    rclone is only run again when the binary is replaced, e.g. after an update.
+    """
+
+    _capabilities: dict[str, Any] | None = None
+    _probe_lock = Lock()
+
+    @classmethod
+    async def get(cls) -> dict[str, Any]:
+        """
+        Retrieves the capabilities of the installed rclone binary, probing it if it changed.
+
+        Returns:
+        dict[str, Any]: The "version", the "commands", the global "flags" and the "bisync_flags".
+                        Empty lists mean the binary couldn't be probed.
+        """
+        key = _get_binary_key()
+        if cls._capabilities and cls._capabilities.get("key") == key:
+            return cls._capabilities
+
+        async with cls._probe_lock:
+            if cls._capabilities and cls._capabilities.get("key") == key:
+                return cls._capabilities
+
+            capabilities = cls._load()
+            if not capabilities or capabilities.get("key") != key:
+                capabilities = await cls._probe(key)
+                cls._save(capabilities)
+            cls._capabilities = capabilities
+
+        return capabilities
+
+    @classmethod
+    async def get_version(cls) -> Version:
+        """
+        Retrieves the version of the installed rclone binary.
+
+        Returns:
+        Version: The version, DEFAULT_VERSION if rclone is missing or unknown.
+        """
+        try:
+            return Version((await cls.get())["version"])
+        except (InvalidVersion, TypeError):
+            return DEFAULT_VERSION
+
+    @classmethod
+    async def has_command(cls, command: str) -> bool:
+        """
+        Checks if rclone supports a command.
+
+        Parameters:
+        command (str): The command, e.g. "rcd".
+
+        Returns:
+        bool: False only if the command is known to be missing.
+        """
+        commands = (await cls.get())["commands"]
+        return not commands or command in commands
+
+    @classmethod
+    async def has_flag(cls, flag: str, bisync: bool = False) -> bool:
+        """
+        Checks if rclone supports a flag.
+
+        Parameters:
+        flag (str): The flag, e.g. "--use-json-log".
+        bisync (bool): Check the flags of the bisync command instead of the global flags.
+
+        Returns:
+        bool: False only if the flag is known to be missing.
+        """
+        flags = (await cls.get())["bisync_flags" if bisync else "flags"]
+        return not flags or flag.split("=", 1)[0] in flags
+
+    @classmethod
+    async def _probe(cls, key: list[int] | None) -> dict[str, Any]:
+        """
+        Runs rclone to find out its version, commands and flags.
+
+        Parameters:
+        key (list[int] | None): Identity of the binary being probed.
+
+        Returns:
+        dict[str, Any]: The capabilities.
+        """
+        capabilities: dict[str, Any] = {
+            "key": key,
+            "version": str(DEFAULT_VERSION),
+            "commands": [],
+            "flags": [],
+            "bisync_flags": [],
+        }
+        if key is None:
+            logger.info("Rclone binary does not exist in path %s", RCLONE_BIN_PATH)
+            return capabilities
+
+        version_output, help_output, flags_output, bisync_output = await gather(
+            _run_rclone("--version"),
+            _run_rclone("help"),
+            _run_rclone("help", "flags"),
+            _run_rclone("bisync", "--help"),
+        )
+
+        if match := _VERSION_PATTERN.search(version_output):
+            capabilities["version"] = match.group(1)
+        else:
+            logger.warning("Failed to extract the current version of rclone")
+        if "Available commands:" in help_output:
+            commands_output = help_output.split("Available commands:", 1)[1]
+            capabilities["commands"] = sorted(set(_COMMAND_PATTERN.findall(commands_output)))
+        capabilities["flags"] = sorted(set(_FLAG_PATTERN.findall(flags_output)))
+        capabilities["bisync_flags"] = sorted(set(_FLAG_PATTERN.findall(bisync_output)))
+
+        logger.info(
+            "Probed rclone %s: %d commands, %d flags, %d bisync flags",
+            capabilities["version"],
+            len(capabilities["commands"]),
+            len(capabilities["flags"]),
+            len(capabilities["bisync_flags"]),
+        )
+        return capabilities
+
+    @classmethod
+    def _load(cls) -> dict[str, Any] | None:
+        """
+        Reads the persisted capabilities.
+
+        Returns:
+        dict[str, Any] | None: The capabilities, None if there are none.
+        """
+        try:
+            with RCLONE_CAPABILITIES_PATH.open("r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Failed to read %s: %s", RCLONE_CAPABILITIES_PATH, e)
+            return None
+
+    @classmethod
+    def _save(cls, capabilities: dict[str, Any]):
+        """
+        Persists the capabilities atomically.
+
+        Parameters:
+        capabilities (dict[str, Any]): The capabilities.
+        """
+        tmp_path = RCLONE_CAPABILITIES_PATH.with_suffix(".tmp")
+        try:
+            with tmp_path.open("w") as f:
+                json.dump(capabilities, f)
+            tmp_path.replace(RCLONE_CAPABILITIES_PATH)
+        except OSError as e:
+            logger.warning("Failed to write %s: %s", RCLONE_CAPABILITIES_PATH, e)
+
+
+def _get_binary_key() -> list[int] | None:
+    """
+    Returns the identity of the rclone binary.
+
+    Returns:
+    list[int] | None: Size, modification time in nanoseconds and inode, None if it doesn't exist.
+    """
+    try:
+        st = RCLONE_BIN_PATH.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+async def _run_rclone(*args: str) -> str:
+    """
+    Runs rclone and collects its output.
+
+    Parameters:
+    *args (str): The arguments.
+
+    Returns:
+    str: The standard output, empty if rclone failed to run.
+    """
+    try:
+        process = await create_subprocess_exec(
+            RCLONE_BIN_PATH, *args, stdin=DEVNULL, stdout=PIPE, stderr=DEVNULL
+        )
+        stdout, _ = await process.communicate()
+    except OSError as e:
+        logger.warning("Failed to run rclone %s: %s", " ".join(args), e)
+        return ""
+    return stdout.decode(errors="replace")
@@ -1,15 +1,36 @@
-from asyncio import create_subprocess_exec
-from asyncio.subprocess import Process, PIPE
-from time import sleep
+from asyncio import create_subprocess_exec, open_unix_connection, wait_for, to_thread, CancelledError
+from asyncio import get_running_loop, run_coroutine_threadsafe
+from asyncio import sleep as async_sleep
+from asyncio.subprocess import Process, PIPE, DEVNULL, STDOUT
+from datetime import datetime
+from typing import Any, Awaitable, Callable
 from packaging.version import Version
-import re, urllib, subprocess
+import hashlib, json, os, platform, re, shutil, urllib.request, zipfile
 
 from common_defs import *
 from utils import *
+from rclone_capabilities import RcloneCapabilities
+from log_reader import rotate_logs
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# The daemon log is rotated once it's over this size and no job is running
+RCLONE_RC_LOG_MAX_SIZE = 10 * 1024 * 1024
+RCLONE_ARCH_NAMES = {
+    "x86_64": "amd64",
+    "amd64": "amd64",
+    "aarch64": "arm64",
+    "arm64": "arm64",
+    "armv7l": "arm-v7",
+    "i686": "386",
+}
 
 
 class RcloneManager:
     current_spawn: Process | None = None
+    daemon: Process | None = None
+    _daemon_cfg_mtime: float = 0
+    _daemon_log_level = "NOTICE"
+    _active_jobs = 0
 
     @classmethod
     async def spawn(cls, cloud_type: str) -> str:
@@ -24,7 +45,7 @@ class RcloneManager:
         """
         logger.info("Updating rclone.conf")
 
-        cls.kill_current_spawn()
+        await cls.kill_current_spawn()
         if is_port_in_use(RCLONE_PORT):
             raise Exception("RCLONE_PORT_IN_USE")
 
@@ -48,7 +69,7 @@ class RcloneManager:
         return url
 
     @classmethod
-    def kill_current_spawn(cls):
+    async def kill_current_spawn(cls):
         """
         Kills the previous spawned process.
 
@@ -58,7 +79,8 @@ class RcloneManager:
         if cls.current_spawn and cls.current_spawn.returncode is None:
             logger.warning("Killing previous Process")
             cls.current_spawn.kill()
-            sleep(0.1)  # Give time for OS to clear up the port
+            await cls.current_spawn.wait()
+            await async_sleep(0.1)  # Give time for OS to clear up the port
             cls.current_spawn = None
 
     @classmethod
@@ -79,7 +101,7 @@ class RcloneManager:
                 return url_re_match.group(0)
 
         logger.warning("Failed to extract URL from rclone process")
-        cls.kill_current_spawn()
+        await cls.kill_current_spawn()
         return ""
 
     @classmethod
@@ -95,6 +117,219 @@ class RcloneManager:
 
         return cls.current_spawn.returncode
 
+    @classmethod
+    async def start_daemon(cls) -> bool:
+        """
+        Starts a long-lived rclone rc daemon listening on a local unix socket,
+        replacing the previous one if it exists.
+
+        Returns:
+        bool: True if the daemon is up and answering requests.
+        """
+        await cls.stop_daemon()
+        await to_thread(_rotate_daemon_log, False)
+        if not RCLONE_BIN_PATH.exists():
+            logger.info("Rclone binary does not exist, not starting the rc daemon")
+            return False
+        if not await RcloneCapabilities.has_command("rcd"):
+            logger.info("Rclone has no rcd command, not starting the rc daemon")
+            return False
+
+        RCLONE_RC_SOCKET_PATH.unlink(missing_ok=True)
+        arguments = [
+            "--config",
+            str(RCLONE_CFG_PATH),
+            "rcd",
+            "--rc-addr",
+            f"unix://{RCLONE_RC_SOCKET_PATH}",
+            "--rc-no-auth",
+            "--log-file",
+            str(RCLONE_RC_LOG_PATH),
+            "--log-format",
+            "date,time,nolevel",
+        ]
+        # Global flags given to rcd become the defaults of every job it runs
+        arguments.extend(Config.get_config_item("additional_sync_args"))
+
+        cls.daemon = await create_subprocess_exec(
+            str(RCLONE_BIN_PATH),
+            *arguments,
+            stdin=DEVNULL,
+            stdout=DEVNULL,
+            stderr=DEVNULL,
+        )
+        cls._daemon_cfg_mtime = cls._get_cfg_mtime()
+        cls._daemon_log_level = "NOTICE"
+
+        for _ in range(50):
+            if cls.daemon.returncode is not None:
+                break
+            try:
+                await cls.rc_call("rc/noop")
+                logger.info("rclone rc daemon started with pid %d", cls.daemon.pid)
+                return True
+            except OSError:
+                await async_sleep(0.1)
+
+        logger.warning("rclone rc daemon failed to start, falling back to subprocess mode")
+        await cls.stop_daemon()
+        return False
+
+    @classmethod
+    async def stop_daemon(cls):
+        """
+        Stops the rclone rc daemon if it is running.
+        """
+        if cls.daemon and cls.daemon.returncode is None:
+            logger.info("Stopping rclone rc daemon")
+            cls.daemon.terminate()
+            try:
+                await wait_for(cls.daemon.wait(), 5)
+            except TimeoutError:
+                cls.daemon.kill()
+        cls.daemon = None
+        RCLONE_RC_SOCKET_PATH.unlink(missing_ok=True)
+
+    @classmethod
+    def daemon_available(cls) -> bool:
+        """
+        Checks if the rclone rc daemon is running.
+
+        Returns:
+        bool: True if jobs can be submitted to the daemon.
+        """
+        return bool(cls.daemon) and cls.daemon.returncode is None
+
+    @classmethod
+    async def rc_call(cls, command: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
+        """
+        Calls an rc endpoint of the rclone daemon.
+
+        Parameters:
+        command (str): The rc command, e.g. "sync/copy".
+        params (dict[str, Any] | None): The parameters of the command.
+
+        Returns:
+        dict[str, Any]: The decoded response.
+
+        Raises:
+        OSError: If the daemon cannot be reached.
+        Exception: If the daemon rejected the call.
+        """
+        body = json.dumps(params or {}).encode()
+        reader, writer = await open_unix_connection(str(RCLONE_RC_SOCKET_PATH))
+        try:
+            writer.write(
+                (
+                    f"POST /{command} HTTP/1.1\r\n"
+                    "Host: localhost\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode()
+                + body
+            )
+            await writer.drain()
+
+            status_line = await reader.readline()
+            headers = dict()
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                key, _, value = line.decode().partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            if headers.get("transfer-encoding") == "chunked":
+                payload = b""
+                while chunk_size := int((await reader.readline()).strip() or b"0", 16):
+                    payload += await reader.readexactly(chunk_size)
+                    await reader.readline()
+            else:
+                payload = await reader.read()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+        status = int(status_line.split()[1]) if status_line else 0
+        response = json.loads(payload) if payload else {}
+        if status != 200:
+            raise Exception(f"rc {command} failed ({status}): {response.get('error', payload)}")
+        return response
+
+    @classmethod
+    async def rc_job(
+        cls,
+        command: str,
+        params: dict[str, Any],
+        poll_interval: float = 0.1,
+        on_stats: Callable[[dict[str, Any]], Awaitable[None]] | None = None,
+        log_path: Path | None = None,
+        log_level: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        Runs an rc command as an async job on the daemon and waits for it to finish.
+        The job is stopped if the waiting task gets cancelled.
+
+        Parameters:
+        command (str): The rc command, e.g. "sync/copy".
+        params (dict[str, Any]): The parameters of the command.
+        poll_interval (float): Seconds between two job status checks.
+        on_stats (Callable[[dict[str, Any]], Awaitable[None]] | None): Called with the transfer stats
+                                                                      of the job about every second.
+        log_path (Path | None): File the daemon's log output during the job is appended to,
+                                it includes the output of the other jobs running at the same time.
+        log_level (str | None): Log level of the daemon from this job on, e.g. "DEBUG".
+
+        Returns:
+        dict[str, Any]: The final job status, with the job's transfer stats under "stats".
+        """
+        if cls._get_cfg_mtime() != cls._daemon_cfg_mtime:
+            # rclone.conf changed (new cloud or refreshed token), drop cached remotes
+            await cls.rc_call("fscache/clear")
+            cls._daemon_cfg_mtime = cls._get_cfg_mtime()
+        if log_level and (log_level != cls._daemon_log_level):
+            await cls.rc_call("options/set", {"main": {"LogLevel": log_level}})
+            cls._daemon_log_level = log_level
+
+        log_offset = await to_thread(_get_size, RCLONE_RC_LOG_PATH)
+        cls._active_jobs += 1
+        try:
+            job_id = (await cls.rc_call(command, {**params, "_async": True}))["jobid"]
+            logger.debug("Started rc job %d: %s", job_id, command)
+            stats_interval = max(1, round(1 / poll_interval))
+            polls = 0
+            try:
+                while not (status := await cls.rc_call("job/status", {"jobid": job_id}))["finished"]:
+                    polls += 1
+                    if on_stats and (polls % stats_interval == 0):
+                        await on_stats(await cls.rc_call("core/stats", {"group": f"job/{job_id}"}))
+                    await async_sleep(poll_interval)
+            except CancelledError:
+                await cls.rc_call("job/stop", {"jobid": job_id})
+                raise
+
+            status["stats"] = await cls.rc_call("core/stats", {"group": f"job/{job_id}"})
+            if on_stats:
+                await on_stats(status["stats"])
+        finally:
+            cls._active_jobs -= 1
+
+        if log_path:
+            await to_thread(_copy_log, RCLONE_RC_LOG_PATH, log_offset, log_path)
+        if not cls._active_jobs:
+            log_size = await to_thread(_get_size, RCLONE_RC_LOG_PATH)
+            if log_size > RCLONE_RC_LOG_MAX_SIZE:
+                await to_thread(_rotate_daemon_log, True)
+        return status
+
+    @classmethod
+    def _get_cfg_mtime(cls) -> float:
+        """
+        Returns the modification time of rclone.conf, 0 if it doesn't exist.
+        """
+        try:
+            return RCLONE_CFG_PATH.stat().st_mtime
+        except OSError:
+            return 0
+
     @classmethod
     def get_cloud_type(cls) -> str:
         """
@@ -113,32 +348,46 @@ class RcloneManager:
         return ""
 
     @classmethod
-    def update_rclone(cls):
+    async def update_rclone(cls) -> bool:
         """
         Checks for updates to rclone and updates if necessary.
+        The downloads run in worker threads so that other requests are not held up.
+
+        Returns:
+        bool: True if rclone was updated, False if no update was required.
+
+        Raises:
+        Exception: If the download or the verification fails, the current binary is kept.
         """
-        latest_version = cls._get_latest_rclone_version()
+        latest_version = await to_thread(cls._get_latest_rclone_version)
         logger.info("Latest version: %s", latest_version)
-        current_version = cls._get_current_rclone_version()
+        current_version = await cls._get_current_rclone_version()
         logger.info("Current version: %s", current_version)
 
         if latest_version > current_version:
             logger.info("Updating rclone from %s to %s", current_version, latest_version)
-            cls._get_rclone()
-            return
+            loop = get_running_loop()
+            await to_thread(
+                cls._get_rclone,
+                latest_version,
+                lambda progress: run_coroutine_threadsafe(
+                    decky.emit("rclone_update_progress", progress), loop
+                ),
+            )
+            return True
 
         logger.debug("No update required")
-        return "No update required"
+        return False
 
     @classmethod
     def _get_latest_rclone_version(cls) -> Version:
         """
-        Retrieves the latest version of rclone from GitHub.
+        Retrieves the latest version of rclone from the download server.
 
         Returns:
         Version: The latest version of rclone.
         """
-        url = "https://downloads.rclone.org/version.txt"
+        url = f"{_get_download_base_url()}/version.txt"
         try:
             with urllib.request.urlopen(url, context=ssl_context) as response:
                 if response.status == 200:
@@ -149,78 +398,533 @@ class RcloneManager:
         return DEFAULT_VERSION
 
     @classmethod
-    def _get_current_rclone_version(cls) -> Version:
+    async def _get_current_rclone_version(cls) -> Version:
         """
-        Retrieves the current version of rclone from the rclone configuration.
+        Retrieves the current version of rclone, which is only probed again when the binary changes.
 
         Returns:
         Version: The current version of rclone.
         """
-        if not RCLONE_BIN_PATH.exists():
-            logger.info("Rclone binary does not exist in path %s", RCLONE_BIN_PATH)
-            return DEFAULT_VERSION
+        return await RcloneCapabilities.get_version()
+
+    @classmethod
+    def _get_rclone(
+        cls, version: Version, on_progress: Callable[[dict[str, int]], Any] | None = None
+    ) -> None:
+        """
+        Downloads a release of rclone, verifies it against the published SHA256 sums
+        and atomically replaces the current binary with it.
+        The archive is streamed to a temporary file, the binary is never held in memory.
 
-        with subprocess.Popen(
-            [RCLONE_BIN_PATH, "--version"], stdout=subprocess.PIPE
-        ) as p:
-            lines = p.stdout.readlines()
+        Parameters:
+        version (Version): The version to download.
+        on_progress (Callable[[dict[str, int]], Any] | None): Called with the downloaded
+                                                              "bytes" and "total" bytes.
 
-        pattern = re.compile(rb"rclone v[\d\.]+")
-        for line in lines:
-            if re.search(pattern, line):
-                return Version(line.decode().strip().split(' ')[-1])
+        Raises:
+        Exception: If the download or the verification fails, the current binary is kept.
+        """
+        release_url = f"{_get_download_base_url()}/v{version}"
+        zip_name = f"rclone-v{version}-linux-{_get_rclone_arch()}.zip"
+        zip_path = RCLONE_BIN_PATH.with_name("rclone-update.zip")
+        new_bin_path = RCLONE_BIN_PATH.with_name("rclone.new")
 
-        logger.warning("Failed to extract the current version of rclone")
-        return DEFAULT_VERSION
+        try:
+            expected_sha256 = cls._get_release_sha256(f"{release_url}/SHA256SUMS", zip_name)
+            actual_sha256 = _download(f"{release_url}/{zip_name}", zip_path, on_progress)
+            if actual_sha256 != expected_sha256:
+                raise Exception(
+                    f"Checksum mismatch for {zip_name}: {actual_sha256} != {expected_sha256}"
+                )
 
-    @classmethod
-    def _get_rclone(cls) -> None:
-        """
-        Downloads the latest version of rclone and replaces the current version.
-        """
-        download_url = "https://downloads.rclone.org/rclone-current-linux-amd64.zip"
-        with urllib.request.urlopen(download_url, context=ssl_context) as response:
-            if response.status == 200:
-                import io, zipfile
-
-                zip_data = io.BytesIO(response.read())
-                with zipfile.ZipFile(zip_data) as zip_ref:
-                    for entry in zip_ref.namelist():
-                        if entry.endswith("/rclone"):
-                            with open(RCLONE_BIN_PATH, "wb") as f:
-                                f.write(zip_ref.read(entry))
-                            # Make the binary executable
-                            RCLONE_BIN_PATH.chmod(
-                                RCLONE_BIN_PATH.stat().st_mode | 0o111
-                            )
-                            logger.info("Rclone downloaded to %s", RCLONE_BIN_PATH)
-                            return
-                    logger.error(
-                        "Failed to extract the latest version of rclone, zip content: %s",
-                        zip_ref.namelist(),
+            with zipfile.ZipFile(zip_path) as zip_ref:
+                entry = next(
+                    (name for name in zip_ref.namelist() if name.endswith("/rclone")), None
+                )
+                if not entry:
+                    raise Exception(
+                        f"Failed to extract rclone, zip content: {zip_ref.namelist()}"
                     )
-            else:
-                logger.error(
-                    "Failed to download the latest version. HTTP status: %d",
-                    response.status,
+                with zip_ref.open(entry) as src, new_bin_path.open("wb") as dst:
+                    shutil.copyfileobj(src, dst, DOWNLOAD_CHUNK_SIZE)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+
+            new_bin_path.chmod(0o755)
+            new_bin_path.replace(RCLONE_BIN_PATH)
+            logger.info("Rclone %s installed to %s", version, RCLONE_BIN_PATH)
+        finally:
+            zip_path.unlink(missing_ok=True)
+            new_bin_path.unlink(missing_ok=True)
+
+    @classmethod
+    def _get_release_sha256(cls, url: str, file_name: str) -> str:
+        """
+        Looks up the checksum of a release file in the published SHA256SUMS.
+
+        Parameters:
+        url (str): URL of the SHA256SUMS file.
+        file_name (str): Name of the release file.
+
+        Returns:
+        str: The expected SHA256 hex digest.
+
+        Raises:
+        Exception: If the checksum is not published.
+        """
+        with urllib.request.urlopen(url, context=ssl_context) as response:
+            sums = response.read().decode("utf-8", errors="replace")
+
+        # The file is PGP clear-signed, the sum lines are kept as is
+        for line in sums.splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[1].lstrip("*") == file_name:
+                return parts[0].lower()
+
+        raise Exception(f"No SHA256 sum published for {file_name}")
+
+    @classmethod
+    async def list_remote_files(cls, fs: str) -> list[str] | None:
+        """
+        Recursively lists the files under a path of the cloud.
+
+        Parameters:
+        fs (str): The cloud path, e.g. "cloud:deck-sync".
+
+        Returns:
+        list[str] | None: Paths of the files relative to the listed path, None if the listing failed.
+        """
+        if cls.daemon_available():
+            try:
+                result = await cls.rc_call(
+                    "operations/list",
+                    {
+                        "fs": fs,
+                        "remote": "",
+                        "opt": {
+                            "recurse": True,
+                            "filesOnly": True,
+                            "noModTime": True,
+                            "noMimeType": True,
+                        },
+                        "_config": {"UseListR": True},
+                    },
                 )
+                return [item["Path"] for item in result["list"]]
+            except Exception as e:
+                logger.warning("Failed to list %s via rc daemon: %s", fs, e)
+
+        process = await create_subprocess_exec(
+            str(RCLONE_BIN_PATH),
+            "--config",
+            str(RCLONE_CFG_PATH),
+            "lsf",
+            "-R",
+            "--files-only",
+            "--fast-list",
+            fs,
+            stdout=PIPE,
+            stderr=PIPE,
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            logger.error("Failed to list %s: %s", fs, stderr.decode())
+            return None
+
+        return stdout.decode().splitlines()
+
+    @classmethod
+    async def list_remote_entries(
+        cls, fs: str, filter_files: list[Path]
+    ) -> dict[str, tuple[int, str]] | None:
+        """
+        Recursively lists the files of the cloud the filters pick up, with their size and modification time.
+
+        Parameters:
+        fs (str): The cloud path, e.g. "cloud:deck-sync".
+        filter_files (list[Path]): The filter files, relative to fs.
+
+        Returns:
+        dict[str, tuple[int, str]] | None: Size and modification time (RFC 3339) by path
+                                           relative to fs, None if the listing failed.
+        """
+        if cls.daemon_available():
+            try:
+                params: dict[str, Any] = {
+                    "fs": fs,
+                    "remote": "",
+                    "opt": {"recurse": True, "filesOnly": True, "noMimeType": True},
+                    "_config": {"UseListR": True},
+                }
+                if filter_files:
+                    params["_filter"] = {"FilterFrom": [str(f) for f in filter_files]}
+                result = await cls.rc_call("operations/list", params)
+                return {item["Path"]: (item["Size"], item["ModTime"]) for item in result["list"]}
+            except Exception as e:
+                logger.warning("Failed to list %s via rc daemon: %s", fs, e)
+
+        arguments = ["--config", str(RCLONE_CFG_PATH), "lsjson", "-R", "--files-only", "--fast-list"]
+        for filter_file in filter_files:
+            arguments.extend(["--filter-from", str(filter_file)])
+        process = await create_subprocess_exec(
+            str(RCLONE_BIN_PATH), *arguments, fs, stdout=PIPE, stderr=PIPE
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            logger.error("Failed to list %s: %s", fs, stderr.decode())
+            return None
+
+        try:
+            return {item["Path"]: (item["Size"], item["ModTime"]) for item in json.loads(stdout)}
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error("Failed to parse the listing of %s: %s", fs, e)
+            return None
 
     @classmethod
-    def create_cloud_destination(cls):
+    async def create_cloud_destination(cls):
         """
         Creates the cloud destination directory if it doesn't exist.
         """
-        sync_destination = Config.get_config_item("sync_destination")
-        with subprocess.Popen(
-            [
-                RCLONE_BIN_PATH,
-                "--config",
-                RCLONE_CFG_PATH,
-                "mkdir",
-                f"cloud:{sync_destination}",
-                "-v",
-            ],
-            stdout=subprocess.PIPE,
-            text=True,
-        ) as p:
-            logger.debug("Creating cloud destination: %s", p.stdout.read())
+        cloud_path = get_cloud_path(Config.get_config_item("sync_destination"))
+        if cls.daemon_available():
+            try:
+                await cls.rc_call("operations/mkdir", {"fs": cloud_path, "remote": ""})
+                logger.debug("Created cloud destination: %s", cloud_path)
+                return
+            except Exception as e:
+                logger.warning("Failed to create cloud destination via rc daemon: %s", e)
+
+        process = await create_subprocess_exec(
+            RCLONE_BIN_PATH,
+            "--config",
+            RCLONE_CFG_PATH,
+            "mkdir",
+            cloud_path,
+            "-v",
+            stdout=PIPE,
+            stderr=STDOUT,
+        )
+        stdout, _ = await process.communicate()
+        logger.debug("Creating cloud destination: %s", stdout.decode())
+
+    @classmethod
+    async def create_compress_remote(cls):
+        """
+        Creates the compress overlay remote on top of the cloud remote in rclone.conf if it doesn't exist.
+
+        Raises:
+        Exception: If rclone fails to create it.
+        """
+        try:
+            with RCLONE_CFG_PATH.open("r") as f:
+                if f"[{COMPRESS_REMOTE_NAME}]" in (line.strip() for line in f):
+                    return
+        except OSError as e:
+            raise Exception(f"Failed to read rclone config: {e}")
+
+        process = await create_subprocess_exec(
+            RCLONE_BIN_PATH,
+            "--config",
+            RCLONE_CFG_PATH,
+            "config",
+            "create",
+            COMPRESS_REMOTE_NAME,
+            "compress",
+            f"remote={CLOUD_REMOTE_NAME}:",
+            "mode=gzip",
+            stdin=DEVNULL,
+            stdout=PIPE,
+            stderr=STDOUT,
+        )
+        stdout, _ = await process.communicate()
+        if process.returncode != 0:
+            raise Exception(f"Failed to create the compress remote: {stdout.decode()}")
+        logger.info("Created the compress remote %s", COMPRESS_REMOTE_NAME)
+
+    @classmethod
+    async def copy(
+        cls,
+        source: str,
+        destination: str,
+        files_from: Path | None = None,
+        ignore_existing: bool = False,
+        bwlimit_args: list[str] = [],
+        on_process: Callable[[Process, bool], None] | None = None,
+    ) -> int:
+        """
+        Copies files from one rclone path to another without listing the destination.
+
+        Parameters:
+        source (str): The source, e.g. "cloud:deck-sync-chunks".
+        destination (str): The destination.
+        files_from (Path | None): A list of the paths to copy relative to the source, None for all of them.
+        ignore_existing (bool): Skip the files already in the destination without comparing them.
+        bwlimit_args (list[str]): The --bwlimit argument of the rclone process if the daemon is unavailable.
+        on_process (Callable[[Process, bool], None] | None): Called with the rclone process and True once
+                                                             it started, then False once it finished.
+
+        Returns:
+        int: Exit code of rclone.
+        """
+        if cls.daemon_available():
+            params: dict[str, Any] = {
+                "srcFs": source,
+                "dstFs": destination,
+                "_config": {"NoTraverse": True, "IgnoreExisting": ignore_existing},
+            }
+            if files_from:
+                params["_filter"] = {"FilesFromRaw": [str(files_from)]}
+            try:
+                status = await cls.rc_job("sync/copy", params)
+                if status.get("success"):
+                    return 0
+                logger.error("Failed to copy %s to %s: %s", source, destination, status.get("error"))
+                return 1
+            except Exception as e:
+                logger.warning("Failed to copy via rc daemon: %s", e)
+
+        arguments = ["--config", str(RCLONE_CFG_PATH), "copy", source, destination, "--no-traverse"]
+        if files_from:
+            arguments.extend(["--files-from-raw", str(files_from)])
+        if ignore_existing:
+            arguments.append("--ignore-existing")
+        arguments.extend(bwlimit_args)
+        process = await create_subprocess_exec(
+            str(RCLONE_BIN_PATH), *arguments, stdin=DEVNULL, stdout=PIPE, stderr=STDOUT
+        )
+        if on_process:
+            on_process(process, True)
+        try:
+            stdout, _ = await process.communicate()
+        except CancelledError:
+            process.kill()
+            raise
+        finally:
+            if on_process:
+                on_process(process, False)
+        if process.returncode != 0:
+            logger.error("Failed to copy %s to %s: %s", source, destination, stdout.decode())
+        return process.returncode
+
+    @classmethod
+    async def copy_file(cls, source: str, destination: str) -> int:
+        """
+        Copies a single file, like rclone copyto.
+
+        Parameters:
+        source (str): The file to copy, e.g. "cloud:deck-sync-snapshots/123/latest.json".
+        destination (str): The path of the copy.
+
+        Returns:
+        int: Exit code of rclone, 3 or 4 if the source doesn't exist.
+        """
+        if cls.daemon_available():
+            src_fs, src_remote = _split_path(source)
+            dst_fs, dst_remote = _split_path(destination)
+            try:
+                await cls.rc_call(
+                    "operations/copyfile",
+                    {"srcFs": src_fs, "srcRemote": src_remote, "dstFs": dst_fs, "dstRemote": dst_remote},
+                )
+                return 0
+            except OSError as e:
+                logger.warning("Failed to copy via rc daemon: %s", e)
+            except Exception as e:
+                logger.debug("Failed to copy %s to %s: %s", source, destination, e)
+                if "not found" in str(e):
+                    return 4
+                return 1
+
+        process = await create_subprocess_exec(
+            RCLONE_BIN_PATH,
+            "--config",
+            RCLONE_CFG_PATH,
+            "copyto",
+            source,
+            destination,
+            stdin=DEVNULL,
+            stdout=PIPE,
+            stderr=STDOUT,
+        )
+        stdout, _ = await process.communicate()
+        if process.returncode not in (0, 3, 4):
+            logger.error("Failed to copy %s to %s: %s", source, destination, stdout.decode())
+        return process.returncode
+
+    @classmethod
+    async def move(cls, source: str, destination: str) -> int:
+        """
+        Moves everything from one rclone path to another, deleting the emptied source directories.
+
+        Parameters:
+        source (str): The source, e.g. "cloud:deck-sync".
+        destination (str): The destination.
+
+        Returns:
+        int: Exit code of rclone, 3 if the source doesn't exist.
+        """
+        if cls.daemon_available():
+            try:
+                status = await cls.rc_job(
+                    "sync/move",
+                    {"srcFs": source, "dstFs": destination, "deleteEmptySrcDirs": True},
+                )
+                if status.get("success"):
+                    return 0
+                logger.error("Failed to move %s to %s: %s", source, destination, status.get("error"))
+                return 3 if "directory not found" in str(status.get("error")) else 1
+            except Exception as e:
+                logger.warning("Failed to move via rc daemon: %s", e)
+
+        process = await create_subprocess_exec(
+            RCLONE_BIN_PATH,
+            "--config",
+            RCLONE_CFG_PATH,
+            "move",
+            source,
+            destination,
+            "--delete-empty-src-dirs",
+            stdin=DEVNULL,
+            stdout=PIPE,
+            stderr=STDOUT,
+        )
+        stdout, _ = await process.communicate()
+        if process.returncode != 0:
+            logger.error("Failed to move %s to %s: %s", source, destination, stdout.decode())
+        return process.returncode
+
+
+def _split_path(path: str) -> tuple[str, str]:
+    """
+    Splits the path of a file into the rclone fs of its directory and its name, as rc calls expect.
+
+    Parameters:
+    path (str): The path, local or "remote:path".
+
+    Returns:
+    tuple[str, str]: The fs and the file name.
+    """
+    directory, separator, name = path.rpartition("/")
+    if separator:
+        return directory or "/", name
+    remote, separator, name = path.partition(":")
+    return (f"{remote}:", name) if separator else (".", path)
+
+
+def _get_size(path: Path) -> int:
+    """
+    Returns the size of a file.
+
+    Parameters:
+    path (Path): The file.
+
+    Returns:
+    int: The size in bytes, 0 if the file doesn't exist.
+    """
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _copy_log(source: Path, offset: int, destination: Path):
+    """
+    Appends what was logged to a file since an offset to another log file.
+
+    Parameters:
+    source (Path): The log file read.
+    offset (int): Where to start reading.
+    destination (Path): The log file appended to.
+    """
+    try:
+        with source.open("rb") as src, destination.open("ab") as dst:
+            src.seek(offset)
+            shutil.copyfileobj(src, dst)
+    except FileNotFoundError:
+        pass
+
+
+def _rotate_daemon_log(truncate: bool):
+    """
+    Moves the log of the rc daemon aside and compresses it, like the logs of the syncs.
+
+    Parameters:
+    truncate (bool): True while the daemon runs, it keeps the file open in append mode,
+                     so the log is copied and emptied instead of moved.
+    """
+    if not _get_size(RCLONE_RC_LOG_PATH):
+        return
+
+    current_time = datetime.now().strftime("%Y-%m-%d %H.%M.%S")
+    rotated_path = RCLONE_RC_LOG_PATH.with_name(f"{RCLONE_RC_LOG_PATH.stem} {current_time}.log")
+    try:
+        if truncate:
+            shutil.copyfile(RCLONE_RC_LOG_PATH, rotated_path)
+            os.truncate(RCLONE_RC_LOG_PATH, 0)
+        else:
+            RCLONE_RC_LOG_PATH.replace(rotated_path)
+    except OSError as e:
+        logger.warning("Failed to rotate %s: %s", RCLONE_RC_LOG_PATH, e)
+        return
+    rotate_logs(RCLONE_RC_LOG_PATH.parent, f"{RCLONE_RC_LOG_PATH.stem} *.log", 0)
+
+
+def _get_download_base_url() -> str:
+    """
+    Returns the base URL of the rclone downloads, which can point to a mirror or a local server.
+
+    Returns:
+    str: The URL without a trailing slash.
+    """
+    return Config.get_config_item("rclone_download_url").rstrip("/")
+
+
+def _get_rclone_arch() -> str:
+    """
+    Returns the architecture of the rclone release to download.
+
+    Returns:
+    str: The architecture as named by the rclone releases, e.g. "amd64".
+    """
+    if arch := Config.get_config_item("rclone_arch"):
+        return arch
+    machine = platform.machine().lower()
+    return RCLONE_ARCH_NAMES.get(machine, machine)
+
+
+def _download(
+    url: str, path: Path, on_progress: Callable[[dict[str, int]], Any] | None = None
+) -> str:
+    """
+    Streams a download to a file, hashing it on the way.
+
+    Parameters:
+    url (str): The URL to download.
+    path (Path): The file to write.
+    on_progress (Callable[[dict[str, int]], Any] | None): Called with the downloaded
+                                                          "bytes" and "total" bytes.
+
+    Returns:
+    str: The SHA256 hex digest of the downloaded file.
+    """
+    digest = hashlib.sha256()
+    downloaded = 0
+    reported_percent = -1
+    with urllib.request.urlopen(url, context=ssl_context) as response, path.open("wb") as f:
+        total = int(response.headers.get("Content-Length") or 0)
+        while chunk := response.read(DOWNLOAD_CHUNK_SIZE):
+            f.write(chunk)
+            digest.update(chunk)
+            downloaded += len(chunk)
+
+            percent = downloaded * 100 // total if total else 0
+            if percent // 10 > reported_percent // 10:
+                reported_percent = percent
+                logger.info("Downloading %s: %d/%d bytes", url, downloaded, total)
+                if on_progress:
+                    on_progress({"bytes": downloaded, "total": total})
+
+    if on_progress and not total:
+        # Without a known size only the start has been reported
+        on_progress({"bytes": downloaded, "total": downloaded})
+    return digest.hexdigest()
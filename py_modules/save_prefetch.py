@@ -0,0 +1,211 @@
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+import asyncio, os, shutil
+
+import decky
+
+from common_defs import *
+from config import Config
+from bisync_fast_path import parse_time, REMOTE_MODTIME_TOLERANCE
+
+PREFETCH_STAGING_DIR = Path(decky.DECKY_PLUGIN_RUNTIME_DIR) / "prefetch"
+PREFETCH_IDLE_INTERVAL = 15 * 60
+PREFETCH_IDLE_TARGETS = 3
+
+
+def find_outdated_files(local_path: str, remote: dict[str, tuple[int, str]]) -> list[str]:
+    """
+    Finds the files rclone copy would download, i.e. those whose size or modification time differ.
+
+    Parameters:
+    local_path (str): The local root the paths are relative to.
+    remote (dict[str, tuple[int, str]]): Size and modification time (RFC 3339) of the cloud files by path.
+
+    Returns:
+    list[str]: The paths to download.
+
+    Raises:
+    ValueError: If a modification time is malformed.
+    """
+    outdated = list()
+    for path, (size, modtime) in remote.items():
+        try:
+            st = os.stat(os.path.join(local_path, path))
+        except OSError:
+            outdated.append(path)
+            continue
+        if (st.st_size != size) or (abs(st.st_mtime_ns / 1e9 - parse_time(modtime)) > REMOTE_MODTIME_TOLERANCE):
+            outdated.append(path)
+    return outdated
+
+
+def move_staged_files(staging_dir: Path, local_path: str, paths: list[str]):
+    """
+    Moves downloaded files into place, renaming them if they are on the same filesystem.
+
+    Parameters:
+    staging_dir (Path): Where the files were downloaded.
+    local_path (str): The local root the paths are relative to.
+    paths (list[str]): The files to move.
+    """
+    for path in paths:
+        destination = os.path.join(local_path, path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.move(staging_dir / path, destination)
+
+
+class SavePrefetch:
+    """
+    Keeps track of the cloud files of the games downloaded ahead of their launch, and counts
+    how often the download on game start could use them instead of running rclone.
+    """
+
+    _staged: dict[str, dict[str, tuple[int, str]]] = dict()
+    _task: asyncio.Task | None = None
+    _applies = 0
+    _hits = 0
+    _misses: dict[str, int] = dict()
+    _hit_seconds = 0.0
+    _downloads = 0
+    _download_seconds = 0.0
+
+    @classmethod
+    def get_staging_dir(cls, target_id: str) -> Path:
+        """
+        Returns where the files of a target are downloaded ahead of time.
+
+        Parameters:
+        target_id (str): ID of the sync target.
+
+        Returns:
+        Path: The staging directory, laid out like the local root.
+        """
+        return PREFETCH_STAGING_DIR / target_id
+
+    @classmethod
+    def get_staged(cls, target_id: str) -> dict[str, tuple[int, str]] | None:
+        """
+        Retrieves the cloud listing the staged files of a target were downloaded from.
+
+        Parameters:
+        target_id (str): ID of the sync target.
+
+        Returns:
+        dict[str, tuple[int, str]] | None: Size and modification time by path, None if nothing is staged.
+        """
+        return cls._staged.get(target_id)
+
+    @classmethod
+    def set_staged(cls, target_id: str, remote: dict[str, tuple[int, str]]):
+        """
+        Records that the files of a target are staged.
+
+        Parameters:
+        target_id (str): ID of the sync target.
+        remote (dict[str, tuple[int, str]]): The cloud listing they were downloaded from.
+        """
+        cls._staged[target_id] = remote
+
+    @classmethod
+    def discard(cls, target_id: str):
+        """
+        Deletes the staged files of a target.
+
+        Parameters:
+        target_id (str): ID of the sync target.
+        """
+        cls._staged.pop(target_id, None)
+        shutil.rmtree(cls.get_staging_dir(target_id), ignore_errors=True)
+
+    @classmethod
+    def record_apply(cls, duration: float, miss_reason: str | None = None):
+        """
+        Records a download on game start that tried to use the staged files.
+
+        Parameters:
+        duration (float): Time it took in seconds.
+        miss_reason (str | None): Why rclone had to run, None if the staged files were used.
+        """
+        cls._applies += 1
+        if miss_reason is None:
+            cls._hits += 1
+            cls._hit_seconds += duration
+            logger.info("Prefetch hit in %.3fs, %d of %d downloads", duration, cls._hits, cls._applies)
+        else:
+            cls._misses[miss_reason] = cls._misses.get(miss_reason, 0) + 1
+            logger.info("Prefetch miss in %.3fs: %s", duration, miss_reason)
+
+    @classmethod
+    def record_download(cls, duration: float):
+        """
+        Records the duration of a download on game start that ran rclone.
+
+        Parameters:
+        duration (float): Time the download took in seconds.
+        """
+        cls._downloads += 1
+        cls._download_seconds += duration
+
+    @classmethod
+    def get_stats(cls) -> dict[str, Any]:
+        """
+        Retrieves the statistics of the prefetch since the plugin started.
+
+        Returns:
+        dict[str, Any]: The "staged" targets, the downloads that tried to use them ("applies"),
+                        "hits", "misses" by reason, "hit_rate", and the average "hit_seconds"
+                        and "download_seconds" of the downloads that used or ran rclone.
+        """
+        return {
+            "staged": list(cls._staged),
+            "applies": cls._applies,
+            "hits": cls._hits,
+            "misses": dict(cls._misses),
+            "hit_rate": cls._hits / cls._applies if cls._applies else 0,
+            "hit_seconds": cls._hit_seconds / cls._hits if cls._hits else 0,
+            "download_seconds": cls._download_seconds / cls._downloads if cls._downloads else 0,
+        }
+
+    @classmethod
+    def start(cls, prefetch_targets: Callable[[], Awaitable[None]]):
+        """
+        Starts prefetching the likely launched games periodically.
+
+        Parameters:
+        prefetch_targets (Callable[[], Awaitable[None]]): Prefetches the targets if the Deck is idle.
+        """
+        if cls._task:
+            return
+        shutil.rmtree(PREFETCH_STAGING_DIR, ignore_errors=True)
+        cls._task = asyncio.create_task(cls._run(prefetch_targets))
+
+    @classmethod
+    async def stop(cls):
+        """
+        Stops the periodic prefetch.
+        """
+        if not cls._task:
+            return
+        cls._task.cancel()
+        try:
+            await cls._task
+        except asyncio.CancelledError:
+            pass
+        cls._task = None
+
+    @classmethod
+    async def _run(cls, prefetch_targets: Callable[[], Awaitable[None]]):
+        """
+        Calls prefetch_targets every PREFETCH_IDLE_INTERVAL while the prefetch is enabled.
+
+        Parameters:
+        prefetch_targets (Callable[[], Awaitable[None]]): Prefetches the targets if the Deck is idle.
+        """
+        while True:
+            await asyncio.sleep(PREFETCH_IDLE_INTERVAL)
+            if not Config.get_config_item("save_prefetch"):
+                continue
+            try:
+                await prefetch_targets()
+            except Exception as e:
+                logger.error("Error during prefetch: %s", e)
@@ -0,0 +1,527 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+import asyncio, hashlib, json, os, shutil
+
+from common_defs import *
+from rclone_manager import RcloneManager
+
+CHUNK_MIN_SIZE = 16 * 1024
+CHUNK_MAX_SIZE = 256 * 1024
+# 16 bits spread over the hash for chunks of ~64 KiB past the minimum on average
+CHUNK_MASK = 0x0000D9F003570000
+CHUNK_READ_SIZE = 1024 * 1024
+# The rolling hash reads about 5 MB/s, bigger files go through the mirror
+CHUNK_FILE_MAX_SIZE = 16 * 1024 * 1024
+SNAPSHOT_VERSION = 1
+LATEST_SNAPSHOT = "latest"
+
+# Derived from the byte values so that every device cuts the same chunks
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "little") for i in range(256)]
+_HASH_MASK = (1 << 64) - 1
+
+
+def find_chunk_end(data: bytes | bytearray, start: int, end: int) -> int:
+    """
+    Finds where the chunk starting at an offset ends, using a gear rolling hash so that
+    an insertion only moves the boundaries next to it.
+
+    Parameters:
+    data (bytes | bytearray): The data.
+    start (int): Offset of the chunk.
+    end (int): End of the data available.
+
+    Returns:
+    int: The offset right after the chunk.
+    """
+    limit = min(end, start + CHUNK_MAX_SIZE)
+    offset = start + CHUNK_MIN_SIZE
+    if offset >= limit:
+        return limit
+
+    gear, hash_mask, chunk_mask = _GEAR, _HASH_MASK, CHUNK_MASK
+    h = 0
+    for offset, byte in enumerate(data[offset:limit], offset + 1):
+        h = ((h << 1) + gear[byte]) & hash_mask
+        if not h & chunk_mask:
+            return offset
+    return limit
+
+
+def chunk_file(path: str, staging_dir: Path | None = None, known: set[str] | None = None) -> list[list]:
+    """
+    Splits a file into content-defined chunks.
+
+    Parameters:
+    path (str): The file.
+    staging_dir (Path | None): Write the chunks missing from known here, named by their hash.
+    known (set[str] | None): Hashes of the chunks already stored, updated with the staged ones,
+                             required with staging_dir.
+
+    Returns:
+    list[list]: The [hash, size] of every chunk in order.
+
+    Raises:
+    OSError: If the file cannot be read.
+    """
+    chunks = list()
+    buffer = bytearray()
+    start = 0
+    eof = False
+    with open(path, "rb") as f:
+        while (start < len(buffer)) or not eof:
+            if (len(buffer) - start < CHUNK_MAX_SIZE) and (not eof):
+                # Drop the consumed chunks once per read rather than once per chunk
+                del buffer[:start]
+                start = 0
+                data = f.read(CHUNK_READ_SIZE)
+                eof = not data
+                buffer += data
+                continue
+
+            end = find_chunk_end(buffer, start, len(buffer))
+            with memoryview(buffer) as view:
+                chunk = view[start:end]
+                digest = hashlib.sha256(chunk).hexdigest()
+                chunks.append([digest, len(chunk)])
+                if (staging_dir is not None) and (digest not in known):
+                    _write_chunk(staging_dir, digest, chunk)
+                    known.add(digest)
+                chunk.release()
+            start = end
+    return chunks
+
+
+class SnapshotStore:
+    """
+    Keeps the files of a sync target in the cloud as content-defined chunks, stored once by
+    their hash in an area shared by every target, and a manifest per snapshot listing the
+    chunks of each file. Only the chunks that aren't stored yet are uploaded, and only the
+    chunks not found in the local files are downloaded on restore.
+
+    The last snapshot uploaded or restored is kept locally, so that unchanged files are
+    neither read again nor uploaded. Every path can be local, which allows testing the
+    store without a cloud.
+    """
+
+    def __init__(
+        self,
+        target_id: str,
+        local_path: str,
+        chunks_fs: str,
+        snapshots_fs: str,
+        state_path: Path,
+        staging_dir: Path,
+    ):
+        """
+        Parameters:
+        target_id (str): ID of the sync target.
+        local_path (str): The local root the file paths are relative to.
+        chunks_fs (str): Where the chunks are stored, e.g. "cloud:deck-sync-chunks".
+        snapshots_fs (str): Where the manifests of the target are stored, e.g. "cloud:deck-sync-snapshots/123".
+        state_path (Path): Local copy of the last snapshot.
+        staging_dir (Path): Temporary directory for the chunks being transferred.
+        """
+        self._id = target_id
+        self._local_path = local_path
+        self._chunks_fs = chunks_fs
+        self._snapshots_fs = snapshots_fs
+        self._state_path = state_path
+        self._staging_dir = staging_dir
+
+    async def upload(self, files: dict[str, tuple[int, int]]) -> dict[str, Any]:
+        """
+        Uploads a snapshot of the local files, skipping it if they didn't change since the last one.
+
+        Parameters:
+        files (dict[str, tuple[int, int]]): Size and modification time in ns by path, relative to the local root.
+
+        Returns:
+        dict[str, Any]: The "exit_code", the number of "files", of files read ("changed_files"),
+                        "chunks" and chunks uploaded ("new_chunks") with their "bytes".
+        """
+        previous = await asyncio.to_thread(self._load_state)
+        previous_files = previous["files"] if previous else dict()
+        stats: dict[str, Any] = {"exit_code": 0, "files": len(files), "changed_files": 0,
+                                 "chunks": 0, "new_chunks": 0, "bytes": 0}
+        if (files.keys() == previous_files.keys()) and all(
+            _is_unchanged(previous_files[path], size, mtime_ns)
+            for path, (size, mtime_ns) in files.items()
+        ):
+            logger.info('No changes for "%s" since the last snapshot, skipping', self._id)
+            return stats
+
+        try:
+            manifest = await asyncio.to_thread(self._build_snapshot, files, previous_files, stats)
+            if stats["new_chunks"]:
+                stats["exit_code"] = await RcloneManager.copy(
+                    str(self._staging_dir), self._chunks_fs, ignore_existing=True
+                )
+                if stats["exit_code"] != 0:
+                    return stats
+
+            manifest_path = self._staging_dir.with_suffix(".json")
+            await asyncio.to_thread(_write_json, manifest_path, manifest)
+            name = datetime.fromtimestamp(manifest["time"], timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            for snapshot in (name, LATEST_SNAPSHOT):
+                stats["exit_code"] = await RcloneManager.copy_file(
+                    str(manifest_path), f"{self._snapshots_fs}/{snapshot}.json"
+                )
+                if stats["exit_code"] != 0:
+                    return stats
+            manifest_path.replace(self._state_path)
+        finally:
+            await asyncio.to_thread(self._clean_staging)
+
+        logger.info(
+            'Snapshot of "%s" uploaded: %d files, %d read, %d new of %d chunks, %d bytes',
+            self._id,
+            stats["files"],
+            stats["changed_files"],
+            stats["new_chunks"],
+            stats["chunks"],
+            stats["bytes"],
+        )
+        return stats
+
+    async def upload_mirror_marker(self) -> int:
+        """
+        Replaces the latest snapshot with a marker sending the restores to the mirror,
+        for when the files are uploaded there instead.
+
+        Returns:
+        int: Exit code of the upload.
+        """
+        manifest_path = self._staging_dir.with_suffix(".json")
+        marker = {
+            "version": SNAPSHOT_VERSION,
+            "target": self._id,
+            "chunks_fs": self._chunks_fs,
+            "time": datetime.now(timezone.utc).timestamp(),
+            "mirror": True,
+            "files": {},
+        }
+        try:
+            await asyncio.to_thread(_write_json, manifest_path, marker)
+            exit_code = await RcloneManager.copy_file(
+                str(manifest_path), f"{self._snapshots_fs}/{LATEST_SNAPSHOT}.json"
+            )
+        finally:
+            await asyncio.to_thread(self._clean_staging)
+        await asyncio.to_thread(self.clear)
+        return exit_code
+
+    async def restore(
+        self,
+        files: dict[str, tuple[int, int]],
+        delete_missing: bool = False,
+        name: str = LATEST_SNAPSHOT,
+    ) -> dict[str, Any] | None:
+        """
+        Restores a snapshot, rebuilding the files that differ from it.
+
+        Parameters:
+        files (dict[str, tuple[int, int]]): Size and modification time in ns of the current local files by path.
+        delete_missing (bool): Delete the local files that aren't in the snapshot.
+        name (str): The snapshot to restore, the latest one by default.
+
+        Returns:
+        dict[str, Any] | None: The "exit_code", the number of "files" of the snapshot, of files
+                               rebuilt ("changed_files") or deleted ("deleted_files"), "chunks" needed
+                               and chunks downloaded ("new_chunks") with their "bytes".
+                               None if the snapshot doesn't exist or the files are in the mirror.
+        """
+        manifest_path = self._staging_dir.with_suffix(".json")
+        exit_code = await RcloneManager.copy_file(f"{self._snapshots_fs}/{name}.json", str(manifest_path))
+        if exit_code in (3, 4):
+            return None
+        stats: dict[str, Any] = {"exit_code": exit_code, "files": 0, "changed_files": 0,
+                                 "deleted_files": 0, "chunks": 0, "new_chunks": 0, "bytes": 0}
+        if exit_code != 0:
+            return stats
+
+        try:
+            manifest = await asyncio.to_thread(_read_json, manifest_path)
+            if (not manifest) or (manifest.get("version") != SNAPSHOT_VERSION):
+                logger.error('Snapshot "%s" of "%s" cannot be read', name, self._id)
+                stats["exit_code"] = 1
+                return stats
+            if manifest.get("mirror"):
+                logger.info('The files of "%s" were last uploaded to the mirror', self._id)
+                return None
+
+            stats["files"] = len(manifest["files"])
+            changed, missing = await asyncio.to_thread(self._stage_local_chunks, manifest, files, stats)
+            if missing:
+                files_from = self._staging_dir.with_suffix(".files")
+                with files_from.open("w") as f:
+                    f.write("\n".join(f"{digest[:2]}/{digest}" for digest in missing))
+                stats["exit_code"] = await RcloneManager.copy(
+                    self._chunks_fs, str(self._staging_dir), files_from
+                )
+                if stats["exit_code"] != 0:
+                    return stats
+
+            await asyncio.to_thread(self._rebuild_files, manifest, changed)
+            if delete_missing:
+                for path in files.keys() - manifest["files"].keys():
+                    os.unlink(os.path.join(self._local_path, path))
+                    stats["deleted_files"] += 1
+            manifest_path.replace(self._state_path)
+        except (OSError, ValueError) as e:
+            logger.error('Failed to restore snapshot "%s" of "%s": %s', name, self._id, e)
+            stats["exit_code"] = 1
+            return stats
+        finally:
+            await asyncio.to_thread(self._clean_staging)
+
+        logger.info(
+            'Snapshot of "%s" restored: %d files, %d rebuilt, %d deleted, %d downloaded of %d chunks, %d bytes',
+            self._id,
+            stats["files"],
+            stats["changed_files"],
+            stats["deleted_files"],
+            stats["new_chunks"],
+            stats["chunks"],
+            stats["bytes"],
+        )
+        return stats
+
+    def clear(self):
+        """
+        Forgets the last snapshot, so that the next upload reads every file.
+        """
+        self._state_path.unlink(missing_ok=True)
+
+    def _build_snapshot(
+        self,
+        files: dict[str, tuple[int, int]],
+        previous_files: dict[str, dict[str, Any]],
+        stats: dict[str, Any],
+    ) -> dict[str, Any]:
+        """
+        Chunks the files changed since the previous snapshot, staging the chunks it doesn't contain.
+
+        Parameters:
+        files (dict[str, tuple[int, int]]): Size and modification time in ns by path.
+        previous_files (dict[str, dict[str, Any]]): The files of the previous snapshot.
+        stats (dict[str, Any]): Updated with the files read and the chunks staged.
+
+        Returns:
+        dict[str, Any]: The manifest of the snapshot.
+        """
+        known = {digest for entry in previous_files.values() for digest, _ in entry["chunks"]}
+        staged = set(known)
+        manifest_files = dict()
+        for path, (size, mtime_ns) in files.items():
+            entry = previous_files.get(path)
+            if (not entry) or (not _is_unchanged(entry, size, mtime_ns)):
+                local_path = os.path.join(self._local_path, path)
+                try:
+                    mode = os.stat(local_path).st_mode & 0o7777
+                    entry = {
+                        "size": size,
+                        "mtime_ns": mtime_ns,
+                        "mode": mode,
+                        "chunks": chunk_file(local_path, self._staging_dir, staged),
+                    }
+                except OSError as e:
+                    logger.warning("Skipping %s in the snapshot: %s", local_path, e)
+                    continue
+                stats["changed_files"] += 1
+            manifest_files[path] = entry
+            stats["chunks"] += len(entry["chunks"])
+
+        # Chunks of a file that vanished while being read may be staged but not referenced
+        new_chunks = staged - known
+        sizes = {digest: size for entry in manifest_files.values() for digest, size in entry["chunks"]}
+        stats["new_chunks"] = len(new_chunks)
+        stats["bytes"] = sum(sizes[digest] for digest in new_chunks if digest in sizes)
+        return {
+            "version": SNAPSHOT_VERSION,
+            "target": self._id,
+            "chunks_fs": self._chunks_fs,
+            "time": datetime.now(timezone.utc).timestamp(),
+            "files": manifest_files,
+        }
+
+    def _stage_local_chunks(
+        self,
+        manifest: dict[str, Any],
+        files: dict[str, tuple[int, int]],
+        stats: dict[str, Any],
+    ) -> tuple[list[str], set[str]]:
+        """
+        Finds the files that differ from a snapshot and copies the chunks they need from the
+        local files to the staging directory, before any of them gets overwritten.
+
+        Parameters:
+        manifest (dict[str, Any]): The snapshot.
+        files (dict[str, tuple[int, int]]): Size and modification time in ns of the local files by path.
+        stats (dict[str, Any]): Updated with the files to rebuild and the chunks to download.
+
+        Returns:
+        tuple[list[str], set[str]]: The paths to rebuild and the hashes of the chunks to download.
+        """
+        changed = [
+            path for path, entry in manifest["files"].items()
+            if (path not in files) or (not _is_unchanged(entry, *files[path]))
+        ]
+        needed = {digest for path in changed for digest, _ in manifest["files"][path]["chunks"]}
+        stats["changed_files"] = len(changed)
+        stats["chunks"] = len(needed)
+
+        # Chunks of local files whose content is known from this or the last snapshot,
+        # and of the older versions of the files to rebuild, which usually share most of them
+        sources: dict[str, tuple[str, int, int]] = dict()
+        state = self._load_state()
+        known_files = [
+            (path, entry["chunks"])
+            for snapshot_files in ((state or {}).get("files", {}), manifest["files"])
+            for path, entry in snapshot_files.items()
+            if (path in files) and _is_unchanged(entry, *files[path])
+        ]
+        for path in changed:
+            if (path in files) and (files[path][0] <= CHUNK_FILE_MAX_SIZE):
+                try:
+                    known_files.append((path, chunk_file(os.path.join(self._local_path, path))))
+                except OSError:
+                    continue
+        for path, chunks in known_files:
+            offset = 0
+            for digest, size in chunks:
+                if digest in needed:
+                    sources.setdefault(digest, (path, offset, size))
+                offset += size
+
+        missing = set(needed)
+        for digest, (path, offset, size) in sources.items():
+            try:
+                with open(os.path.join(self._local_path, path), "rb") as f:
+                    f.seek(offset)
+                    chunk = f.read(size)
+            except OSError:
+                continue
+            if hashlib.sha256(chunk).hexdigest() == digest:
+                _write_chunk(self._staging_dir, digest, chunk)
+                missing.discard(digest)
+
+        stats["new_chunks"] = len(missing)
+        sizes = {digest: size for path in changed for digest, size in manifest["files"][path]["chunks"]}
+        stats["bytes"] = sum(sizes[digest] for digest in missing)
+        return changed, missing
+
+    def _rebuild_files(self, manifest: dict[str, Any], changed: list[str]):
+        """
+        Writes the files of a snapshot from the staged chunks, replacing each file atomically.
+
+        Parameters:
+        manifest (dict[str, Any]): The snapshot.
+        changed (list[str]): The paths to rebuild.
+
+        Raises:
+        ValueError: If a chunk is corrupted.
+        """
+        for path in changed:
+            entry = manifest["files"][path]
+            local_path = os.path.join(self._local_path, path)
+            tmp_path = f"{local_path}.sdh-restore"
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                for digest, _ in entry["chunks"]:
+                    with (self._staging_dir / digest[:2] / digest).open("rb") as chunk_file:
+                        chunk = chunk_file.read()
+                    if hashlib.sha256(chunk).hexdigest() != digest:
+                        raise ValueError(f"Chunk {digest} of {path} is corrupted")
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, entry["mode"])
+            os.utime(tmp_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            os.replace(tmp_path, local_path)
+
+    def _load_state(self) -> dict[str, Any] | None:
+        """
+        Reads the local copy of the last snapshot.
+
+        Returns:
+        dict[str, Any] | None: The snapshot, None if there is none or it belongs to another chunk store.
+        """
+        state = _read_json(self._state_path)
+        if (
+            (not state)
+            or (state.get("version") != SNAPSHOT_VERSION)
+            or (state.get("chunks_fs") != self._chunks_fs)
+        ):
+            return None
+        return state
+
+    def _clean_staging(self):
+        """
+        Deletes the staging directory and the files next to it.
+        """
+        shutil.rmtree(self._staging_dir, ignore_errors=True)
+        for suffix in (".json", ".files"):
+            self._staging_dir.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def _is_unchanged(entry: dict[str, Any], size: int, mtime_ns: int) -> bool:
+    """
+    Checks if a file still matches its snapshot entry.
+
+    Parameters:
+    entry (dict[str, Any]): The snapshot entry.
+    size (int): Current size of the file.
+    mtime_ns (int): Current modification time in ns.
+
+    Returns:
+    bool: True if the size and modification time are the same.
+    """
+    return (entry["size"] == size) and (entry["mtime_ns"] == mtime_ns)
+
+
+def _write_chunk(staging_dir: Path, digest: str, chunk: bytes | memoryview):
+    """
+    Writes a chunk to the staging directory, laid out like the chunk store.
+
+    Parameters:
+    staging_dir (Path): The staging directory.
+    digest (str): Hash of the chunk.
+    chunk (bytes | memoryview): The chunk.
+    """
+    path = staging_dir / digest[:2] / digest
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(chunk)
+
+
+def _read_json(path: Path) -> dict[str, Any] | None:
+    """
+    Reads a JSON file.
+
+    Parameters:
+    path (Path): The file.
+
+    Returns:
+    dict[str, Any] | None: The content, None if the file is missing or invalid.
+    """
+    try:
+        with path.open("r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Failed to read %s: %s", path, e)
+        return None
+
+
+def _write_json(path: Path, content: dict[str, Any]):
+    """
+    Writes a JSON file.
+
+    Parameters:
+    path (Path): The file.
+    content (dict[str, Any]): The content.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w") as f:
+        json.dump(content, f)
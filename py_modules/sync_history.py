@@ -0,0 +1,237 @@
+from typing import Any
+import asyncio, sqlite3, threading, time
+
+from common_defs import *
+from config import Config
+
+SYNC_HISTORY_PATH = PLUGIN_STATE_DIR / "sync_history.sqlite3"
+SYNC_HISTORY_PRUNE_INTERVAL = 100
+SYNC_HISTORY_GROUPS = ("target", "mode", "execution", "rclone_version", "profile")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    target TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    winner TEXT NOT NULL,
+    execution TEXT NOT NULL,
+    rclone_version TEXT,
+    profile TEXT,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    duration REAL NOT NULL,
+    spawn_seconds REAL,
+    list_seconds REAL,
+    transfer_seconds REAL,
+    files INTEGER,
+    bytes INTEGER,
+    exit_code INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_start ON runs (start);
+CREATE INDEX IF NOT EXISTS runs_target_start ON runs (target, start);
+"""
+
+
+class SyncHistory:
+    """
+    Keeps a record of every rclone run in a SQLite database and aggregates them,
+    runs older than "sync_history_days" are pruned.
+
+    The database is only accessed from worker threads, one at a time.
+    """
+
+    _connection: sqlite3.Connection | None = None
+    _lock = threading.Lock()
+    _inserts = 0
+
+    @classmethod
+    async def record(cls, run: dict[str, Any]):
+        """
+        Records a run.
+
+        Parameters:
+        run (dict[str, Any]): The values of the columns of the runs table, except the id.
+        """
+        try:
+            await asyncio.to_thread(cls._insert, run)
+        except sqlite3.Error as e:
+            logger.warning("Failed to record sync history: %s", e)
+
+    @classmethod
+    async def get_duration_stats(cls, days: int = 30, group_by: str = "target") -> list[dict[str, Any]]:
+        """
+        Aggregates the durations of the recent runs.
+
+        Parameters:
+        days (int): Number of days to look back.
+        group_by (str): "target", "mode", "execution", "rclone_version" or "profile".
+
+        Returns:
+        list[dict[str, Any]]: Per group, the number of runs and failures, p50, p95 and max duration,
+                              the average spawn, listing and transfer seconds, and the files
+                              and bytes transferred, slowest p95 first.
+        """
+        if group_by not in SYNC_HISTORY_GROUPS:
+            raise ValueError(f"Cannot group sync history by {group_by}")
+        return await asyncio.to_thread(cls._query_duration_stats, days, group_by)
+
+    @classmethod
+    async def get_daily_bytes(cls, days: int = 30) -> list[dict[str, Any]]:
+        """
+        Sums the transfers of the recent runs per day.
+
+        Parameters:
+        days (int): Number of days to look back.
+
+        Returns:
+        list[dict[str, Any]]: The "day" (YYYY-MM-DD, local time), "runs", "files" and "bytes", oldest first.
+        """
+        rows = await asyncio.to_thread(
+            cls._query,
+            """
+            SELECT date(start, 'unixepoch', 'localtime') AS day,
+                   COUNT(*) AS runs, TOTAL(files) AS files, TOTAL(bytes) AS bytes
+            FROM runs WHERE start >= ? GROUP BY day ORDER BY day
+            """,
+            (time.time() - days * 86400,),
+        )
+        return [{**row, "files": int(row["files"]), "bytes": int(row["bytes"])} for row in rows]
+
+    @classmethod
+    async def get_runs(cls, target: str | None = None, limit: int = 50) -> list[dict[str, Any]]:
+        """
+        Retrieves the most recent runs.
+
+        Parameters:
+        target (str | None): Only the runs of this target, None for all of them.
+        limit (int): Max number of runs.
+
+        Returns:
+        list[dict[str, Any]]: The runs, newest first.
+        """
+        if target is None:
+            return await asyncio.to_thread(
+                cls._query, "SELECT * FROM runs ORDER BY start DESC LIMIT ?", (limit,)
+            )
+        return await asyncio.to_thread(
+            cls._query,
+            "SELECT * FROM runs WHERE target = ? ORDER BY start DESC LIMIT ?",
+            (target, limit),
+        )
+
+    @classmethod
+    def close(cls):
+        """
+        Closes the database.
+        """
+        with cls._lock:
+            if cls._connection:
+                cls._connection.close()
+                cls._connection = None
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection:
+        """
+        Opens the database and creates the schema if needed. The caller holds the lock.
+
+        Returns:
+        sqlite3.Connection: The connection.
+        """
+        if not cls._connection:
+            cls._connection = sqlite3.connect(SYNC_HISTORY_PATH, check_same_thread=False)
+            cls._connection.row_factory = sqlite3.Row
+            cls._connection.execute("PRAGMA journal_mode=WAL")
+            cls._connection.executescript(_SCHEMA)
+            columns = {row["name"] for row in cls._connection.execute("PRAGMA table_info(runs)")}
+            if "profile" not in columns:
+                # Databases created before the sync profiles
+                cls._connection.execute("ALTER TABLE runs ADD COLUMN profile TEXT")
+            cls._prune()
+        return cls._connection
+
+    @classmethod
+    def _insert(cls, run: dict[str, Any]):
+        """
+        Inserts a run, pruning the old ones every SYNC_HISTORY_PRUNE_INTERVAL runs.
+
+        Parameters:
+        run (dict[str, Any]): The values of the columns.
+        """
+        columns = ", ".join(run)
+        placeholders = ", ".join(f":{column}" for column in run)
+        with cls._lock:
+            connection = cls._connect()
+            with connection:
+                connection.execute(f"INSERT INTO runs ({columns}) VALUES ({placeholders})", run)
+            cls._inserts += 1
+            if cls._inserts % SYNC_HISTORY_PRUNE_INTERVAL == 0:
+                cls._prune()
+
+    @classmethod
+    def _prune(cls):
+        """
+        Deletes the runs older than the retention period. The caller holds the lock.
+        """
+        days = Config.get_config_item("sync_history_days")
+        with cls._connection:
+            deleted = cls._connection.execute(
+                "DELETE FROM runs WHERE start < ?", (time.time() - days * 86400,)
+            ).rowcount
+        if deleted:
+            logger.info("Pruned %d runs older than %d days from the sync history", deleted, days)
+
+    @classmethod
+    def _query(cls, sql: str, params: tuple = ()) -> list[dict[str, Any]]:
+        """
+        Runs a query.
+
+        Parameters:
+        sql (str): The query.
+        params (tuple): The parameters of the query.
+
+        Returns:
+        list[dict[str, Any]]: The rows.
+        """
+        with cls._lock:
+            return [dict(row) for row in cls._connect().execute(sql, params)]
+
+    @classmethod
+    def _query_duration_stats(cls, days: int, group_by: str) -> list[dict[str, Any]]:
+        """
+        Aggregates the durations of the recent runs, see get_duration_stats.
+        SQLite has no percentile function, so the sorted durations are fetched per group.
+
+        Raises:
+        ValueError: If the runs cannot be grouped by group_by, it's part of the query.
+        """
+        if group_by not in SYNC_HISTORY_GROUPS:
+            raise ValueError(f"Cannot group sync history by {group_by}")
+        since = time.time() - days * 86400
+        groups = cls._query(
+            f"""
+            SELECT {group_by} AS "group", COUNT(*) AS runs,
+                   SUM(exit_code != 0) AS failures,
+                   AVG(spawn_seconds) AS spawn_seconds,
+                   AVG(list_seconds) AS list_seconds,
+                   AVG(transfer_seconds) AS transfer_seconds,
+                   TOTAL(files) AS files, TOTAL(bytes) AS bytes
+            FROM runs WHERE start >= ? GROUP BY {group_by}
+            """,
+            (since,),
+        )
+        durations: dict[Any, list[float]] = dict()
+        for row in cls._query(
+            f'SELECT {group_by} AS "group", duration FROM runs WHERE start >= ? ORDER BY duration',
+            (since,),
+        ):
+            durations.setdefault(row["group"], []).append(row["duration"])
+
+        for group in groups:
+            values = durations.get(group["group"], [0.0])
+            group["p50_seconds"] = values[min(len(values) - 1, int(len(values) * 0.5))]
+            group["p95_seconds"] = values[min(len(values) - 1, int(len(values) * 0.95))]
+            group["max_seconds"] = values[-1]
+            group["files"] = int(group["files"])
+            group["bytes"] = int(group["bytes"])
+
+        return sorted(groups, key=lambda group: group["p95_seconds"], reverse=True)
@@ -0,0 +1,197 @@
+from pathlib import Path
+from stat import S_ISDIR
+import hashlib, json, os
+
+from common_defs import *
+
+MANIFEST_MAX_ENTRIES = 50000
+
+
+class SyncManifest:
+    """
+    A record of the local files covered by a sync target as of its last successful upload,
+    used to find out whether anything changed locally without running rclone.
+
+    Every entry is a path mapped to its (is_dir, size, mtime_ns, inode) signature, or None
+    if it didn't exist. Directories are recorded as well so that created, deleted or renamed
+    files are caught through the modification time of their parent directory.
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+
+    @staticmethod
+    def get_filter_roots(filters: list[str], sync_root: str) -> list[str] | None:
+        """
+        Retrieves the local paths the include filters are rooted at.
+
+        Parameters:
+        filters (list[str]): The rclone filter lines.
+        sync_root (str): The local sync root the filters are relative to.
+
+        Returns:
+        list[str] | None: The root paths, None if they cannot be determined.
+        """
+        roots = list()
+        for line in filters:
+            if line.startswith(("#", ";", "- ")):
+                continue
+            if not line.startswith("+ /"):
+                return None
+
+            pattern = line[2:]
+            for i, char in enumerate(pattern):
+                if char in "*?[{\\":
+                    pattern = pattern[: pattern.rfind("/", 0, i) + 1]
+                    break
+            roots.append(os.path.normpath(os.path.join(sync_root, pattern.lstrip("/"))))
+
+        return roots
+
+    @staticmethod
+    def get_fingerprint(*parts: str | Path) -> str:
+        """
+        Hashes everything that decides what a sync covers, e.g. filter files and sync paths.
+
+        Parameters:
+        *parts (str | Path): Strings and files to be hashed.
+
+        Returns:
+        str: The hex digest.
+        """
+        digest = hashlib.sha1()
+        for part in parts:
+            if isinstance(part, Path):
+                digest.update(part.read_bytes() if part.exists() else b"")
+            else:
+                digest.update(part.encode())
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    def is_unchanged(self, fingerprint: str) -> bool:
+        """
+        Checks if the local files are the same as recorded after the last upload.
+
+        Parameters:
+        fingerprint (str): The fingerprint of the current sync configuration.
+
+        Returns:
+        bool: True if the last upload had the same configuration and none
+              of the recorded paths changed since.
+        """
+        try:
+            with self._path.open("r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if manifest.get("fingerprint") != fingerprint:
+            return False
+
+        for path, signature in manifest["entries"].items():
+            if _get_signature(path) != (tuple(signature) if signature else None):
+                logger.debug("Manifest entry changed: %s", path)
+                return False
+
+        return True
+
+    @staticmethod
+    def snapshot(roots: list[str]) -> dict | None:
+        """
+        Records the current state of the local files under the roots.
+        It should be taken before the upload so that changes made while rclone runs
+        are picked up by the next one.
+
+        Parameters:
+        roots (list[str]): The local paths covered by the sync.
+
+        Returns:
+        dict | None: The manifest entries, None if the roots are too large to be tracked.
+        """
+        entries = dict()
+        visited_dirs = set()
+        for root in roots:
+            if not _record_tree(root, entries, visited_dirs):
+                logger.info("Too many files under %s to be tracked in a manifest", root)
+                return None
+
+        return entries
+
+    def save(self, entries: dict, fingerprint: str):
+        """
+        Persists a snapshot as the state of the last successful upload.
+
+        Parameters:
+        entries (dict): The snapshot taken before the upload.
+        fingerprint (str): The fingerprint of the sync configuration.
+        """
+        tmp_path = self._path.with_suffix(".tmp")
+        with tmp_path.open("w") as f:
+            json.dump({"fingerprint": fingerprint, "entries": entries}, f)
+        tmp_path.replace(self._path)
+        logger.debug("Manifest %s saved with %d entries", self._path, len(entries))
+
+    def clear(self):
+        """
+        Removes the manifest, the next sync will run rclone.
+        """
+        self._path.unlink(missing_ok=True)
+
+
+def _get_signature(path: str) -> tuple[bool, int, int, int] | None:
+    """
+    Stats a path following symlinks.
+
+    Parameters:
+    path (str): The path to stat.
+
+    Returns:
+    tuple[bool, int, int, int] | None: (is_dir, size, mtime_ns, inode), None if it doesn't exist.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    is_dir = S_ISDIR(st.st_mode)
+    return (is_dir, 0 if is_dir else st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def _record_tree(root: str, entries: dict, visited_dirs: set) -> bool:
+    """
+    Records the signatures of a path and everything under it, following symlinks.
+
+    Parameters:
+    root (str): The path to record.
+    entries (dict): Where the signatures are written to.
+    visited_dirs (set): (device, inode) of the directories already walked, to break symlink loops.
+
+    Returns:
+    bool: False if the total number of entries exceeded MANIFEST_MAX_ENTRIES.
+    """
+    # The parent tells if a missing root gets created later
+    parent = os.path.dirname(root)
+    entries[parent] = _get_signature(parent)
+    entries[root] = _get_signature(root)
+
+    pending_dirs = [root] if entries[root] and entries[root][0] else []
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        try:
+            st = os.stat(current_dir)
+            if (st.st_dev, st.st_ino) in visited_dirs:
+                continue
+            visited_dirs.add((st.st_dev, st.st_ino))
+            with os.scandir(current_dir) as it:
+                for entry in it:
+                    signature = _get_signature(entry.path)
+                    entries[entry.path] = signature
+                    if signature and signature[0]:
+                        pending_dirs.append(entry.path)
+        except OSError as e:
+            logger.debug("Failed to scan %s: %s", current_dir, e)
+
+        if len(entries) > MANIFEST_MAX_ENTRIES:
+            return False
+
+    return True
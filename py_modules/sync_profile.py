@@ -0,0 +1,143 @@
+from typing import Any, Iterable
+
+from common_defs import *
+from rclone_capabilities import RcloneCapabilities
+
+SMALL_SET_MAX_FILES = 50
+SMALL_SET_MAX_BYTES = 64 * 1024 * 1024
+TINY_FILE_BYTES = 256 * 1024
+MANY_FILES = 1000
+HUGE_TREE_FILES = 5000
+LARGE_FILE_BYTES = 256 * 1024 * 1024
+
+# Flags the profiles tune and their rc counterparts in "_config", None marks a size
+PROFILE_FLAGS = {
+    "--transfers": ("Transfers", int),
+    "--checkers": ("Checkers", int),
+    "--fast-list": ("UseListR", bool),
+    "--no-traverse": ("NoTraverse", bool),
+    "--multi-thread-streams": ("MultiThreadStreams", int),
+    "--multi-thread-cutoff": ("MultiThreadCutoff", None),
+}
+
+
+def get_file_profile(sizes: Iterable[int]) -> dict[str, int]:
+    """
+    Summarizes the local files covered by a target.
+
+    Parameters:
+    sizes (Iterable[int]): Size of every file in bytes.
+
+    Returns:
+    dict[str, int]: The number of "files", their total "size", the "largest" file
+                    and the "median" size in bytes.
+    """
+    sizes = sorted(sizes)
+    return {
+        "files": len(sizes),
+        "size": sum(sizes),
+        "largest": sizes[-1] if sizes else 0,
+        "median": sizes[len(sizes) // 2] if sizes else 0,
+    }
+
+
+def choose_profile(stats: dict[str, Any], sync_mode: RcloneSyncMode) -> tuple[str, dict[str, Any]]:
+    """
+    Picks the rclone flags fitting the files of a target.
+
+    Parameters:
+    stats (dict[str, Any]): The file profile of the target as returned by get_file_profile,
+                            and the files and bytes of its last transfer ("last_transfers",
+                            "last_bytes"), all optional.
+    sync_mode (RcloneSyncMode): What the sync does.
+
+    Returns:
+    tuple[str, dict[str, Any]]: The name of the profile and its flags with their values,
+                                True for boolean flags.
+    """
+    files = stats.get("files")
+    largest = stats.get("largest") or 0
+    last_transfers = stats.get("last_transfers") or 0
+    last_bytes = stats.get("last_bytes") or 0
+    flags: dict[str, Any] = dict()
+
+    if files is None and not last_transfers:
+        return "default", flags
+
+    if largest >= LARGE_FILE_BYTES:
+        name = "large_files"
+        # Few transfers at once, each split into streams
+        flags.update({
+            "--transfers": 4,
+            "--multi-thread-streams": 4,
+            "--multi-thread-cutoff": "64M",
+        })
+    elif ((files or 0) >= MANY_FILES and (stats.get("median") or 0) < TINY_FILE_BYTES) or (
+        last_transfers >= MANY_FILES and last_bytes < last_transfers * TINY_FILE_BYTES
+    ):
+        # The time goes to the round trips of every file rather than the bandwidth
+        name = "many_small_files"
+        flags.update({"--transfers": 32, "--checkers": 32})
+    elif files is not None and files <= SMALL_SET_MAX_FILES and (stats.get("size") or 0) <= SMALL_SET_MAX_BYTES:
+        name = "small_set"
+        flags.update({"--transfers": 4, "--checkers": 8})
+        if sync_mode == RcloneSyncMode.COPY:
+            # Checking a few files one by one beats listing the destination
+            flags["--no-traverse"] = True
+    else:
+        name = "default"
+
+    if (files or 0) >= HUGE_TREE_FILES and "--no-traverse" not in flags:
+        # A single recursive listing instead of one per directory
+        flags["--fast-list"] = True
+
+    return name, flags
+
+
+async def get_supported_profile_flags(flags: dict[str, Any]) -> dict[str, Any]:
+    """
+    Drops the flags the rclone binary doesn't support.
+
+    Parameters:
+    flags (dict[str, Any]): The flags of a profile.
+
+    Returns:
+    dict[str, Any]: The supported flags.
+    """
+    return {flag: value for flag, value in flags.items() if await RcloneCapabilities.has_flag(flag)}
+
+
+def profile_args(flags: dict[str, Any]) -> list[str]:
+    """
+    Converts the flags of a profile to command line arguments.
+
+    Parameters:
+    flags (dict[str, Any]): The flags of a profile.
+
+    Returns:
+    list[str]: The arguments.
+    """
+    args = list()
+    for flag, value in flags.items():
+        if value is True:
+            args.append(flag)
+        else:
+            args.extend([flag, str(value)])
+    return args
+
+
+def profile_rc_config(flags: dict[str, Any]) -> dict[str, Any]:
+    """
+    Converts the flags of a profile to the "_config" overrides of an rc call.
+
+    Parameters:
+    flags (dict[str, Any]): The flags of a profile.
+
+    Returns:
+    dict[str, Any]: The config overrides.
+    """
+    config = dict()
+    for flag, value in flags.items():
+        key, value_type = PROFILE_FLAGS[flag]
+        config[key] = value_type(value) if value_type else value
+    return config
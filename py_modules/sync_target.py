@@ -2,20 +2,292 @@ import decky
 
 from datetime import datetime
 from pathlib import Path
-from asyncio.subprocess import create_subprocess_exec, PIPE
+import asyncio
+from asyncio.subprocess import create_subprocess_exec, PIPE, DEVNULL
 from subprocess import list2cmdline
-from typing import Awaitable, Callable
-import logging
+from typing import Any, Awaitable, Callable
+from collections import deque
+from typing import TextIO
+import logging, os, re, shutil, time, json
 
 from config import *
 from utils import *
+from rclone_manager import RcloneManager
+from rclone_capabilities import RcloneCapabilities
+from sync_manifest import SyncManifest
+from target_registry import TargetRegistry
+from sync_history import SyncHistory
+from sync_profile import (
+    get_file_profile,
+    choose_profile,
+    get_supported_profile_flags,
+    profile_args,
+    profile_rc_config,
+)
+from log_reader import read_log, rotate_logs
+from filter_matcher import FilterMatcher, get_compiled_filter_file, preview_filter_matches, list_filtered_files
+from bisync_fast_path import *
+from snapshot_store import CHUNK_FILE_MAX_SIZE, SnapshotStore
+from save_prefetch import *
+from tree_snapshot import snapshot_files
+import process_control
+from bandwidth_policy import BandwidthPolicy
+import change_journal
 
-ONGOING_SYNCS = set()
 PLUGIN_EXCLUDE_ALL_FILTER_PATH = Path(decky.DECKY_PLUGIN_DIR) / "exclude_all.filter"
+RCLONE_OUTPUT_LINE_LIMIT = 1024 * 1024
+RC_GLOB_SPECIAL_CHARS = re.compile(r"[*?\[\]{}\\]")
+SYNC_PROGRESS: dict[str, dict[str, Any]] = dict()
+# Log levels of the rc daemon matching the verbose flags
+RC_LOG_LEVELS = {"-vv": "DEBUG", "-v": "INFO"}
+
+# bisync command line flags and their rc counterparts, None marks a boolean flag
+RC_BISYNC_FLAGS = {
+    "--resync": ("resync", None),
+    "--check-access": ("checkAccess", None),
+    "--force": ("force", None),
+    "--resilient": ("resilient", None),
+    "--create-empty-src-dirs": ("createEmptySrcDirs", None),
+    "--remove-empty-dirs": ("removeEmptyDirs", None),
+    "--max-delete": ("maxDelete", int),
+    "--conflict-resolve": ("conflictResolve", str),
+    "--conflict-loser": ("conflictLoser", str),
+    "--conflict-suffix": ("conflictSuffix", str),
+}
+
+
+class _SyncJob:
+    """
+    A sync waiting in or run by the scheduler, shared by all the requests coalesced into it.
+    """
+
+    def __init__(
+        self,
+        target_id: str,
+        key: str,
+        priority: SyncPriority,
+        sync_task: Callable[[], Awaitable[int]],
+        seq: int,
+    ):
+        self.target_id = target_id
+        self.key = key
+        self.priority = priority
+        self.sync_task = sync_task
+        self.seq = seq
+        self.submit_time = time.perf_counter()
+        self.future = asyncio.get_running_loop().create_future()
+        self.task: asyncio.Task | None = None
+
+
+class SyncScheduler:
+    """
+    Runs the syncs with at most "sync_parallelism" of them at the same time, highest
+    priority first. A target never runs two syncs at once, and a request matching a sync
+    that is still waiting for the target is coalesced into it instead of running again.
+    The waiting sync runs its own task, the key has to tell apart requests that differ.
+    """
+
+    _pending: list[_SyncJob] = list()
+    _running: dict[str, _SyncJob] = dict()
+    _held = False
+    _wait_times: dict[SyncPriority, deque] = {
+        priority: deque(maxlen=100) for priority in SyncPriority
+    }
+    _seq = 0
+
+    @classmethod
+    async def submit(
+        cls,
+        target_id: str,
+        key: str,
+        priority: SyncPriority,
+        sync_task: Callable[[], Awaitable[int]],
+    ) -> int:
+        """
+        Schedules a sync and waits for it to finish.
+
+        Parameters:
+        target_id (str): ID of the sync target.
+        key (str): Identifies what the sync does, requests with the same target and key are coalesced.
+        priority (SyncPriority): Priority of the sync.
+        sync_task (Callable[[], Awaitable[int]]): The sync task to be executed, dropped if the request
+                                                  is coalesced into a waiting sync with its own task.
+
+        Returns:
+        int: Exit code of the sync, -1 if it failed to run or got cancelled.
+        """
+        for job in cls._pending:
+            if (job.target_id == target_id) and (job.key == key):
+                logger.debug('Sync "%s" (%s) coalesced into a waiting one', target_id, key)
+                job.priority = min(job.priority, priority)
+                return await asyncio.shield(job.future)
+
+        cls._seq += 1
+        job = _SyncJob(target_id, key, priority, sync_task, cls._seq)
+        cls._pending.append(job)
+        cls._dispatch()
+        return await asyncio.shield(job.future)
+
+    @classmethod
+    def cancel(cls, target_id: str) -> int:
+        """
+        Cancels the waiting and running syncs of a target.
+
+        Parameters:
+        target_id (str): ID of the sync target.
+
+        Returns:
+        int: Number of syncs cancelled.
+        """
+        cancelled = [job for job in cls._pending if job.target_id == target_id]
+        for job in cancelled:
+            cls._pending.remove(job)
+            job.future.set_result(-1)
+
+        if (job := cls._running.get(target_id)) and job.task:
+            job.task.cancel()
+            cancelled.append(job)
+
+        logger.info('Cancelled %d syncs of "%s"', len(cancelled), target_id)
+        return len(cancelled)
+
+    @classmethod
+    def hold(cls):
+        """
+        Holds back the syncs until release(), for operations on the cloud data that no sync
+        may run alongside. The syncs submitted in between wait in the queue.
+
+        Raises:
+        Exception: If syncs are running or waiting, or the syncs are held already.
+        """
+        if cls._held or cls._running or cls._pending:
+            raise Exception("SYNC_IN_PROGRESS")
+        cls._held = True
+        logger.info("Syncs held back")
+
+    @classmethod
+    async def hold_when_idle(cls):
+        """
+        Holds back the syncs like hold(), but waits for the ones running to finish
+        instead of refusing. The syncs submitted in between wait in the queue.
+        """
+        while cls._held:
+            await asyncio.sleep(0.1)
+        cls._held = True
+        logger.info("Syncs held back, waiting for %d running", len(cls._running))
+        try:
+            while running := [job.task for job in cls._running.values() if job.task]:
+                await asyncio.wait(running)
+        except BaseException:
+            cls.release()
+            raise
+
+    @classmethod
+    def release(cls):
+        """
+        Lets the syncs held back by hold() run.
+        """
+        cls._held = False
+        logger.info("Syncs released, %d waiting", len(cls._pending))
+        cls._dispatch()
+
+    @classmethod
+    def get_stats(cls) -> dict[str, Any]:
+        """
+        Retrieves the state of the queue and the time the recent syncs waited in it.
+
+        Returns:
+        dict[str, Any]: Queue depth, running syncs and wait time statistics in seconds per priority.
+        """
+        wait_times = dict()
+        for priority, samples in cls._wait_times.items():
+            if samples:
+                wait_times[priority.name] = {
+                    "count": len(samples),
+                    "avg": sum(samples) / len(samples),
+                    "max": max(samples),
+                    "last": samples[-1],
+                }
+
+        return {
+            "queue_depth": len(cls._pending),
+            "running": list(cls._running),
+            "held": cls._held,
+            "wait_times": wait_times,
+        }
+
+    @classmethod
+    def _dispatch(cls):
+        """
+        Starts the waiting syncs with the highest priority while there's room in the pool.
+        """
+        parallelism = max(1, Config.get_config_item("sync_parallelism"))
+        while (not cls._held) and (len(cls._running) < parallelism):
+            runnable = [job for job in cls._pending if job.target_id not in cls._running]
+            if not runnable:
+                return
+
+            job = min(runnable, key=lambda job: (job.priority, job.seq))
+            cls._pending.remove(job)
+            cls._running[job.target_id] = job
+            job.task = asyncio.create_task(cls._run(job))
+            job.task.add_done_callback(lambda _, job=job: cls._finish(job))
+
+    @classmethod
+    def _finish(cls, job: _SyncJob):
+        """
+        Frees the target of a sync whose task is done and starts the next syncs.
+        A task cancelled before it got to run never sets the result, so it's set here.
+
+        Parameters:
+        job (_SyncJob): The sync that finished.
+        """
+        if cls._running.get(job.target_id) is job:
+            del cls._running[job.target_id]
+        if not job.future.done():
+            logger.info('Sync "%s" cancelled before it started', job.target_id)
+            job.future.set_result(-1)
+        cls._dispatch()
+
+    @classmethod
+    async def _run(cls, job: _SyncJob):
+        """
+        Runs a sync and hands the result to everyone waiting for it.
+
+        Parameters:
+        job (_SyncJob): The sync to run.
+        """
+        wait_time = time.perf_counter() - job.submit_time
+        cls._wait_times[job.priority].append(wait_time)
+        logger.debug(
+            'Sync "%s" (%s, %s) waited %.3fs in queue',
+            job.target_id,
+            job.key,
+            job.priority.name,
+            wait_time,
+        )
+
+        run_id = None
+        try:
+            run_id = await BandwidthPolicy.begin(job.priority >= SyncPriority.GLOBAL_SYNC)
+            sync_result = await job.sync_task()
+        except asyncio.CancelledError:
+            logger.info('Sync "%s" cancelled', job.target_id)
+            sync_result = -1
+        except Exception as e:
+            logger.error("Error during sync: %s", e)
+            sync_result = -1
+        finally:
+            await BandwidthPolicy.end(run_id)
+
+        job.future.set_result(sync_result)
 
 
 class _SyncTarget:
     _filter_required = True
+    _report_progress = True
+    # Runs are recorded in the sync history under this name instead of the ID if set
+    _history_target: str | None = None
     _sync_mode = RcloneSyncMode.COPY
     _shared_filter_file = PLUGIN_CONFIG_DIR / f"{SHARED_FILTER_NAME}.filter"
 
@@ -24,28 +296,51 @@ class _SyncTarget:
         self._log_dir = Path(decky.DECKY_PLUGIN_LOG_DIR) / self._id
         self._rclone_log_path = None
         self._target_filter_file = PLUGIN_CONFIG_DIR / f"{self._id}.filter"
-
-    async def _start_sync_task(self, sync_task: Callable[[], Awaitable[int]]) -> int:
+        self._manifest = SyncManifest(PLUGIN_STATE_DIR / f"{self._id}.manifest")
+        self._files_from: Path | None = None
+        self._run_timings: dict[str, float] = dict()
+        self._run_stats: dict[str, Any] = dict()
+        self._profile_flags: dict[str, Any] = dict()
+
+    async def _start_sync_task(
+        self, sync_task: Callable[[], Awaitable[int]], key: str, priority: SyncPriority
+    ) -> int:
         """
-        Wrapper of the sync_function for preparation and clean up.
+        Schedules the sync_task, waiting for the other syncs of the target to finish.
 
         Parameters:
-        sync_function (Callable[[], Awaitable[int]]): The sync task to be executed.
+        sync_task (Callable[[], Awaitable[int]]): The sync task to be executed.
+        key (str): Identifies what the task does, waiting tasks with the same key are coalesced.
+        priority (SyncPriority): Priority of the task.
 
         Returns:
         int: Exit code of the sync process.
         """
-        if self._id in ONGOING_SYNCS:
-            return -1
+        return await SyncScheduler.submit(self._id, key, priority, sync_task)
 
-        ONGOING_SYNCS.add(self._id)
-        try:
-            sync_result = await sync_task()
-        except Exception as e:
-            logger.error("Error during sync: %s", e)
-            sync_result = -1
-        ONGOING_SYNCS.discard(self._id)
-        return sync_result
+    def _get_sync_priority(self, winner: RcloneSyncWinner) -> SyncPriority:
+        """
+        Returns the priority of a sync of this target.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync.
+
+        Returns:
+        SyncPriority: The priority.
+        """
+        return SyncPriority.GLOBAL_SYNC
+
+    def _get_sync_key(self, winner: RcloneSyncWinner) -> str:
+        """
+        Returns what identifies a sync of this target, waiting syncs with the same key are coalesced.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync.
+
+        Returns:
+        str: The key.
+        """
+        return winner.value
 
     async def sync(self, winner: RcloneSyncWinner) -> int:
         """
@@ -61,55 +356,78 @@ class _SyncTarget:
         async def sync_task():
             return await self._rclone_execute(winner)
 
-        return await self._start_sync_task(sync_task)
+        return await self._start_sync_task(
+            sync_task, self._get_sync_key(winner), self._get_sync_priority(winner)
+        )
 
-    def _get_rclone_log_path(self, max_log_files: int = 5) -> Path:
+    async def _get_rclone_log_path(self, max_log_files: int = 5) -> Path:
         """
         Creates the rclone log file.
 
         Parameters:
-        max_log_files (int): Max number of log files to keep, old ones will be deleted.
+        max_log_files (int): Max number of uncompressed log files to keep, older ones are gzipped.
 
         Returns:
         Path: The path to the created rclone log file.
         """
         self._log_dir.mkdir(parents=True, exist_ok=True)
 
+        # compress extra log files
+        await asyncio.to_thread(rotate_logs, self._log_dir, "rclone *.log", max_log_files - 1)
+
         current_time = datetime.now().strftime("%Y-%m-%d %H.%M.%S")
         self._rclone_log_path = self._log_dir / f"rclone {current_time}.log"
-
-        # remove extra log files
-        all_log_files = sorted(self._log_dir.glob("rclone *.log"))
-        if len(all_log_files) >= (max_log_files):
-            for old_log_file in all_log_files[: -(max_log_files - 1)]:
-                old_log_file.unlink(missing_ok=True)
-
         return self._rclone_log_path
 
-    def get_last_sync_log(self) -> str:
+    def get_last_log_path(self) -> Path | None:
         """
-        Retrieves the last synchronization log.
+        Retrieves the log file of the last synchronization.
 
         Returns:
-        str: The last synchronization log contents.
+        Path | None: The log file, None if there is none.
         """
         if not self._rclone_log_path:
             all_log_files = sorted(self._log_dir.glob("rclone *.log"))
             if all_log_files:
                 self._rclone_log_path = all_log_files[-1]
-            else:
-                return "No logs available."
+        return self._rclone_log_path
+
+    def get_last_sync_log(self) -> str:
+        """
+        Retrieves the end of the last synchronization log.
+
+        Returns:
+        str: The last lines of the last synchronization log.
+        """
+        page = self.read_last_sync_log()
+        return page["content"] if page else "No logs available."
+
+    def read_last_sync_log(
+        self, offset: int | None = None, length: int | None = None
+    ) -> dict[str, Any] | None:
+        """
+        Reads a page of the last synchronization log.
+
+        Parameters:
+        offset (int | None): Byte offset to read from, None to read the last lines.
+        length (int | None): Max number of bytes to read, None for the default page size.
+
+        Returns:
+        dict[str, Any] | None: The page, see log_reader.read_log, None if there is no log.
+        """
+        log_path = self.get_last_log_path()
+        if not log_path:
+            return None
         try:
-            with self._rclone_log_path.open() as f:
-                return f.read()
+            return read_log(log_path, offset, length)
         except Exception as e:
-            err_msg = f'Error reading log file "{self._rclone_log_path}":\n{e}'
+            err_msg = f'Error reading log file "{log_path}":\n{e}'
             logger.error(err_msg)
-            return err_msg
+            return {"content": err_msg, "offset": 0, "next_offset": 0, "size": 0}
 
     def _get_sync_paths(
         self, winner: RcloneSyncWinner = RcloneSyncWinner.LOCAL
-    ) -> tuple[list[str], str, bool]:
+    ) -> tuple[str, str, bool]:
         """
         Retrieves the sync root and destination directory from the configuration.
 
@@ -117,19 +435,64 @@ class _SyncTarget:
         winner (RcloneSyncWinner): Winner of this sync
 
         Returns:
-        tuple[str, str]: A tuple containing the source sync path and destination sync path.
+        tuple[str, str, bool]: A tuple containing the local sync path, the cloud sync path
+                               and whether the data flows from cloud to local.
         """
         sync_root, sync_dest = Config.get_config_items("sync_root", "sync_destination")
 
-        return sync_root, f"cloud:{sync_dest}", (winner == RcloneSyncWinner.CLOUD) and (
+        # TODO: Need to create a rclone call for each root and assign the filters to their respective roots
+        return sync_root[0], get_cloud_path(sync_dest), (winner == RcloneSyncWinner.CLOUD) and (
             self._sync_mode != RcloneSyncMode.BISYNC
         )
 
+    def _get_rclone_paths(self, winner: RcloneSyncWinner) -> tuple[str, str]:
+        """
+        Retrieves the source and destination of the rclone call.
+
+        Parameters:
+        winner (RcloneSyncWinner): Winner of this sync
+
+        Returns:
+        tuple[str, str]: The source (or path1) and destination (or path2) of the rclone call.
+        """
+        local_path, cloud_path, reverse = self._get_sync_paths(winner)
+        return (cloud_path, local_path) if reverse else (local_path, cloud_path)
+
+    def _get_filter_lines(self) -> list[str]:
+        """
+        Retrieves the rules of the shared, target and exclude all filter files, in order.
+
+        Returns:
+        list[str]: The filter rules, empty if the target doesn't use filters.
+        """
+        if not self._filter_required:
+            return []
+
+        return (
+            self.get_shared_filter()
+            + self.get_filters()
+            + get_filters(PLUGIN_EXCLUDE_ALL_FILTER_PATH)
+        )
+
+    def _get_filter_files(self) -> list[Path]:
+        """
+        Retrieves the filter files to be applied to the sync, in order.
+        The filter files are merged into a single compiled one.
+
+        Returns:
+        list[Path]: The filter files, empty if the target doesn't use filters.
+        """
+        if not self._filter_required:
+            return []
+
+        return [get_compiled_filter_file(self._get_filter_lines())]
+
     async def _rclone_execute(
         self, winner: RcloneSyncWinner, extra_args: list[str] = []
     ) -> int:
         """
-        Runs the rclone sync process.
+        Runs the rclone sync process, as a job of the rclone rc daemon if it is available,
+        otherwise as a separate rclone process.
 
         Parameters:
         winner (RcloneSyncWinner): The winner of the sync, its data will be preserved as priority.
@@ -138,65 +501,367 @@ class _SyncTarget:
         Returns:
         int: Exit code of the rclone sync process if it runs, -1 if it cannot run.
         """
-        if self._filter_required and (not self._target_filter_file.exists()):
+        if self._filter_required and (not self.get_filters()):
             logger.info(f'No filter for sync "{self._id}"')
             return 0
 
-        if not self._shared_filter_file.exists():
-            self._shared_filter_file.touch(exist_ok=True)
+        start_wall_time = time.time()
+        start_time = time.perf_counter()
+        self._run_timings = dict()
+        self._run_stats = dict()
+        profile_name = await self._choose_profile()
+        execution_mode = "daemon"
+        sync_result = None
+        if self._report_progress:
+            await self._update_progress({})
+        if RcloneManager.daemon_available():
+            sync_result = await self._rclone_rc_execute(winner, extra_args)
+        if sync_result is None:
+            execution_mode = "subprocess"
+            self._run_timings.clear()
+            sync_result = await self._rclone_subprocess_execute(winner, extra_args)
+        if self._report_progress:
+            await self._update_progress({}, sync_result)
+
+        await self._record_run(
+            winner, execution_mode, profile_name, start_wall_time, start_time, sync_result
+        )
+        return sync_result
 
-        arguments = ["--config", str(RCLONE_CFG_PATH), self._sync_mode.value]
-        # TODO: Need to configure this function to create a rclone call for each root and assign the filters to their respective roots
-        arguments.extend(self._get_sync_paths(winner))
+    async def _record_run(
+        self,
+        winner: RcloneSyncWinner,
+        execution_mode: str,
+        profile_name: str,
+        start_wall_time: float,
+        start_time: float,
+        sync_result: int,
+    ):
+        """
+        Logs a finished run and records it in the target registry and the sync history.
 
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync.
+        execution_mode (str): How the run was executed, e.g. "daemon".
+        profile_name (str): The name of the sync profile used.
+        start_wall_time (float): When the run started, as a POSIX timestamp.
+        start_time (float): When the run started, from time.perf_counter.
+        sync_result (int): Exit code of the run.
+        """
+        end_time = time.perf_counter()
+        logger.info(
+            'Sync for "%s" finished with exit code: %d in %.3fs (%s mode)',
+            self._id,
+            sync_result,
+            end_time - start_time,
+            execution_mode,
+        )
         if self._filter_required:
-            arguments.extend(
-                [
-                    "--filter-from",
-                    str(self._shared_filter_file),
-                    "--filter-from",
-                    str(self._target_filter_file),
-                    "--filter-from",
-                    str(PLUGIN_EXCLUDE_ALL_FILTER_PATH),
-                ]
+            TargetRegistry.record_sync(
+                self._id, sync_result, self._run_stats.get("transfers"), self._run_stats.get("bytes")
             )
 
-        arguments.extend(
-            [
-                "--log-file",
-                str(self._get_rclone_log_path()),
-                "--log-format",
-                "nolevel",
-            ]
+        # Listing lasts until the first transfer shows up in the stats, if any
+        spawned = self._run_timings.get("spawned", start_time)
+        first_transfer = self._run_timings.get("first_transfer", end_time)
+        await SyncHistory.record({
+            "target": self._history_target or self._id,
+            "mode": self._sync_mode.value,
+            "winner": winner.value,
+            "execution": execution_mode,
+            "rclone_version": str(await RcloneCapabilities.get_version()),
+            "profile": profile_name,
+            "start": start_wall_time,
+            "end": start_wall_time + end_time - start_time,
+            "duration": end_time - start_time,
+            "spawn_seconds": spawned - start_time,
+            "list_seconds": first_transfer - spawned,
+            "transfer_seconds": end_time - first_transfer,
+            "files": self._run_stats.get("transfers"),
+            "bytes": self._run_stats.get("bytes"),
+            "exit_code": sync_result,
+        })
+
+    async def _choose_profile(self) -> str:
+        """
+        Picks the rclone flags of the next run from the files of the target and its last transfer.
+
+        Returns:
+        str: The name of the profile.
+        """
+        self._profile_flags = dict()
+        if (not self._filter_required) or (not Config.get_config_item("adaptive_sync_args")):
+            return "default"
+
+        stats = TargetRegistry.get_stats(self._id)
+        name, flags = choose_profile(stats, self._sync_mode)
+        self._profile_flags = await get_supported_profile_flags(flags)
+        logger.info(
+            'Sync profile for "%s": %s %s (%s files, %s bytes, largest %s, last transfer %s files)',
+            self._id,
+            name,
+            profile_args(self._profile_flags),
+            stats.get("files"),
+            stats.get("size"),
+            stats.get("largest"),
+            stats.get("last_transfers"),
         )
+        return name
+
+    async def _on_stats(self, stats: dict[str, Any]):
+        """
+        Keeps the latest rclone stats of the running sync and forwards them as progress.
+
+        Parameters:
+        stats (dict[str, Any]): The stats as reported by rclone.
+        """
+        self._run_stats = stats
+        if ("first_transfer" not in self._run_timings) and (
+            stats.get("bytes") or stats.get("transfers")
+        ):
+            self._run_timings["first_transfer"] = time.perf_counter()
+        if self._report_progress:
+            await self._update_progress(stats)
+
+    async def _rclone_rc_execute(
+        self, winner: RcloneSyncWinner, extra_args: list[str] = []
+    ) -> int | None:
+        """
+        Runs the sync as a job of the rclone rc daemon.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync, its data will be preserved as priority.
+        extra_args (list[str]): Extra arguemnts to be passed to rclone
+
+        Returns:
+        int | None: Exit code of the job, None if it cannot be run by the daemon.
+        """
+        source, destination = self._get_rclone_paths(winner)
+        params: dict[str, Any] = dict()
+
+        if self._sync_mode == RcloneSyncMode.BISYNC:
+            bisync_params = rc_bisync_params(
+                ["--conflict-resolve", winner.value]
+                + Config.get_config_item("additional_bisync_args")
+                + extra_args
+            )
+            if bisync_params is None:
+                return None
+            params.update(path1=source, path2=destination, **bisync_params)
+        elif extra_args:
+            return None
+        elif os.path.isfile(source):
+            # sync/copy only takes directories, the file is picked out of its directory instead
+            directory, name = os.path.split(source)
+            params.update(
+                srcFs=directory,
+                dstFs=destination,
+                _filter={"IncludeRule": ["/" + RC_GLOB_SPECIAL_CHARS.sub(r"\\\g<0>", name)]},
+            )
+        else:
+            params.update(srcFs=source, dstFs=destination)
+
+        # rclone rejects a list of files along with filters, the lists are filtered already
+        if self._files_from:
+            params.setdefault("_filter", {})["FilesFromRaw"] = [str(self._files_from)]
+            params["_config"] = {"NoTraverse": True}
+        elif filter_files := self._get_filter_files():
+            params.setdefault("_filter", {})["FilterFrom"] = [str(f) for f in filter_files]
+        if self._profile_flags:
+            params.setdefault("_config", {}).update(profile_rc_config(self._profile_flags))
+
+        rclone_log_path = await self._get_rclone_log_path()
+        logger.info('Running rc job: sync/%s %s', self._sync_mode.value, params)
+        try:
+            self._run_timings["spawned"] = time.perf_counter()
+            job_status = await RcloneManager.rc_job(
+                f"sync/{self._sync_mode.value}",
+                params,
+                on_stats=self._on_stats,
+                log_path=rclone_log_path,
+                log_level=RC_LOG_LEVELS.get(next(iter(self._get_verbose_flag()), ""), "NOTICE"),
+            )
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning('rc daemon unavailable for sync "%s", falling back: %s', self._id, e)
+            return None
+        except Exception as e:
+            # The daemon is up but doesn't accept the call, e.g. an old rclone without sync/bisync
+            logger.warning('rc daemon rejected sync "%s", falling back: %s', self._id, e)
+            return None
+
+        stats = job_status.get("stats", {})
+        with rclone_log_path.open("a") as f:
+            f.write(
+                f"rc job {job_status.get('id')} sync/{self._sync_mode.value} "
+                f"{source} -> {destination}\n"
+                f"Transferred: {stats.get('bytes', 0)} bytes, {stats.get('transfers', 0)} files\n"
+                f"Checks: {stats.get('checks', 0)}\n"
+                f"Errors: {stats.get('errors', 0)}\n"
+                f"Elapsed time: {job_status.get('duration', 0):.3f}s\n"
+            )
+            if job_status.get("error"):
+                f.write(f"ERROR: {job_status['error']}\n")
+
+        if job_status.get("success"):
+            return 0
+        logger.error('Sync for "%s" error: %s', self._id, job_status.get("error"))
+        return 2
+
+    async def _rclone_subprocess_execute(
+        self, winner: RcloneSyncWinner, extra_args: list[str] = []
+    ) -> int:
+        """
+        Runs the sync as a separate rclone process.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync, its data will be preserved as priority.
+        extra_args (list[str]): Extra arguemnts to be passed to rclone
+
+        Returns:
+        int: Exit code of the rclone sync process.
+        """
+        arguments = ["--config", str(RCLONE_CFG_PATH), self._sync_mode.value]
+        arguments.extend(self._get_rclone_paths(winner))
+
+        if self._files_from:
+            arguments.extend(["--files-from-raw", str(self._files_from)])
+            if await RcloneCapabilities.has_flag("--no-traverse"):
+                arguments.append("--no-traverse")
+        else:
+            for filter_file in self._get_filter_files():
+                arguments.extend(["--filter-from", str(filter_file)])
+
+        # Older binaries log plain text, which is written to the log as is
+        if await RcloneCapabilities.has_flag("--use-json-log"):
+            arguments.append("--use-json-log")
+        if self._report_progress:
+            arguments.extend(["--stats", "1s", "--stats-log-level", "NOTICE"])
 
         if self._sync_mode == RcloneSyncMode.BISYNC:
-            arguments.extend(["--conflict-resolve", winner.value])
-            arguments.extend(Config.get_config_item("additional_bisync_args"))
+            if await RcloneCapabilities.has_flag("--conflict-resolve", bisync=True):
+                arguments.extend(["--conflict-resolve", winner.value])
+            arguments.extend(await get_supported_bisync_args(
+                Config.get_config_item("additional_bisync_args")
+            ))
 
         arguments.extend(Config.get_config_item("additional_sync_args"))
+        # Later flags win, so the profile overrides the static defaults
+        arguments.extend(profile_args(self._profile_flags))
+        bwlimit_args = BandwidthPolicy.get_process_args(
+            self._get_sync_priority(winner) >= SyncPriority.GLOBAL_SYNC
+        )
+        if await RcloneCapabilities.has_flag("--bwlimit"):
+            arguments.extend(bwlimit_args)
+        else:
+            bwlimit_args = []
         arguments.extend(extra_args)
         arguments.extend(self._get_verbose_flag())
 
+        rclone_log_path = await self._get_rclone_log_path()
         logger.info(f'Running command: "{RCLONE_BIN_PATH}" {list2cmdline(arguments)}')
         current_sync = await create_subprocess_exec(
             str(RCLONE_BIN_PATH),
             *arguments,
-            stdin=PIPE,
+            stdin=DEVNULL,
             stdout=PIPE,
             stderr=PIPE,
+            limit=RCLONE_OUTPUT_LINE_LIMIT,
         )
-        sync_stdcout, sync_stderr = await current_sync.communicate()
-        sync_result = current_sync.returncode
-
-        logger.info(f'Sync for "{self._id}" finished with exit code: {sync_result}')
-        if sync_stdcout:
-            logger.info(f'Sync for "{self._id}" stdout:\n{sync_stdcout.decode()}')
-        if sync_stderr:
-            logger.error(f'Sync for "{self._id}" stderr:\n{sync_stderr.decode()}')
+        self._run_timings["spawned"] = time.perf_counter()
+        BandwidthPolicy.attach(current_sync, bwlimit_args)
+        try:
+            with rclone_log_path.open("a") as log_file:
+                await asyncio.gather(
+                    self._consume_rclone_output(current_sync.stdout, log_file),
+                    self._consume_rclone_output(current_sync.stderr, log_file),
+                )
+            sync_result = await current_sync.wait()
+        except asyncio.CancelledError:
+            current_sync.kill()
+            raise
+        finally:
+            BandwidthPolicy.detach(current_sync)
 
         return sync_result
 
+    async def _consume_rclone_output(self, stream: asyncio.StreamReader, log_file: TextIO):
+        """
+        Reads the JSON log of rclone line by line, writing the messages to the log file
+        and turning the stats into progress updates. Only the last stats are logged.
+
+        Parameters:
+        stream (asyncio.StreamReader): stdout or stderr of rclone.
+        log_file (TextIO): The sync log file.
+        """
+        last_stats_entry = None
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                log_file.write(f"Skipped an output line over {RCLONE_OUTPUT_LINE_LIMIT} bytes\n")
+                continue
+            if not line:
+                break
+
+            text = line.decode(errors="replace").rstrip()
+            try:
+                entry = json.loads(text)
+                entry["msg"]
+            except (ValueError, TypeError, KeyError):
+                log_file.write(text + "\n")
+                continue
+
+            if "stats" in entry:
+                last_stats_entry = entry
+                await self._on_stats(entry["stats"])
+                continue
+
+            log_file.write(f"{entry.get('time', '')} {entry['msg'].rstrip()}\n")
+            if entry.get("level") in ("error", "critical", "fatal"):
+                logger.error('Sync for "%s": %s', self._id, entry["msg"].rstrip())
+
+        if last_stats_entry:
+            log_file.write(f"{last_stats_entry.get('time', '')} {last_stats_entry['msg'].rstrip()}\n")
+
+    async def _update_progress(self, stats: dict[str, Any], exit_code: int | None = None):
+        """
+        Updates the progress of the sync from rclone stats and pushes it to the frontend.
+
+        Parameters:
+        stats (dict[str, Any]): The stats as reported by rclone, empty to keep the previous ones.
+        exit_code (int | None): Exit code of the sync once it finished.
+        """
+        if exit_code is not None:
+            progress = dict(SYNC_PROGRESS.get(self._id, {}))
+        else:
+            progress = dict()
+        if stats:
+            progress = {
+                "bytes": stats.get("bytes", 0),
+                "total_bytes": stats.get("totalBytes", 0),
+                "transfers": stats.get("transfers", 0),
+                "total_transfers": stats.get("totalTransfers", 0),
+                "checks": stats.get("checks", 0),
+                "total_checks": stats.get("totalChecks", 0),
+                "errors": stats.get("errors", 0),
+                "speed": stats.get("speed", 0),
+                "eta": stats.get("eta"),
+            }
+        progress["finished"] = exit_code is not None
+        progress["exit_code"] = exit_code
+
+        SYNC_PROGRESS[self._id] = progress
+        await decky.emit("sync_progress", self._id, progress)
+
+    def get_progress(self) -> dict[str, Any] | None:
+        """
+        Retrieves the progress of the running or last sync.
+
+        Returns:
+        dict[str, Any] | None: The progress, None if the target didn't sync since the plugin started.
+        """
+        return SYNC_PROGRESS.get(self._id)
+
     @classmethod
     def get_shared_filter(cls) -> list[str]:
         """
@@ -205,7 +870,7 @@ class _SyncTarget:
         Returns:
         list[str]: A list of filters, '\\n's will be stripped.
         """
-        return get_filters(cls._shared_filter_file)
+        return TargetRegistry.get_filters(SHARED_FILTER_NAME)
 
     @classmethod
     def set_shared_filters(cls, filters: list[str]):
@@ -215,7 +880,7 @@ class _SyncTarget:
         Parameters:
         filters (list[str]): The filters to set, elements inside should not contain '\\n'.
         """
-        set_filters(cls._shared_filter_file, filters)
+        TargetRegistry.set_filters(SHARED_FILTER_NAME, filters)
 
     def get_filters(self) -> list[str]:
         """
@@ -224,7 +889,7 @@ class _SyncTarget:
         Returns:
         list[str]: A list of filters, '\\n's will be stripped.
         """
-        return get_filters(self._target_filter_file)
+        return TargetRegistry.get_filters(self._id)
 
     def set_filters(self, filters: list[str]):
         """
@@ -233,7 +898,40 @@ class _SyncTarget:
         Parameters:
         filters (list[str]): The filters to set, elements inside should not contain '\\n'.
         """
-        set_filters(self._target_filter_file, filters)
+        TargetRegistry.set_filters(self._id, filters)
+        self._manifest.clear()
+
+    async def preview_files(self) -> dict[str, Any]:
+        """
+        Enumerates the local files the filters of the target pick up, without running rclone.
+
+        Returns:
+        dict[str, Any]: The matched files with statistics per filter rule,
+                        see filter_matcher.preview_filter_matches.
+        """
+        local_path, _, _ = self._get_sync_paths()
+        matcher = FilterMatcher(self._get_filter_lines())
+        start_time = time.perf_counter()
+        result = await asyncio.to_thread(preview_filter_matches, matcher, local_path)
+        logger.info(
+            'Previewed %d files of "%s" in %.3fs',
+            result["total_files"],
+            self._id,
+            time.perf_counter() - start_time,
+        )
+        if self._filter_required and not result["truncated"]:
+            TargetRegistry.record_size(self._id, result["total_bytes"])
+        return result
+
+    def _follows_symlinks(self) -> bool:
+        """
+        Checks if rclone follows symlinks, i.e. runs with --copy-links.
+
+        Returns:
+        bool: True if it does.
+        """
+        sync_args = Config.get_config_item("additional_sync_args")
+        return ("--copy-links" in sync_args) or ("-L" in sync_args)
 
     def _get_verbose_flag(self) -> list[str]:
         """
@@ -256,6 +954,94 @@ class GlobalSyncTarget(_SyncTarget):
     def __init__(self):
         super().__init__(GLOBAL_SYNC_ID)
 
+    async def _rclone_execute(
+        self, winner: RcloneSyncWinner, extra_args: list[str] = []
+    ) -> int:
+        """
+        Runs rclone bisync, skipping it if neither side changed since the last bisync.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync, its data will be preserved as priority.
+        extra_args (list[str]): Extra arguemnts to be passed to rclone
+
+        Returns:
+        int: Exit code of the rclone sync process if it runs, -1 if it cannot run.
+        """
+        if extra_args or (not self.get_filters()) or (not Config.get_config_item("bisync_fast_path")):
+            return await super()._rclone_execute(winner, extra_args)
+
+        start_time = time.perf_counter()
+        miss_reason = await self._find_bisync_changes()
+        BisyncFastPath.record_check(time.perf_counter() - start_time, miss_reason)
+        if miss_reason is None:
+            logger.info('No changes for "%s" since the last bisync, skipping', self._id)
+            return 0
+
+        start_time = time.perf_counter()
+        sync_result = await super()._rclone_execute(winner, extra_args)
+        if sync_result == 0:
+            BisyncFastPath.record_full_run(time.perf_counter() - start_time)
+        return sync_result
+
+    async def _find_bisync_changes(self) -> str | None:
+        """
+        Compares the local files and the cloud with the listings of the last bisync.
+        The local side is checked first as it only needs a stat of the filtered paths.
+
+        Returns:
+        str | None: Why the bisync has to run, None if neither side changed.
+        """
+        local_path, cloud_path, _ = self._get_sync_paths()
+        listing_paths = get_listing_paths(local_path, cloud_path)
+        if any(path.with_suffix(".lst-err").exists() for path in listing_paths):
+            return "last_bisync_failed"
+        path1_listing, path2_listing = await asyncio.gather(
+            *[asyncio.to_thread(read_listing, path) for path in listing_paths]
+        )
+        if (path1_listing is None) or (path2_listing is None):
+            return "no_listing"
+
+        try:
+            matcher = FilterMatcher(self._get_filter_lines())
+        except ValueError as e:
+            logger.debug('Cannot match filters of "%s" locally: %s', self._id, e)
+            return "unsupported_filters"
+        local_files = await asyncio.to_thread(
+            list_filtered_files, matcher, local_path, self._follows_symlinks()
+        )
+        if local_files is None:
+            return "too_many_files"
+        TargetRegistry.record_file_profile(
+            self._id, get_file_profile(size for size, _ in local_files.values())
+        )
+        changes = find_listing_changes(
+            path1_listing,
+            {path: (size, mtime_ns / 1e9) for path, (size, mtime_ns) in local_files.items()},
+            LOCAL_MODTIME_TOLERANCE,
+        )
+        if changes:
+            logger.debug("Local changes since the last bisync: %s", changes)
+            return "local_changes"
+
+        remote_entries = await RcloneManager.list_remote_entries(
+            cloud_path, self._get_filter_files()
+        )
+        if remote_entries is None:
+            return "remote_listing_failed"
+        try:
+            remote_files = {
+                path: (size, parse_time(modtime)) for path, (size, modtime) in remote_entries.items()
+            }
+        except ValueError as e:
+            logger.debug("Failed to parse the listing of %s: %s", cloud_path, e)
+            return "remote_listing_failed"
+        changes = find_listing_changes(path2_listing, remote_files, REMOTE_MODTIME_TOLERANCE)
+        if changes:
+            logger.debug("Cloud changes since the last bisync: %s", changes)
+            return "remote_changes"
+
+        return None
+
     async def resync(self, winner: RcloneSyncWinner) -> int:
         """
         Triggers rclone bisync resync to fix sync issues. Only works when bisync is enabled.
@@ -270,29 +1056,633 @@ class GlobalSyncTarget(_SyncTarget):
         async def sync_task():
             return await self._rclone_execute(winner, ["--resync"])
 
-        return await self._start_sync_task(sync_task)
+        return await self._start_sync_task(
+            sync_task, f"resync-{winner.value}", self._get_sync_priority(winner)
+        )
 
 
 class GameSyncTarget(_SyncTarget):
     _sync_mode = RcloneSyncMode.COPY
 
-    def __init__(self, app_id: int):
+    def __init__(self, app_id: int, remote_listing: list[str] | None = None):
         if app_id <= 0:
             raise ValueError(f"Invalid app_id {app_id}, it is required to be > 0")
         super().__init__(str(app_id))
         if Config.get_config_item("strict_game_sync"):
             self._sync_mode = RcloneSyncMode.SYNC
+        self._remote_listing = remote_listing
+        self._pause_pid: int | None = None
+        self._snapshot_dir: Path | None = None
+
+    async def sync(self, winner: RcloneSyncWinner, pid: int | None = None) -> int:
+        """
+        Runs the rclone sync process.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync, its data will be preserved as priority.
+        pid (int | None): The game process, paused while an upload takes a snapshot of the files.
+
+        Returns:
+        int: Exit code of the rclone sync process if it runs, -1 if it cannot run.
+        """
+        self._pause_pid = pid
+        return await super().sync(winner)
+
+    async def _rclone_execute(
+        self, winner: RcloneSyncWinner, extra_args: list[str] = []
+    ) -> int:
+        """
+        Runs the rclone sync process, skipping it if it's an upload and the local files
+        haven't changed since the last upload.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync, its data will be preserved as priority.
+        extra_args (list[str]): Extra arguemnts to be passed to rclone
+
+        Returns:
+        int: Exit code of the rclone sync process if it runs, -1 if it cannot run.
+        """
+        local_path, cloud_path, reverse = self._get_sync_paths(winner)
+        upload = super()._rclone_execute
+        if Config.get_config_item("snapshot_store") and (not extra_args):
+            if reverse:
+                sync_result = await self._snapshot_execute(winner, reverse)
+            else:
+                sync_result = await self._pause_for_upload(
+                    lambda: self._snapshot_execute(winner, reverse), time.perf_counter()
+                )
+            if sync_result is not None:
+                return sync_result
+
+        roots = self._get_manifest_roots()
+        if reverse and (not extra_args):
+            self._manifest.clear()
+            return await self._download(winner)
+        if reverse or extra_args or (roots is None):
+            # Only an upload of a known set of paths can be proven to be a no-op
+            self._manifest.clear()
+            if reverse:
+                return await upload(winner, extra_args)
+            return await self._pause_for_upload(
+                lambda: upload(winner, extra_args), time.perf_counter()
+            )
+
+        journal = change_journal.stop_journal(self._id)
+        fingerprint = self._get_manifest_fingerprint()
+        start_time = time.perf_counter()
+        unchanged = await asyncio.to_thread(self._manifest.is_unchanged, fingerprint)
+        logger.debug(
+            'Manifest check for "%s" took %.3fs', self._id, time.perf_counter() - start_time
+        )
+        if unchanged:
+            logger.info('No local changes for "%s" since last upload, skipping', self._id)
+            if journal:
+                journal.discard()
+            return 0
+
+        if self._sync_mode == RcloneSyncMode.COPY:
+            if not journal:
+                journal = await self._resume_change_journal(roots, fingerprint)
+            if journal:
+                self._files_from = await asyncio.to_thread(journal.get_files_from)
+        if journal:
+            journal.discard()
+        if not self._files_from:
+            logger.debug('No usable change journal for "%s", uploading with full scan', self._id)
+
+        async def upload_live_files() -> tuple[int, dict[str, Any] | None]:
+            entries = await asyncio.to_thread(SyncManifest.snapshot, roots)
+            return await upload(winner, extra_args), entries
+
+        start_time = time.perf_counter()
+        try:
+            if Config.get_config_item("snapshot_upload"):
+                self._snapshot_dir, entries, freeze_seconds = await self._take_upload_snapshot(roots)
+            if self._snapshot_dir is None:
+                sync_result, entries = await self._pause_for_upload(upload_live_files, start_time)
+            else:
+                sync_result = await upload(winner, extra_args)
+                logger.info(
+                    'Upload of "%s" froze the files for %.3fs of %.3fs',
+                    self._id,
+                    freeze_seconds,
+                    time.perf_counter() - start_time,
+                )
+        finally:
+            self._files_from = None
+            if self._snapshot_dir:
+                await asyncio.to_thread(shutil.rmtree, self._snapshot_dir, ignore_errors=True)
+                self._snapshot_dir = None
+        if sync_result == 0 and entries is not None:
+            self._manifest.save(entries, fingerprint)
+            TargetRegistry.record_file_profile(
+                self._id,
+                get_file_profile(
+                    signature[1] for signature in entries.values() if signature and not signature[0]
+                ),
+            )
+        else:
+            self._manifest.clear()
+
+        return sync_result
+
+    async def _pause_for_upload(
+        self, upload: Callable[[], Awaitable[Any]], start_time: float
+    ) -> Any:
+        """
+        Runs an upload of the live files with the game paused throughout, if a game
+        process was given, as the files could change while they are read otherwise.
+
+        Parameters:
+        upload (Callable[[], Awaitable[Any]]): The upload.
+        start_time (float): When the upload started, from time.perf_counter, the time
+                            spent before the game is paused is not frozen.
+
+        Returns:
+        Any: The result of the upload.
+        """
+        if not self._pause_pid:
+            return await upload()
+
+        pause_time = time.perf_counter()
+        await asyncio.to_thread(process_control.pause, self._pause_pid)
+        try:
+            return await upload()
+        finally:
+            await asyncio.to_thread(process_control.resume, self._pause_pid)
+            end_time = time.perf_counter()
+            logger.info(
+                'Upload of "%s" froze the files for %.3fs of %.3fs',
+                self._id,
+                end_time - pause_time,
+                end_time - start_time,
+            )
+
+    async def _take_upload_snapshot(
+        self, roots: list[str]
+    ) -> tuple[Path | None, dict[str, Any] | None, float | None]:
+        """
+        Copies the files to upload to a staging directory at a point in time, pausing the game
+        only for that long. The upload then reads the copy while the game goes on.
+
+        Parameters:
+        roots (list[str]): The local paths covered by the filters.
+
+        Returns:
+        tuple[Path | None, dict[str, Any] | None, float | None]: The staging directory, None if
+                                                                the upload has to read the live
+                                                                files, the manifest entries of the
+                                                                files as copied and how long the
+                                                                files were frozen in seconds.
+        """
+        local_path, _, _ = self._get_sync_paths()
+        if self._files_from:
+            with self._files_from.open("r") as f:
+                files = [line for line in f.read().splitlines() if line]
+        else:
+            try:
+                listing = await asyncio.to_thread(
+                    list_filtered_files,
+                    FilterMatcher(self._get_filter_lines()),
+                    local_path,
+                    self._follows_symlinks(),
+                )
+            except ValueError as e:
+                logger.warning('Cannot snapshot "%s", uploading the live files: %s', self._id, e)
+                return None, None, None
+            if listing is None:
+                logger.warning('Too many files to snapshot "%s", uploading the live files', self._id)
+                return None, None, None
+            files = list(listing)
+
+        snapshot_dir = Path(decky.DECKY_PLUGIN_RUNTIME_DIR) / "upload-snapshots" / self._id
+        await asyncio.to_thread(shutil.rmtree, snapshot_dir, ignore_errors=True)
+        start_time = time.perf_counter()
+        if self._pause_pid:
+            await asyncio.to_thread(process_control.pause, self._pause_pid)
+        try:
+            stats = await asyncio.to_thread(snapshot_files, local_path, files, snapshot_dir)
+            entries = await asyncio.to_thread(SyncManifest.snapshot, roots)
+        except OSError as e:
+            failed = e
+        else:
+            failed = None
+        finally:
+            if self._pause_pid:
+                await asyncio.to_thread(process_control.resume, self._pause_pid)
+        freeze_seconds = time.perf_counter() - start_time
+        if failed:
+            logger.warning('Failed to snapshot "%s", uploading the live files: %s', self._id, failed)
+            await asyncio.to_thread(shutil.rmtree, snapshot_dir, ignore_errors=True)
+            return None, None, None
+
+        logger.info(
+            'Snapshot of "%s" for upload: %d files, %d reflinked, %d copied, %d bytes',
+            self._id,
+            stats["files"],
+            stats["reflinked"],
+            stats["copied"],
+            stats["bytes"],
+        )
+        return snapshot_dir, entries, freeze_seconds
+
+    def _get_rclone_paths(self, winner: RcloneSyncWinner) -> tuple[str, str]:
+        """
+        Retrieves the source and destination of the rclone call, uploads read the snapshot if there is one.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync.
+
+        Returns:
+        tuple[str, str]: The source and destination of the rclone call.
+        """
+        source, destination = super()._get_rclone_paths(winner)
+        if self._snapshot_dir:
+            return str(self._snapshot_dir), destination
+        return source, destination
+
+    async def _snapshot_execute(self, winner: RcloneSyncWinner, reverse: bool) -> int | None:
+        """
+        Uploads or restores a snapshot of the target in the chunk store.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync.
+        reverse (bool): Whether the data flows from cloud to local.
+
+        Returns:
+        int | None: Exit code of the sync, None if it has to go through the mirror instead,
+                    i.e. the filters cannot be listed locally or there is no snapshot to restore.
+        """
+        if not self.get_filters():
+            logger.info(f'No filter for sync "{self._id}"')
+            return 0
+        try:
+            matcher = FilterMatcher(self._get_filter_lines())
+        except ValueError as e:
+            logger.warning('Cannot snapshot "%s", using the mirror: %s', self._id, e)
+            return None
+        local_path, _, _ = self._get_sync_paths()
+        files = await asyncio.to_thread(
+            list_filtered_files, matcher, local_path, self._follows_symlinks()
+        )
+        if files is None:
+            logger.warning('Too many files to snapshot "%s", using the mirror', self._id)
+            return await self._fall_back_to_mirror(reverse)
+        if any(size > CHUNK_FILE_MAX_SIZE for size, _ in files.values()):
+            logger.info('Files of "%s" too big to chunk, using the mirror', self._id)
+            return await self._fall_back_to_mirror(reverse)
+
+        start_wall_time = time.time()
+        start_time = time.perf_counter()
+        self._run_timings = dict()
+        self._run_stats = dict()
+        # The mirror no longer proves anything about the local files
+        self._manifest.clear()
+        if self._report_progress:
+            await self._update_progress({})
+        store = self._get_snapshot_store()
+        if reverse:
+            stats = await store.restore(files, self._sync_mode == RcloneSyncMode.SYNC)
+            if stats is None:
+                logger.info('No snapshot of "%s" to restore, using the mirror', self._id)
+                return None
+        else:
+            stats = await store.upload(files)
+            TargetRegistry.record_file_profile(
+                self._id, get_file_profile(size for size, _ in files.values())
+            )
+        self._run_stats = {"transfers": stats["new_chunks"], "bytes": stats["bytes"]}
+        if self._report_progress:
+            await self._update_progress(self._run_stats, stats["exit_code"])
+
+        await self._record_run(
+            winner, "snapshot", "default", start_wall_time, start_time, stats["exit_code"]
+        )
+        return stats["exit_code"]
+
+    async def _fall_back_to_mirror(self, reverse: bool) -> int | None:
+        """
+        Sends an upload to the mirror, marking the latest snapshot so that restores
+        read the mirror as well rather than an older snapshot.
+
+        Parameters:
+        reverse (bool): Whether the data flows from cloud to local.
+
+        Returns:
+        int | None: None to go through the mirror, the exit code if the marker cannot be uploaded.
+        """
+        if reverse:
+            return None
+        exit_code = await self._get_snapshot_store().upload_mirror_marker()
+        if exit_code != 0:
+            logger.error('Failed to mark the snapshot of "%s" as mirrored', self._id)
+            return exit_code
+        return None
+
+    def _get_snapshot_store(self) -> SnapshotStore:
+        """
+        Returns the chunk store of the target.
+
+        Returns:
+        SnapshotStore: The store.
+        """
+        local_path, _, _ = self._get_sync_paths()
+        destination = Config.get_config_item("sync_destination")
+        # Outside of the compress overlay, whose migration only moves the mirror
+        return SnapshotStore(
+            self._id,
+            local_path,
+            get_cloud_path(f"{destination}{CHUNKS_DESTINATION_SUFFIX}", compressed=False),
+            get_cloud_path(f"{destination}{SNAPSHOTS_DESTINATION_SUFFIX}", compressed=False)
+            + f"/{self._id}",
+            PLUGIN_STATE_DIR / f"{self._id}.snapshot.json",
+            Path(decky.DECKY_PLUGIN_RUNTIME_DIR) / "snapshots" / self._id,
+        )
+
+    def _get_sync_priority(self, winner: RcloneSyncWinner) -> SyncPriority:
+        """
+        Returns the priority of a sync of this target, downloads block the game from starting.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync.
+
+        Returns:
+        SyncPriority: The priority.
+        """
+        if winner == RcloneSyncWinner.CLOUD:
+            return SyncPriority.GAME_DOWNLOAD
+        return SyncPriority.GAME_UPLOAD
+
+    def _get_sync_key(self, winner: RcloneSyncWinner) -> str:
+        """
+        Returns what identifies a sync of this target, an upload pausing the game only
+        coalesces with one pausing the same process.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync.
+
+        Returns:
+        str: The key.
+        """
+        if self._pause_pid:
+            return f"{winner.value}-{self._pause_pid}"
+        return winner.value
+
+    async def _download(self, winner: RcloneSyncWinner) -> int:
+        """
+        Runs a download. If a listing of the cloud destination is given, only the files
+        in it that pass the filters are fetched, without rclone listing the cloud again.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync, its data will be preserved as priority.
+
+        Returns:
+        int: Exit code of the rclone sync process if it runs, -1 if it cannot run.
+        """
+        if Config.get_config_item("save_prefetch") and (self._sync_mode == RcloneSyncMode.COPY):
+            sync_result = await self._apply_prefetch(winner)
+            if sync_result is not None:
+                return sync_result
+
+        if (
+            (self._remote_listing is not None)
+            and (self._sync_mode == RcloneSyncMode.COPY)
+            and self.get_filters()
+        ):
+            try:
+                matcher = FilterMatcher(self._get_filter_lines())
+                files = [path for path in self._remote_listing if matcher.include(path)]
+            except ValueError as e:
+                logger.warning('Cannot match filters of "%s" locally: %s', self._id, e)
+            else:
+                if not files:
+                    logger.info('No files of "%s" in the cloud, skipping', self._id)
+                    return 0
+                self._files_from = Path(decky.DECKY_PLUGIN_RUNTIME_DIR) / f"{self._id}.files"
+                with self._files_from.open("w") as f:
+                    f.write("\n".join(files))
+
+        start_time = time.perf_counter()
+        try:
+            sync_result = await super()._rclone_execute(winner)
+        finally:
+            self._files_from = None
+        if sync_result == 0:
+            SavePrefetch.record_download(time.perf_counter() - start_time)
+        return sync_result
+
+    async def prefetch(self) -> int:
+        """
+        Downloads the cloud files that differ from the local ones to a staging directory
+        in the background, for the next download to only move them into place.
+
+        Returns:
+        int: Exit code of rclone, 0 if there's nothing to prefetch.
+        """
+        async def sync_task():
+            return await self._prefetch()
+
+        return await self._start_sync_task(sync_task, "prefetch", SyncPriority.PREFETCH)
+
+    async def _prefetch(self) -> int:
+        """
+        Stages the cloud files that differ from the local ones, see prefetch.
+
+        Returns:
+        int: Exit code of rclone, 0 if there's nothing to prefetch.
+        """
+        if (
+            (not Config.get_config_item("save_prefetch"))
+            or (self._sync_mode != RcloneSyncMode.COPY)
+            or Config.get_config_item("snapshot_store")
+            or (not self.get_filters())
+        ):
+            return 0
+
+        local_path, cloud_path, _ = self._get_sync_paths()
+        remote = await RcloneManager.list_remote_entries(cloud_path, self._get_filter_files())
+        if remote is None:
+            return 1
+        if SavePrefetch.get_staged(self._id) == remote:
+            logger.debug('Prefetched files of "%s" are current', self._id)
+            return 0
+
+        SavePrefetch.discard(self._id)
+        try:
+            outdated = await asyncio.to_thread(find_outdated_files, local_path, remote)
+        except ValueError as e:
+            logger.warning('Cannot prefetch "%s": %s', self._id, e)
+            return 1
+        staging_dir = SavePrefetch.get_staging_dir(self._id)
+        if outdated:
+            staging_dir.mkdir(parents=True, exist_ok=True)
+            files_from = staging_dir.with_suffix(".files")
+            with files_from.open("w") as f:
+                f.write("\n".join(outdated))
+            # A background download, limited like the syncs if it falls back to an rclone process
+            bwlimit_args = BandwidthPolicy.get_process_args(True)
+            if not await RcloneCapabilities.has_flag("--bwlimit"):
+                bwlimit_args = []
+            exit_code = await RcloneManager.copy(
+                cloud_path,
+                str(staging_dir),
+                files_from,
+                bwlimit_args=bwlimit_args,
+                on_process=lambda process, running: (
+                    BandwidthPolicy.attach(process, bwlimit_args)
+                    if running
+                    else BandwidthPolicy.detach(process)
+                ),
+            )
+            files_from.unlink(missing_ok=True)
+            if exit_code != 0:
+                SavePrefetch.discard(self._id)
+                return exit_code
+
+        SavePrefetch.set_staged(self._id, remote)
+        logger.info('Prefetched %d files of "%s"', len(outdated), self._id)
+        return 0
+
+    async def _apply_prefetch(self, winner: RcloneSyncWinner) -> int | None:
+        """
+        Completes a download with the prefetched files if the cloud didn't change since.
+
+        Parameters:
+        winner (RcloneSyncWinner): The winner of the sync.
+
+        Returns:
+        int | None: 0 if the prefetched files were used, None if rclone has to run.
+        """
+        staged = SavePrefetch.get_staged(self._id)
+        if staged is None:
+            SavePrefetch.record_apply(0, "not_prefetched")
+            return None
+
+        start_wall_time = time.time()
+        start_time = time.perf_counter()
+        self._run_timings = dict()
+        self._run_stats = dict()
+        local_path, cloud_path, _ = self._get_sync_paths()
+        miss_reason = None
+        remote = await RcloneManager.list_remote_entries(cloud_path, self._get_filter_files())
+        if remote != staged:
+            miss_reason = "cloud_changed"
+        else:
+            staging_dir = SavePrefetch.get_staging_dir(self._id)
+            try:
+                outdated = await asyncio.to_thread(find_outdated_files, local_path, remote)
+                if all((staging_dir / path).is_file() for path in outdated):
+                    await asyncio.to_thread(move_staged_files, staging_dir, local_path, outdated)
+                else:
+                    miss_reason = "local_changed"
+            except (OSError, ValueError) as e:
+                logger.warning('Failed to apply the prefetched files of "%s": %s', self._id, e)
+                miss_reason = "apply_failed"
+        SavePrefetch.discard(self._id)
+        SavePrefetch.record_apply(time.perf_counter() - start_time, miss_reason)
+        if miss_reason:
+            return None
+
+        self._run_stats = {"transfers": len(outdated), "bytes": sum(remote[path][0] for path in outdated)}
+        if self._report_progress:
+            await self._update_progress(self._run_stats, 0)
+        await self._record_run(winner, "prefetch", "default", start_wall_time, start_time, 0)
+        return 0
+
+    async def start_change_journal(self):
+        """
+        Starts recording the files changed under the filter roots, so that the next
+        upload only goes through them. The journal is only used if the local files
+        were uploaded by the last sync.
+        """
+        if not Config.get_config_item("change_journal"):
+            return
+
+        roots = self._get_manifest_roots()
+        if roots is None:
+            logger.info('Filters of "%s" cannot be watched', self._id)
+            return
+
+        try:
+            matcher = FilterMatcher(self._get_filter_lines())
+        except ValueError as e:
+            logger.warning('Filters of "%s" cannot be watched: %s', self._id, e)
+            return
+
+        fingerprint = self._get_manifest_fingerprint()
+        valid = await asyncio.to_thread(self._manifest.is_unchanged, fingerprint)
+        local_path, _, _ = self._get_sync_paths()
+        change_journal.start_journal(self._id, roots, local_path, matcher, valid, fingerprint)
+
+    async def _resume_change_journal(
+        self, roots: list[str], fingerprint: str
+    ) -> change_journal.ChangeJournal | None:
+        """
+        Resumes the change journal left on disk by an earlier run of the plugin.
+
+        Parameters:
+        roots (list[str]): The local paths covered by the filters.
+        fingerprint (str): The current fingerprint of the manifest.
+
+        Returns:
+        change_journal.ChangeJournal | None: The journal, None if there is no usable one.
+        """
+        try:
+            matcher = FilterMatcher(self._get_filter_lines())
+        except ValueError as e:
+            logger.warning('Cannot resume the journal of "%s": %s', self._id, e)
+            return None
+        local_path, _, _ = self._get_sync_paths()
+        return await asyncio.to_thread(
+            change_journal.resume_journal, self._id, roots, local_path, matcher, fingerprint
+        )
+
+    def _get_manifest_roots(self) -> list[str] | None:
+        """
+        Retrieves the local paths covered by the filters.
+
+        Returns:
+        list[str] | None: The root paths, None if they cannot be determined.
+        """
+        local_path, _, _ = self._get_sync_paths()
+        return SyncManifest.get_filter_roots(
+            self.get_shared_filter() + self.get_filters(), local_path
+        )
+
+    def _get_manifest_fingerprint(self) -> str:
+        """
+        Returns the fingerprint of everything that decides what an upload covers.
+
+        Returns:
+        str: The fingerprint.
+        """
+        local_path, cloud_path, _ = self._get_sync_paths()
+        return SyncManifest.get_fingerprint(
+            self._sync_mode.value,
+            local_path,
+            cloud_path,
+            self._shared_filter_file,
+            self._target_filter_file,
+        )
 
 
 class CaptureSyncTarget(_SyncTarget):
     _filter_required = False
+    _report_progress = False
+    _history_target = "captures"
     _sync_mode = RcloneSyncMode.COPY
 
-    def __init__(self, capture_path: str):
+    def __init__(self, capture_path: str, files_from: Path | None = None):
+        """
+        Parameters:
+        capture_path (str): The capture to upload, or the directory of the captures if files_from is given.
+        files_from (Path | None): A list of captures inside capture_path to upload in one go.
+        """
         if not capture_path:
             raise ValueError("capture_path is required")
         super().__init__(capture_path)
         self._capture_path = Path(capture_path)
+        self._files_from = files_from
 
     async def sync(self, _=None) -> int:
         """
@@ -303,21 +1693,32 @@ class CaptureSyncTarget(_SyncTarget):
         """
         return await super().sync(RcloneSyncWinner.LOCAL)
 
-    def _get_sync_paths(self, _=None) -> tuple[str, str]:
+    def _get_sync_priority(self, _=None) -> SyncPriority:
+        """
+        Returns the priority of a sync of this target.
+
+        Returns:
+        SyncPriority: The priority.
+        """
+        return SyncPriority.CAPTURE_UPLOAD
+
+    def _get_sync_paths(self, _=None) -> tuple[str, str, bool]:
         """
         Retrieves the sync root and destination directory from the configuration.
 
         Returns:
-        tuple[str, str]: A tuple containing the source sync path and destination sync path.
+        tuple[str, str, bool]: A tuple containing the source sync path, destination sync path
+                               and False as captures are only uploaded.
         """
         destination = Config.get_config_item("capture_upload_destination")
 
         return (
             str(self._capture_path),
-            f"cloud:{destination}",
+            get_cloud_path(destination, compressed=False),
+            False,
         )
 
-    def _get_rclone_log_path(self) -> Path:
+    async def _get_rclone_log_path(self) -> Path:
         """
         Returns the rclone log file path, for screenshots it will be the config log
 
@@ -336,6 +1737,139 @@ class CaptureSyncTarget(_SyncTarget):
         return []
 
 
+async def get_supported_bisync_args(args: list[str]) -> list[str]:
+    """
+    Drops the bisync flags the installed rclone doesn't know, which would fail the whole sync.
+
+    Parameters:
+    args (list[str]): The bisync arguments.
+
+    Returns:
+    list[str]: The arguments with unsupported flags and their values removed.
+    """
+    supported = list()
+    skip_value = False
+    for arg in args:
+        if arg.startswith("--"):
+            skip_value = False
+            if not await RcloneCapabilities.has_flag(arg, bisync=True):
+                logger.warning("Flag %s is not supported by this rclone, ignoring it", arg)
+                # A separate value follows unless it is given as --flag=value
+                skip_value = "=" not in arg
+                continue
+        elif skip_value:
+            skip_value = False
+            if not arg.startswith("-"):
+                continue
+        supported.append(arg)
+    return supported
+
+
+def rc_bisync_params(args: list[str]) -> dict[str, Any] | None:
+    """
+    Translates bisync command line flags to the parameters of the rc sync/bisync call.
+
+    Parameters:
+    args (list[str]): The bisync flags.
+
+    Returns:
+    dict[str, Any] | None: The rc parameters, None if any of the flags has no rc counterpart.
+    """
+    params = dict()
+    args_iter = iter(args)
+    for arg in args_iter:
+        flag, has_value, value = arg.partition("=")
+        if flag not in RC_BISYNC_FLAGS:
+            logger.debug("Flag %s is not supported by rc sync/bisync", flag)
+            return None
+
+        param, value_type = RC_BISYNC_FLAGS[flag]
+        if value_type is None:
+            params[param] = (value.lower() != "false") if has_value else True
+            continue
+        try:
+            params[param] = value_type(value if has_value else next(args_iter))
+        except (StopIteration, ValueError):
+            logger.debug("Invalid value for flag %s", flag)
+            return None
+
+    return params
+
+
+async def sync_many(app_ids: list[int], winner: RcloneSyncWinner) -> dict[int, int]:
+    """
+    Syncs multiple targets concurrently through the scheduler.
+    Game downloads share a single listing of the cloud destination.
+
+    Parameters:
+    app_ids (list[int]): The app_ids of the targets.
+    winner (RcloneSyncWinner): The winner of the syncs, its data will be preserved as priority.
+
+    Returns:
+    dict[int, int]: Exit code of each target's sync, -1 if it cannot run.
+    """
+    start_time = time.perf_counter()
+    remote_listing = None
+    if winner == RcloneSyncWinner.CLOUD and any(app_id > 0 for app_id in app_ids):
+        remote_listing = await RcloneManager.list_remote_files(
+            get_cloud_path(Config.get_config_item("sync_destination"))
+        )
+        logger.info(
+            "Listed %s cloud files in %.3fs",
+            len(remote_listing) if remote_listing is not None else "no",
+            time.perf_counter() - start_time,
+        )
+
+    async def sync_one(app_id: int) -> int:
+        try:
+            if app_id > 0:
+                return await GameSyncTarget(app_id, remote_listing).sync(winner)
+            return await GlobalSyncTarget().sync(winner)
+        except Exception as e:
+            logger.error('Error during sync of "%d": %s', app_id, e)
+            return -1
+
+    results = await asyncio.gather(*(sync_one(app_id) for app_id in app_ids))
+    logger.info(
+        "Synced %d targets in %.3fs", len(app_ids), time.perf_counter() - start_time
+    )
+    return dict(zip(app_ids, results))
+
+
+async def prefetch_likely_targets():
+    """
+    Prefetches the games synced most recently, which are the most likely to be launched next,
+    if no sync is running or waiting.
+    """
+    stats = SyncScheduler.get_stats()
+    if stats["running"] or stats["queue_depth"] or stats["held"]:
+        return
+
+    targets = sorted(
+        (
+            (target["last_sync"] or 0, app_id)
+            for app_id, target in TargetRegistry.get_targets().items()
+            if app_id > 0
+        ),
+        reverse=True,
+    )
+    for _, app_id in targets[:PREFETCH_IDLE_TARGETS]:
+        await GameSyncTarget(app_id).prefetch()
+
+
+def cancel_sync(app_id: int) -> int:
+    """
+    Cancels the waiting and running syncs of a target.
+
+    Parameters:
+    app_id (int): The app_id of the game, 0 for global sync.
+
+    Returns:
+    int: Number of syncs cancelled.
+    """
+    return SyncScheduler.cancel(get_sync_target(app_id)._id)
+
+
 def get_sync_target(app_id: int) -> _SyncTarget:
     """
     Returns the sync target based on the app_id.
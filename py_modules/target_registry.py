@@ -0,0 +1,249 @@
+from typing import Any
+import json, os, time
+
+from common_defs import *
+from utils import get_filters, set_filters
+
+TARGET_STATS_PATH = PLUGIN_STATE_DIR / "targets.json"
+
+
+class TargetRegistry:
+    """
+    In-memory index of the sync targets, i.e. the filter files in the config directory,
+    with their filters and the results of their last sync.
+
+    The files are only listed again when the modification time of the config directory
+    changes, which catches filter files created, deleted or replaced out of band, and a filter
+    file is only read again when its own modification time or size changes, which catches
+    files edited in place. The state the plugin updates on every sync lives in a subdirectory,
+    so it doesn't change the directory.
+    """
+
+    _filters: dict[str, list[str]] = dict()
+    _signatures: dict[str, tuple[int, int]] = dict()
+    _stats: dict[str, dict[str, Any]] = dict()
+    _dir_mtime_ns: int | None = None
+
+    @classmethod
+    def get_target_ids(cls) -> list[int]:
+        """
+        Returns the app IDs of the targets with filters, -1 for the shared and 0 for the global filter.
+
+        Returns:
+        list[int]: The app IDs.
+        """
+        cls._refresh()
+        return [_to_app_id(id) for id in cls._filters]
+
+    @classmethod
+    def get_filters(cls, id: str) -> list[str]:
+        """
+        Retrieves the filters of a target.
+
+        Parameters:
+        id (str): ID of the target, i.e. the stem of its filter file.
+
+        Returns:
+        list[str]: The filters, empty if the target has none.
+        """
+        cls._refresh(id)
+        return list(cls._filters.get(id, []))
+
+    @classmethod
+    def set_filters(cls, id: str, filters: list[str]):
+        """
+        Writes the filters of a target and updates the index.
+
+        Parameters:
+        id (str): ID of the target, i.e. the stem of its filter file.
+        filters (list[str]): The filters to set, elements inside should not contain '\\n'.
+        """
+        cls._refresh(id)
+        set_filters(PLUGIN_CONFIG_DIR / f"{id}.filter", filters)
+        cls._load(id)
+
+    @classmethod
+    def record_sync(
+        cls, id: str, exit_code: int, transfers: int | None = None, bytes: int | None = None
+    ):
+        """
+        Records the result of a sync of a target.
+
+        Parameters:
+        id (str): ID of the target.
+        exit_code (int): Exit code of the sync.
+        transfers (int | None): Number of files transferred, None if unknown.
+        bytes (int | None): Number of bytes transferred, None if unknown.
+        """
+        cls._refresh(id)
+        stats = cls._stats.setdefault(id, dict())
+        stats.update(last_sync=time.time(), exit_code=exit_code)
+        if transfers is not None:
+            stats.update(last_transfers=transfers, last_bytes=bytes or 0)
+        cls._save_stats()
+
+    @classmethod
+    def record_size(cls, id: str, size: int):
+        """
+        Records the size of the local files covered by a target.
+
+        Parameters:
+        id (str): ID of the target.
+        size (int): Total size in bytes.
+        """
+        cls._refresh(id)
+        cls._stats.setdefault(id, dict())["size"] = size
+        cls._save_stats()
+
+    @classmethod
+    def record_file_profile(cls, id: str, profile: dict[str, int]):
+        """
+        Records the number and sizes of the local files covered by a target.
+
+        Parameters:
+        id (str): ID of the target.
+        profile (dict[str, int]): The file profile, see sync_profile.get_file_profile.
+        """
+        cls._refresh(id)
+        stats = cls._stats.setdefault(id, dict())
+        if all(stats.get(key) == value for key, value in profile.items()):
+            return
+        stats.update(profile)
+        cls._save_stats()
+
+    @classmethod
+    def get_stats(cls, id: str) -> dict[str, Any]:
+        """
+        Retrieves everything recorded about a target.
+
+        Parameters:
+        id (str): ID of the target.
+
+        Returns:
+        dict[str, Any]: The recorded values, empty if there are none.
+        """
+        cls._refresh(id)
+        return dict(cls._stats.get(id, {}))
+
+    @classmethod
+    def get_targets(cls) -> dict[int, dict[str, Any]]:
+        """
+        Retrieves every target with its number of filters, size, last sync time and exit code.
+
+        Returns:
+        dict[int, dict[str, Any]]: The targets by app ID.
+        """
+        cls._refresh()
+        return {
+            _to_app_id(id): {
+                "filters": len(filters),
+                "size": cls._stats.get(id, {}).get("size"),
+                "last_sync": cls._stats.get(id, {}).get("last_sync"),
+                "exit_code": cls._stats.get(id, {}).get("exit_code"),
+            }
+            for id, filters in cls._filters.items()
+        }
+
+    @classmethod
+    def _refresh(cls, id: str | None = None):
+        """
+        Brings the index up to date, listing the config directory again if it changed
+        and reading the filter files that changed since they were last read.
+
+        Parameters:
+        id (str | None): Only check the filter file of this target, None to check all of them.
+        """
+        if cls._dir_mtime_ns is None:
+            cls._load_stats()
+
+        mtime_ns = _get_mtime_ns()
+        if mtime_ns != cls._dir_mtime_ns:
+            cls._dir_mtime_ns = mtime_ns
+            ids = {
+                path.stem
+                for path in PLUGIN_CONFIG_DIR.glob("*.filter")
+                if (path.stem in SYNC_FILTER_TYPE_DICT) or path.stem.isdigit()
+            }
+            for removed_id in set(cls._filters) - ids:
+                cls._filters.pop(removed_id)
+                cls._signatures.pop(removed_id, None)
+            # The known ones are checked below
+            for new_id in ids - set(cls._filters):
+                cls._load(new_id)
+            logger.debug("Sync target registry refreshed, %d targets", len(cls._filters))
+
+        for target_id in [id] if id is not None else list(cls._filters):
+            cls._load(target_id)
+
+    @classmethod
+    def _load(cls, id: str):
+        """
+        Reads the filter file of a target if it changed since it was last read.
+
+        Parameters:
+        id (str): ID of the target.
+        """
+        path = PLUGIN_CONFIG_DIR / f"{id}.filter"
+        try:
+            st = path.stat()
+        except OSError:
+            cls._filters.pop(id, None)
+            cls._signatures.pop(id, None)
+            return
+
+        signature = (st.st_mtime_ns, st.st_size)
+        if cls._signatures.get(id) != signature:
+            cls._filters[id] = get_filters(path)
+            cls._signatures[id] = signature
+
+    @classmethod
+    def _load_stats(cls):
+        """
+        Reads the persisted sync results.
+        """
+        try:
+            with TARGET_STATS_PATH.open("r") as f:
+                cls._stats = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("Failed to read %s: %s", TARGET_STATS_PATH, e)
+
+    @classmethod
+    def _save_stats(cls):
+        """
+        Persists the sync results atomically.
+        """
+        tmp_path = TARGET_STATS_PATH.with_suffix(".tmp")
+        try:
+            with tmp_path.open("w") as f:
+                json.dump(cls._stats, f)
+            tmp_path.replace(TARGET_STATS_PATH)
+        except OSError as e:
+            logger.warning("Failed to write %s: %s", TARGET_STATS_PATH, e)
+
+
+def _get_mtime_ns() -> int:
+    """
+    Returns the modification time of the config directory.
+
+    Returns:
+    int: The modification time in nanoseconds, 0 if the directory doesn't exist.
+    """
+    try:
+        return os.stat(PLUGIN_CONFIG_DIR).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _to_app_id(id: str) -> int:
+    """
+    Converts the ID of a target to the app ID used by the frontend.
+
+    Parameters:
+    id (str): ID of the target.
+
+    Returns:
+    int: The app ID.
+    """
+    return SYNC_FILTER_TYPE_DICT[id] if id in SYNC_FILTER_TYPE_DICT else int(id)
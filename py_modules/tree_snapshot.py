@@ -0,0 +1,74 @@
+from pathlib import Path
+import errno, fcntl, os, shutil
+
+from common_defs import *
+
+# ioctl sharing the extents of a file with another one, from linux/fs.h
+FICLONE = 0x40049409
+_REFLINK_UNSUPPORTED = (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.EPERM)
+
+
+def snapshot_files(local_path: str, paths: list[str], staging_dir: Path) -> dict[str, int]:
+    """
+    Copies files to a staging directory as they are at this point in time, sharing their
+    data through a reflink where the filesystem supports it, otherwise copying it.
+    Hardlinks are not used, as a file written in place afterwards would change the copy.
+
+    Parameters:
+    local_path (str): The local root the paths are relative to.
+    paths (list[str]): The files to copy.
+    staging_dir (Path): The staging directory, laid out like the local root.
+
+    Returns:
+    dict[str, int]: The number of "files" copied, "reflinked" or "copied", and their "bytes".
+
+    Raises:
+    OSError: If a file cannot be copied.
+    """
+    stats = {"files": 0, "reflinked": 0, "copied": 0, "bytes": 0}
+    reflink = True
+    for path in paths:
+        source = os.path.join(local_path, path)
+        destination = staging_dir / path
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if reflink and _reflink(source, destination):
+                stats["reflinked"] += 1
+            else:
+                # Every file is on the same filesystems, no need to try again
+                reflink = False
+                shutil.copyfile(source, destination)
+                stats["copied"] += 1
+            shutil.copystat(source, destination)
+        except FileNotFoundError:
+            # Deleted since it was listed
+            destination.unlink(missing_ok=True)
+            continue
+        stats["files"] += 1
+        stats["bytes"] += destination.stat().st_size
+    return stats
+
+
+def _reflink(source: str, destination: Path) -> bool:
+    """
+    Makes a file share the data of another one.
+
+    Parameters:
+    source (str): The file to clone.
+    destination (Path): The clone, created or truncated.
+
+    Returns:
+    bool: False if the filesystem doesn't support it.
+
+    Raises:
+    OSError: If the files cannot be opened.
+    """
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError as e:
+            if e.errno in _REFLINK_UNSUPPORTED:
+                logger.debug("Reflink of %s unsupported: %s", source, e)
+                return False
+            raise
+    return True
@@ -1,11 +1,11 @@
 import decky
 
 import socket
-from subprocess import Popen, PIPE
 from pathlib import Path
-import os, signal
+import os
 
 from common_defs import *
+from log_reader import read_log
 from config import Config
 
 
@@ -23,90 +23,23 @@ def is_port_in_use(port: int) -> bool:
         return s.connect_ex(("localhost", port)) == 0
 
 
-def _get_process_tree(pid):
+def get_cloud_path(destination: str, compressed: bool | None = None) -> str:
     """
-    Retrieves the process tree of a given process ID.
+    Returns the rclone path of a destination on the cloud.
+    With compression the data is kept in a separate directory behind the compress overlay.
 
     Parameters:
-    pid (int): The process ID whose process tree is to be retrieved.
+    destination (str): The destination directory.
+    compressed (bool | None): Whether to go through the compress overlay, None to follow the config.
 
     Returns:
-    list: A list of child process IDs.
+    str: The rclone path, e.g. "cloud:sdh-game-sync".
     """
-    children = []
-    with Popen(["ps", "--ppid", str(pid), "-o", "pid="], stdout=PIPE) as p:
-        lines = p.stdout.readlines()
-    for chldPid in lines:
-        chldPid = chldPid.strip()
-        if not chldPid:
-            continue
-        children.extend([int(chldPid.decode())])
-
-    return children
-
-
-def send_signal(pid: int, signal: signal.Signals):
-    """
-    Sends a signal to a process and its child processes recursively.
-
-    Parameters:
-    pid (int): The process ID of the target process.
-    signal (signal.Signals): The signal to send.
-
-    Raises:
-    Exception: If an error occurs while sending the signal.
-    """
-    try:
-        os.kill(pid, signal)
-        logger.debug("Process %d received signal %s", pid, signal.name)
-
-        child_pids = _get_process_tree(pid)
-        for child_pid in child_pids:
-            send_signal(child_pid, signal)
-
-    except Exception as e:
-        logger.warning("Error sending signal %s to process %d: %s", signal.name, pid, e)
-
-
-def test_syncpath(syncpath: str) -> int:
-    """
-    Tests a sync path to determine if it's a file or a directory.
-
-    Parameters:
-    path (str): The path to test.
-
-    Returns:
-    int: The number of files if it's a directory, -1 if it exceeds the limit, or 0 if it's a file.
-    """
-    roots = Config.get_config_item("sync_root")
-    match = False
-    for root in roots:
-        if syncpath.startswith(root):
-            match = True
-            break
-    
-    if not match:
-        raise Exception("Selection is outside of sync root.")
-
-    if syncpath.endswith("/**"):
-        scan_single_dir = False
-        syncpath = syncpath[:-3]
-    elif syncpath.endswith("/*"):
-        scan_single_dir = True
-        syncpath = syncpath[:-2]
-    else:
-        return int(Path(syncpath).is_file())
-
-    count = 0
-    for _, _, os_files in os.walk(syncpath, followlinks=True):
-        count += len(os_files)
-        if count > 9000:
-            return -1
-        if scan_single_dir:
-            break
-
-    logger.debug("Counted %d files", count)
-    return count
+    if compressed is None:
+        compressed = Config.get_config_item("cloud_compression")
+    if compressed:
+        return f"{COMPRESS_REMOTE_NAME}:{destination}{COMPRESSED_DESTINATION_SUFFIX}"
+    return f"{CLOUD_REMOTE_NAME}:{destination}"
 
 
 def delete_lock_files():
@@ -118,15 +51,28 @@ def delete_lock_files():
         lck_file.unlink(missing_ok=True)
 
 
+def migrate_state_files():
+    """
+    Moves the state files out of the config directory, where earlier versions kept them.
+    """
+    PLUGIN_STATE_DIR.mkdir(parents=True, exist_ok=True)
+    for pattern in STATE_FILE_PATTERNS:
+        for path in PLUGIN_CONFIG_DIR.glob(pattern):
+            try:
+                path.replace(PLUGIN_STATE_DIR / path.name)
+                logger.info("Moved %s to %s", path, PLUGIN_STATE_DIR)
+            except OSError as e:
+                logger.warning("Failed to move %s to %s: %s", path, PLUGIN_STATE_DIR, e)
+
+
 def get_plugin_log() -> str:
     """
-    Retrieves the entire plugin log.
+    Retrieves the end of the plugin log.
 
     Returns:
-    str: The plugin log.
+    str: The last lines of the plugin log.
     """
-    with open(decky.DECKY_PLUGIN_LOG) as f:
-        return f.read()
+    return read_log(Path(decky.DECKY_PLUGIN_LOG))["content"]
 
 
 def getLocalScreenshotPath(user_id: int, screenshot_url: str) -> str:
@@ -151,23 +97,6 @@ def getLocalScreenshotPath(user_id: int, screenshot_url: str) -> str:
     )
 
 
-def get_available_filters() -> list[int]:
-    """
-    Returns a list of available sync targets.
-
-    Returns:
-    list[int]: A list of available sync targets.
-    """
-    sync_paths = list()
-    for filter in PLUGIN_CONFIG_DIR.glob("*.filter"):
-        if filter.stem in SYNC_FILTER_TYPE_DICT:
-            sync_paths.append(SYNC_FILTER_TYPE_DICT[filter.stem])
-        elif filter.stem.isdigit():
-            sync_paths.append(int(filter.stem))
-
-    return sync_paths
-
-
 def get_filters(file: Path) -> list[str]:
     """
     Retrieves sync filters from the specified file.
@@ -1,8 +1,8 @@
 import { DialogButton, showContextMenu, Menu, MenuItem } from "@decky/ui";
 import { openFilePicker, FileSelectionType } from "@decky/api";
 import { confirmPopup } from "./popups";
-import { test_syncpath } from "../helpers/backend";
-import { reduceSlashes } from "../helpers/utils";
+import { scan_syncpath } from "../helpers/backend";
+import { formatBytes, reduceSlashes } from "../helpers/utils";
 import * as Toaster from "../helpers/toaster";
 import Config from "../helpers/config";
 
@@ -47,10 +47,10 @@ export default function filterPickerButton({ text, onConfirm }: FilterPickerButt
         () => onConfirm(fullPath)
       );
     } else {
-      test_syncpath(fullPath).then(e => confirmPopup(
+      scan_syncpath(fullPath).then(e => confirmPopup(
         text,
         <span>
-          Path <i>{fullPath}</i> matches <b>{e >= 0 ? e : "tooooooo many"}</b> file(s).<br /><br />
+          Path <i>{fullPath}</i> matches <b>{e.truncated ? "tooooooo many" : e.files}</b> file(s) ({e.truncated ? "over " : ""}{formatBytes(e.bytes)}).<br /><br />
           Click "Confirm" to continue.
         </span>,
         () => onConfirm("/" + reduceSlashes(fullPath.slice(1)))
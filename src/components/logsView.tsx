@@ -1,27 +1,93 @@
 import { useEffect, useState, useRef, PropsWithChildren } from "react";
 import { IoMdRefresh } from "react-icons/io";
+import { FaAngleDoubleUp } from "react-icons/fa";
+import { addEventListener, removeEventListener } from "@decky/api";
+import { follow_log, unfollow_log } from "../helpers/backend";
 import PageView from "./pageView";
 import IconButton from "./iconButton";
 
+const LOG_PAGE_SIZE = 64 * 1024;
+const MAX_LOG_CHARS = 1024 * 1024;
+
 interface LogsViewProps {
   title: string;
   fullPage: boolean;
-  getLog: () => Promise<string>;
+  appId: number | null; // null for the plugin log
+  readLog: (offset: number | null, length?: number) => Promise<LogPage | null>;
 }
 
-export default function LogsView({ title, fullPage = true, getLog, children }: PropsWithChildren<LogsViewProps>) {
+export default function LogsView({ title, fullPage = true, appId, readLog, children }: PropsWithChildren<LogsViewProps>) {
   const [logContent, setLogContent] = useState('');
+  const [startOffset, setStartOffset] = useState(0);
   const logPreRef = useRef<HTMLPreElement>(null);
+  const scrollToEnd = useRef(true);
+
+  const showPage = (page: LogPage | null) => {
+    scrollToEnd.current = true;
+    setLogContent(page ? page.content : "No logs available.");
+    setStartOffset(page ? page.offset : 0);
+    follow_log(appId, page ? page.next_offset : 0);
+  }
+
+  const appendPage = (page: LogPage) => {
+    if (page.reset) {
+      setLogContent(page.content);
+      setStartOffset(page.offset);
+      return;
+    }
+    setLogContent(content => {
+      content += page.content;
+      if (content.length > MAX_LOG_CHARS) {
+        // Keep the page responsive, older lines can be loaded again on demand
+        const cut = content.indexOf('\n', content.length - MAX_LOG_CHARS) + 1;
+        setStartOffset(offset => offset + new TextEncoder().encode(content.slice(0, cut)).length);
+        content = content.slice(cut);
+      }
+      return content;
+    });
+  }
+
+  const loadEarlier = () => {
+    const offset = Math.max(0, startOffset - LOG_PAGE_SIZE);
+    readLog(offset, startOffset - offset).then(page => {
+      if (!page) {
+        return;
+      }
+      let content = page.content;
+      let newStartOffset = page.offset;
+      if (offset > 0) {
+        // Drop the partial first line
+        const cut = content.indexOf('\n') + 1;
+        newStartOffset += new TextEncoder().encode(content.slice(0, cut)).length;
+        content = content.slice(cut);
+      }
+      scrollToEnd.current = false;
+      setLogContent(logContent => content + logContent);
+      setStartOffset(newStartOffset);
+    });
+  }
 
   useEffect(() => {
-    getLog().then(setLogContent);
+    const onLogUpdate = (key: string, page: LogPage) => {
+      if (key == (appId == null ? "plugin" : String(appId))) {
+        appendPage(page);
+      }
+    };
+    addEventListener<[key: string, page: LogPage]>("log_update", onLogUpdate);
+    readLog(null).then(showPage);
+    return () => {
+      removeEventListener("log_update", onLogUpdate);
+      unfollow_log(appId);
+    }
   }, []);
 
   useEffect(() => {
-    logPreRef.current?.scrollTo({
-      top: logPreRef.current.scrollHeight,
-      behavior: 'smooth'
-    });
+    if (scrollToEnd.current) {
+      logPreRef.current?.scrollTo({
+        top: logPreRef.current.scrollHeight,
+        behavior: 'smooth'
+      });
+    }
   }, [logContent]);
 
   return (
@@ -29,10 +95,17 @@ export default function LogsView({ title, fullPage = true, getLog, children }: P
       title={title}
       titleItem={<>
         {children}
+        {(startOffset > 0) && (
+          <IconButton
+            icon={FaAngleDoubleUp}
+            onOKActionDescription="Load earlier logs"
+            onClick={loadEarlier}
+          />
+        )}
         <IconButton
           icon={IoMdRefresh}
           onOKActionDescription="Refresh logs"
-          onClick={() => getLog().then(e => setLogContent(e))}
+          onClick={() => readLog(null).then(showPage)}
         />
       </>}
       fullPage={fullPage}
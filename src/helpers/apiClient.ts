@@ -1,5 +1,5 @@
 import { AppLifetimeNotification } from "@decky/ui/dist/globals/steam-client/GameSessions";
-import { sync_cloud_first, sync_local_first } from "./backend";
+import { sync_cloud_first, sync_local_first, start_change_journal, set_game_running } from "./backend";
 import { GLOBAL_SYNC_APP_ID } from "./commonDefs";
 import { getCurrentUserId } from "./utils";
 import Logger from "./logger";
@@ -16,7 +16,12 @@ export function setupScreenshotNotification(): Unregisterable {
 
 export function setupAppLifetimeNotifications(): Unregisterable {
   return SteamClient.GameSessions.RegisterForAppLifetimeNotifications(async (e: AppLifetimeNotification) => {
+    // Throttles the background syncs while the game runs
+    await set_game_running(e.unAppID, e.bRunning);
     if (e.bRunning) {
+      if (Config.get("sync_on_game_stop") && Config.get("change_journal")) {
+        await start_change_journal(e.unAppID);
+      }
       if (Config.get("sync_on_game_start")) {
         Logger.info(`Syncing on game ${e.unAppID} start`);
         await SyncTaskQeueue.addSyncTask(sync_cloud_first, e.unAppID, e.bRunning, e.nInstanceID);
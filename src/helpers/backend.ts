@@ -4,8 +4,10 @@ import { callable } from "@decky/api"
 export const spawn = callable<[backend_type: string], string>("spawn");
 export const spawn_probe = callable<[], number | null>("spawn_probe");
 export const get_cloud_type = callable<[], string>("get_cloud_type");
-export const update_rclone = callable<[], void>("update_rclone");
+export const update_rclone = callable<[], { updated: boolean, error: string | null }>("update_rclone");
 export const create_cloud_destination = callable<[], void>("create_cloud_destination");
+export const set_cloud_compression = callable<[enabled: boolean], { exit_code: number, seconds: number, resync_required: boolean }>("set_cloud_compression");
+export const estimate_compression = callable<[app_id: number], { files: number, raw_bytes: number, compressed_bytes: number, ratio: number, seconds: number }>("estimate_compression");
 
 // Sync Paths
 export const get_target_filters = callable<[app_id: number], Array<string>>("get_target_filters");
@@ -13,19 +15,36 @@ export const set_target_filters = callable<[app_id: number, paths: Array<string>
 export const get_shared_filters = callable<[], Array<string>>("get_shared_filters");
 export const set_shared_filters = callable<[paths: Array<string>], void>("set_shared_filters");
 export const get_available_filters = callable<[], Array<number>>("get_available_filters");
+export const get_sync_targets = callable<[], { [appId: number]: { filters: number, size: number | null, last_sync: number | null, exit_code: number | null } }>("get_sync_targets");
+export const preview_target_files = callable<[app_id: number], { files: Array<string>, total_files: number, total_bytes: number, truncated: boolean, unused_rules: Array<string>, huge_rules: Array<string> }>("preview_target_files");
 export const test_syncpath = callable<[path: string], number>("test_syncpath");
+export const scan_syncpath = callable<[path: string], { files: number, bytes: number, truncated: boolean }>("scan_syncpath");
 
 // Syncing
-export const sync_local_first = callable<[app_id: number], number>("sync_local_first");
+export const sync_local_first = callable<[app_id: number, pid?: number], number>("sync_local_first");
 export const sync_cloud_first = callable<[app_id: number], number>("sync_cloud_first");
+export const sync_many_local_first = callable<[app_ids: Array<number>], Record<number, number>>("sync_many_local_first");
+export const sync_many_cloud_first = callable<[app_ids: Array<number>], Record<number, number>>("sync_many_cloud_first");
 export const resync_local_first = callable<[], number>("resync_local_first");
 export const resync_cloud_first = callable<[], number>("resync_cloud_first");
 export const sync_screenshot = callable<[user_id: number, screenshot_url: string], number>("sync_screenshot");
+export const get_sync_progress = callable<[app_id: number], object | null>("get_sync_progress");
+export const cancel_sync = callable<[app_id: number], number>("cancel_sync");
+export const get_sync_queue_stats = callable<[], object>("get_sync_queue_stats");
+export const get_loop_stats = callable<[], object>("get_loop_stats");
+export const get_bisync_stats = callable<[], object>("get_bisync_stats");
+export const get_prefetch_stats = callable<[], object>("get_prefetch_stats");
+export const get_bandwidth_policy = callable<[], object>("get_bandwidth_policy");
+export const get_sync_history_stats = callable<[days?: number, group_by?: "target" | "mode" | "execution" | "rclone_version" | "profile"], SyncDurationStats[]>("get_sync_history_stats");
+export const get_sync_daily_bytes = callable<[days?: number], SyncDailyBytes[]>("get_sync_daily_bytes");
+export const start_change_journal = callable<[app_id: number], void>("start_change_journal");
+export const prefetch_saves = callable<[app_id: number], number>("prefetch_saves");
 export const delete_lock_files = callable<[], void>("delete_lock_files");
 
 // Processes
 export const pause_process = callable<[pid: number], void>("pause_process");
 export const resume_process = callable<[pid: number], void>("resume_process");
+export const set_game_running = callable<[app_id: number, running: boolean], void>("set_game_running");
 
 // Configuration
 export const get_config = callable<[], object>("get_config");
@@ -38,3 +57,7 @@ export const log_warning = callable<[msg: string], void>("log_warning");
 export const log_error = callable<[msg: string], void>("log_error");
 export const get_last_sync_log = callable<[app_id: number], string>("get_last_sync_log");
 export const get_plugin_log = callable<[], string>("get_plugin_log");
+export const read_sync_log = callable<[app_id: number, offset: number | null, length?: number], LogPage | null>("read_sync_log");
+export const read_plugin_log = callable<[offset: number | null, length?: number], LogPage>("read_plugin_log");
+export const follow_log = callable<[app_id: number | null, offset: number], void>("follow_log");
+export const unfollow_log = callable<[app_id: number | null], void>("unfollow_log");
@@ -0,0 +1,52 @@
+import { ReactElement } from "react";
+import { routerHook } from "@decky/api";
+import { afterPatch, findInReactTree } from "@decky/ui";
+import { prefetch_saves } from "./backend";
+import Config from "./config";
+import Logger from "./logger";
+import SyncFilters from "./syncFilters";
+import Registeration from "../types/registeration";
+
+const LIBRARY_APP_ROUTE = "/library/app/:appid";
+// Opening the same page again shortly after doesn't need another look at the cloud
+const PREFETCH_INTERVAL_MS = 60 * 1000;
+
+const lastPrefetch = new Map<number, number>();
+
+function prefetch(appId: number) {
+  if (!Config.get("save_prefetch") || !SyncFilters.has(appId)) {
+    return;
+  }
+  const now = Date.now();
+  if (now - (lastPrefetch.get(appId) ?? 0) < PREFETCH_INTERVAL_MS) {
+    return;
+  }
+  lastPrefetch.set(appId, now);
+  Logger.debug(`Prefetching saves of ${appId}`);
+  prefetch_saves(appId).catch((error) => Logger.error(`Failed to prefetch saves of ${appId}:`, error));
+}
+
+/**
+ * Prefetches the cloud saves of a game when its library page is opened, as it's likely to be launched.
+ */
+class LibraryPagePatch extends Registeration {
+  protected _register(): UnregisterFunction {
+    const patch = routerHook.addPatch(LIBRARY_APP_ROUTE, (tree: any) => {
+      const routeProps = findInReactTree(tree, (x: any) => x?.renderFunc);
+      if (routeProps) {
+        afterPatch(routeProps, "renderFunc", (_: Record<string, unknown>[], ret?: ReactElement) => {
+          const appId: number | undefined = findInReactTree(ret, (x: any) => x?.props?.overview?.appid)?.props.overview.appid;
+          if (appId) {
+            prefetch(appId);
+          }
+          return ret;
+        });
+      }
+      return tree;
+    });
+    return () => routerHook.removePatch(LIBRARY_APP_ROUTE, patch);
+  }
+}
+
+const libraryPagePatch = new LibraryPagePatch();
+export default libraryPagePatch;
@@ -22,6 +22,10 @@ class SyncFilters extends Observable {
     return this.appIdSet.has(appId);
   }
 
+  public get appIds(): Array<number> {
+    return [...this.appIdSet];
+  }
+
   public async get(appId: number): Promise<Array<string>> {
     if (appId == SHARED_FILTER_APP_ID) {
       return await get_shared_filters();
@@ -1,6 +1,6 @@
 import fastq from "fastq";
 import type { queueAsPromised } from "fastq";
-import { sync_screenshot, pause_process, resume_process } from "./backend";
+import { sync_screenshot, sync_local_first, pause_process, resume_process } from "./backend";
 import * as Toaster from "./toaster";
 import * as SyncStateTracker from "./syncStateTracker";
 import Observable from "../types/observable";
@@ -39,15 +39,18 @@ class SyncTaskQueue extends Observable {
     return (!this.queue.idle());
   }
 
-  public async addSyncTask(syncFunction: (appId: number) => Promise<number>, appId: number, gameRunning?: boolean, pId?: number) {
+  public async addSyncTask(syncFunction: (appId: number, pId?: number) => Promise<number>, appId: number, gameRunning?: boolean, pId?: number) {
     if (!SyncFilters.has(appId)) { return; }
 
-    if (pId) {
-      await pause_process(pId);
+    // The backend only pauses the game while it takes a snapshot of the files to upload
+    const backendPause = Boolean(pId) && (syncFunction === sync_local_first) && Config.get("snapshot_upload");
+    const pausedPId = backendPause ? undefined : pId;
+    if (pausedPId) {
+      await pause_process(pausedPId);
     }
 
     if ((!gameRunning) || SyncStateTracker.getInSync(appId)) {
-      this.pushTask(async () => syncFunction(appId))
+      this.pushTask(async () => backendPause ? syncFunction(appId, pId) : syncFunction(appId))
         .then((exitCode) => {
           if (exitCode == 0 || exitCode == 6) {
             Logger.info(`Sync for "${appId}" finished`);
@@ -62,8 +65,8 @@ class SyncTaskQueue extends Observable {
           }
         })
         .finally(() => {
-          if (pId) {
-            resume_process(pId);
+          if (pausedPId) {
+            resume_process(pausedPId);
           }
           if (gameRunning != undefined) {
             // in sync only when game is not running
@@ -71,16 +74,35 @@ class SyncTaskQueue extends Observable {
           }
         });
     } else {
-      if (pId) {
-        resume_process(pId);
+      if (pausedPId) {
+        resume_process(pausedPId);
       }
       Logger.warning(`Skipping download sync for ${appId} due to missing upload sync`);
       Toaster.toast("Skipping download sync");
     }
   }
 
+  public async addBatchSyncTask(syncManyFunction: (appIds: Array<number>) => Promise<Record<number, number>>, appIds: Array<number>) {
+    let failedAppIds: Array<string> = [];
+    this.pushTask(async () => {
+      const results = await syncManyFunction(appIds);
+      failedAppIds = Object.keys(results).filter(appId => results[appId] != 0 && results[appId] != 6);
+      return failedAppIds.length;
+    })
+      .then((failedCount) => {
+        if (failedCount == 0) {
+          Logger.info(`Sync for ${appIds.length} targets finished`);
+          Toaster.toast("Sync finished");
+        } else {
+          Logger.error(`Sync failed for ${failedAppIds.join(", ")}`);
+          Toaster.toast(`Sync failed for ${failedCount} target(s)`);
+        }
+      });
+  }
+
   public async addScreenshotSyncTask(userId: number, screenshotUrl: string, gameId: string, handle: number) {
-    this.pushTask(async () => await sync_screenshot(userId, screenshotUrl))
+    // Not queued, the backend batches the screenshots arriving close to each other
+    sync_screenshot(userId, screenshotUrl)
       .then((exitCode) => {
         if (exitCode == 0) {
           if (Config.get("capture_delete_after_upload")) {
@@ -20,8 +20,24 @@ export function reduceSlashes(input: string): string {
   return input.replace(/\/+/g, '/');
 }
 
+export function formatBytes(bytes: number): string {
+  const units = ["B", "KiB", "MiB", "GiB", "TiB"];
+  let i = 0;
+  while (bytes >= 1024 && i < units.length - 1) {
+    bytes /= 1024;
+    i++;
+  }
+  return `${i == 0 ? bytes : bytes.toFixed(1)} ${units[i]}`;
+}
+
 export function updateRclone(toast: boolean = false) {
   update_rclone()
-    .then(() => toast && Toaster.toast("Rclone is now the latest"))
+    .then((result) => {
+      if (result.error) {
+        Toaster.toast(`Error updating rclone: ${result.error}`);
+      } else if (toast) {
+        Toaster.toast("Rclone is now the latest");
+      }
+    })
     .catch(() => Toaster.toast("Error updating rclone"));
 }
@@ -5,9 +5,11 @@ import { updateRclone } from "./helpers/utils";
 import * as ApiClient from "./helpers/apiClient";
 import * as Clipboard from "./helpers/clipboard";
 import PluginLogsPage from "./pages/pluginLogsPage";
+import SyncStatsPage from "./pages/syncStatsPage";
 import ConfigCloudPage from "./pages/configCloudPage";
 import SyncTargetConfigPage from "./pages/syncTargetConfigPage";
 import ContextMenuPatch from "./helpers/contextMenuPatch";
+import LibraryPagePatch from "./helpers/libraryPagePatch";
 import QuickAccessMenu from "./pages/quickAccessMenu";
 
 export default definePlugin(() => {
@@ -17,10 +19,12 @@ export default definePlugin(() => {
   registrations.push(ApiClient.setupScreenshotNotification());
 
   registrations.push(PluginLogsPage.register());
+  registrations.push(SyncStatsPage.register());
   registrations.push(ConfigCloudPage.register());
   registrations.push(SyncTargetConfigPage.register());
 
   registrations.push(ContextMenuPatch.register());
+  registrations.push(LibraryPagePatch.register());
 
   updateRclone();
 
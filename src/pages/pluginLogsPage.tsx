@@ -1,13 +1,13 @@
 import { ReactNode } from "react";
 import RoutePage from "../components/routePage";
 import LogsView from "../components/logsView";
-import { get_plugin_log } from "../helpers/backend";
+import { read_plugin_log } from "../helpers/backend";
 
 class PluginLogsPage extends RoutePage {
   readonly route = "plugin-logs";
 
   render(): ReactNode {
-    return <LogsView title="Plugin Logs" fullPage={true} getLog={get_plugin_log} />;
+    return <LogsView title="Plugin Logs" fullPage={true} appId={null} readLog={read_plugin_log} />;
   }
 }
 
@@ -1,15 +1,17 @@
 import { useEffect, useState } from "react";
-import { FaArrowCircleUp, FaFileAlt, FaFileUpload, FaSave } from "react-icons/fa";
+import { FaArrowCircleUp, FaChartBar, FaFileAlt, FaFileUpload, FaSave } from "react-icons/fa";
 import { MdStorage } from "react-icons/md";
 import { BsFillGearFill } from "react-icons/bs";
 import { FaCloudArrowUp, FaCloudArrowDown } from "react-icons/fa6";
 import { PanelSection, PanelSectionRow, sleep, ToggleField } from "@decky/ui";
 import { GLOBAL_SYNC_APP_ID } from "../helpers/commonDefs";
 import { updateRclone } from "../helpers/utils";
-import { get_cloud_type, sync_cloud_first, create_cloud_destination } from "../helpers/backend";
+import { get_cloud_type, sync_cloud_first, sync_many_cloud_first, create_cloud_destination, set_cloud_compression } from "../helpers/backend";
 import * as Popups from "../components/popups";
+import * as Toaster from "../helpers/toaster";
 import SyncTargetConfigPage from "./syncTargetConfigPage";
 import PluginLogsPage from "./pluginLogsPage";
+import SyncStatsPage from "./syncStatsPage";
 import ButtonWithIcon from "../components/buttonWithIcon";
 import ConfigCloudPage from "./configCloudPage";
 import SyncTaskQueue from "../helpers/syncTaskQueue";
@@ -22,6 +24,8 @@ export default function quickAccessMenu() {
   const [globalFilterAvailable, setGlobalFilterAvailable] = useState<boolean>(SyncFilters.has(GLOBAL_SYNC_APP_ID));
   const [syncInProgress, setSyncInProgress] = useState<boolean>(SyncTaskQueue.busy);
   const [hasProvider, setHasProvider] = useState<boolean>(true);
+  const [cloudCompression, setCloudCompression] = useState<boolean>(Config.get("cloud_compression"));
+  const [migrating, setMigrating] = useState<boolean>(false);
 
   useEffect(() => {
     get_cloud_type().then((e) => setHasProvider(Boolean(e)));
@@ -66,6 +70,18 @@ export default function quickAccessMenu() {
           </ButtonWithIcon>
           {(!globalFilterAvailable) && <small>Please setup the global sync filter via "Global Sync Filters" button first.</small>}
         </PanelSectionRow>
+        <PanelSectionRow>
+          <ButtonWithIcon
+            icon={<FaCloudArrowDown />}
+            disabled={syncInProgress}
+            onClick={() => {
+              SyncTaskQueue.addBatchSyncTask(sync_many_cloud_first,
+                SyncFilters.appIds.filter(appId => appId > GLOBAL_SYNC_APP_ID));
+            }}
+          >
+            Download All Games
+          </ButtonWithIcon>
+        </PanelSectionRow>
         <PanelSectionRow>
           <ToggleField
             label="Sync on game start"
@@ -136,6 +152,14 @@ export default function quickAccessMenu() {
             Plugin Logs
           </ButtonWithIcon>
         </PanelSectionRow>
+        <PanelSectionRow>
+          <ButtonWithIcon
+            icon={<FaChartBar />}
+            onClick={() => SyncStatsPage.enter({})}
+          >
+            Sync Statistics
+          </ButtonWithIcon>
+        </PanelSectionRow>
       </>)}
       <PanelSectionRow>
         <ButtonWithIcon
@@ -187,6 +211,76 @@ export default function quickAccessMenu() {
               }}
             />
           </PanelSectionRow>
+          <PanelSectionRow>
+            <ToggleField
+              label="Incremental Game Upload"
+              description="Watch the game files while it's running and only upload the changed ones on game stop"
+              checked={Config.get("change_journal")}
+              onChange={(e) => Config.set("change_journal", e)}
+            />
+          </PanelSectionRow>
+          <PanelSectionRow>
+            <ToggleField
+              label="Freeze Game via cgroup"
+              description="Pause the game during sync with the cgroup v2 freezer instead of SIGSTOP, processes it spawns meanwhile are paused as well"
+              checked={Config.get("cgroup_freezer")}
+              onChange={(e) => Config.set("cgroup_freezer", e)}
+            />
+          </PanelSectionRow>
+          <PanelSectionRow>
+            <ToggleField
+              label="Deduplicated Game Snapshots"
+              description="Upload game files as chunks shared by every game and keep every snapshot, only the changed parts of a file are transferred"
+              checked={Config.get("snapshot_store")}
+              onChange={(e) => Config.set("snapshot_store", e)}
+            />
+          </PanelSectionRow>
+          <PanelSectionRow>
+            <ToggleField
+              label="Prefetch Game Saves"
+              description="Download newer cloud saves in the background when a game page is opened or the Deck is idle, so that game start only has to move them into place"
+              checked={Config.get("save_prefetch")}
+              onChange={(e) => Config.set("save_prefetch", e)}
+            />
+          </PanelSectionRow>
+          <PanelSectionRow>
+            <ToggleField
+              label="Snapshot Before Upload"
+              description="Copy the game files to upload to a staging area first and upload the copy, so that the game is only paused while copying"
+              checked={Config.get("snapshot_upload")}
+              onChange={(e) => Config.set("snapshot_upload", e)}
+            />
+          </PanelSectionRow>
+          <PanelSectionRow>
+            <ToggleField
+              label="Compress Cloud Data"
+              description="Store the game and global sync data gzip compressed in the cloud, captures are kept as is"
+              checked={cloudCompression}
+              disabled={syncInProgress || migrating}
+              onChange={(e) => Popups.confirmPopup(`${e ? "Enable" : "Disable"} Cloud Compression`,
+                <span>
+                  The data already in the cloud will be moved to {e ? "compressed" : "uncompressed"} storage, this may take some time. The global sync needs a resync afterwards.<br /><br />
+                  Click "Confirm" to continue.
+                </span>,
+                () => {
+                  setMigrating(true);
+                  set_cloud_compression(e)
+                    .then(result => {
+                      if (result.exit_code != 0) {
+                        Toaster.toast("Error moving cloud data, check the plugin logs");
+                        return;
+                      }
+                      Config.set("cloud_compression", e);
+                      setCloudCompression(e);
+                      if (result.resync_required) {
+                        Toaster.toast("Cloud data moved, please resync the global sync");
+                      }
+                    })
+                    .catch(() => Toaster.toast("Error changing cloud compression"))
+                    .finally(() => setMigrating(false));
+                })}
+            />
+          </PanelSectionRow>
           <PanelSectionRow>
             <ButtonWithIcon
               icon={<FaCloudArrowUp />}
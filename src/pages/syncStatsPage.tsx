@@ -0,0 +1,107 @@
+import { ReactNode, useEffect, useState } from "react";
+import { IoMdRefresh } from "react-icons/io";
+import { Field } from "@decky/ui";
+import { GLOBAL_SYNC_APP_ID } from "../helpers/commonDefs";
+import { formatBytes, getAppName } from "../helpers/utils";
+import { get_sync_history_stats, get_sync_daily_bytes } from "../helpers/backend";
+import * as Toaster from "../helpers/toaster";
+import RoutePage from "../components/routePage";
+import PageView from "../components/pageView";
+import IconButton from "../components/iconButton";
+
+const STATS_DAYS = 30;
+
+function getTargetName(target: string | null): string {
+  if (target == "global") {
+    return getAppName(GLOBAL_SYNC_APP_ID);
+  } else if (target && /^\d+$/.test(target)) {
+    return getAppName(Number(target));
+  }
+  return String(target);
+}
+
+function formatSeconds(seconds: number | null): string {
+  return seconds == null ? "-" : `${seconds.toFixed(1)}s`;
+}
+
+class SyncStatsPage extends RoutePage {
+  readonly route = "sync-stats";
+
+  render(): ReactNode {
+    const [targetStats, setTargetStats] = useState<SyncDurationStats[]>([]);
+    const [versionStats, setVersionStats] = useState<SyncDurationStats[]>([]);
+    const [profileStats, setProfileStats] = useState<SyncDurationStats[]>([]);
+    const [executionStats, setExecutionStats] = useState<SyncDurationStats[]>([]);
+    const [dailyBytes, setDailyBytes] = useState<SyncDailyBytes[]>([]);
+
+    const refresh = () => {
+      Promise.all([
+        get_sync_history_stats(STATS_DAYS, "target"),
+        get_sync_history_stats(STATS_DAYS, "rclone_version"),
+        get_sync_history_stats(STATS_DAYS, "profile"),
+        get_sync_history_stats(STATS_DAYS, "execution"),
+        get_sync_daily_bytes(STATS_DAYS),
+      ]).then(([targets, versions, profiles, executions, days]) => {
+        setTargetStats(targets);
+        setVersionStats(versions);
+        setProfileStats(profiles);
+        setExecutionStats(executions);
+        setDailyBytes(days);
+      }).catch(() => Toaster.toast("Error loading sync statistics"));
+    }
+
+    useEffect(refresh, []);
+
+    return (
+      <PageView
+        title="Sync Statistics"
+        description={`Syncs of the last ${STATS_DAYS} days, slowest first.`}
+        titleItem={
+          <IconButton
+            icon={IoMdRefresh}
+            onOKActionDescription="Refresh"
+            onClick={refresh}
+          />
+        }
+        fullPage={true}
+      >
+        {(targetStats.length == 0) && <Field label="No syncs recorded yet." />}
+        {targetStats.map(stats => (
+          <Field
+            key={stats.group}
+            label={getTargetName(stats.group)}
+            description={<small>
+              {stats.runs} runs, {stats.failures} failed, {stats.files} files, {formatBytes(stats.bytes)}<br />
+              spawn {formatSeconds(stats.spawn_seconds)}, list {formatSeconds(stats.list_seconds)}, transfer {formatSeconds(stats.transfer_seconds)} on average
+            </small>}
+          >
+            p50 {formatSeconds(stats.p50_seconds)} / p95 {formatSeconds(stats.p95_seconds)}
+          </Field>
+        ))}
+        {(versionStats.length > 1) && versionStats.map(stats => (
+          <Field key={stats.group} label={`rclone ${stats.group}`}>
+            p50 {formatSeconds(stats.p50_seconds)} / p95 {formatSeconds(stats.p95_seconds)} ({stats.runs} runs)
+          </Field>
+        ))}
+        {(profileStats.length > 1) && profileStats.map(stats => (
+          <Field key={stats.group} label={`Profile ${stats.group ?? "none"}`}>
+            p50 {formatSeconds(stats.p50_seconds)} / p95 {formatSeconds(stats.p95_seconds)} ({stats.runs} runs)
+          </Field>
+        ))}
+        {(executionStats.length > 1) && executionStats.map(stats => (
+          <Field key={stats.group} label={`Executed by ${stats.group}`}>
+            p50 {formatSeconds(stats.p50_seconds)} / p95 {formatSeconds(stats.p95_seconds)} ({stats.runs} runs)
+          </Field>
+        ))}
+        {dailyBytes.slice().reverse().map(day => (
+          <Field key={day.day} label={day.day}>
+            {formatBytes(day.bytes)} in {day.files} files ({day.runs} runs)
+          </Field>
+        ))}
+      </PageView>
+    );
+  }
+}
+
+const syncStatsPage = new SyncStatsPage();
+export default syncStatsPage;
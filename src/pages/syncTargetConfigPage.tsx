@@ -1,10 +1,11 @@
 import { ReactNode, useEffect, useState } from "react";
 import { IoArrowUpCircle, IoArrowDownCircle } from "react-icons/io5";
 import { FaCloudArrowUp, FaCloudArrowDown } from "react-icons/fa6";
+import { FaCompressArrowsAlt, FaEye } from "react-icons/fa";
 import { Navigation, SidebarNavigation, useParams } from "@decky/ui";
 import { GLOBAL_SYNC_APP_ID } from "../helpers/commonDefs";
-import { getAppName } from "../helpers/utils";
-import { get_last_sync_log, sync_local_first, sync_cloud_first, resync_local_first, resync_cloud_first } from "../helpers/backend";
+import { formatBytes, getAppName } from "../helpers/utils";
+import { read_sync_log, preview_target_files, estimate_compression, sync_local_first, sync_cloud_first, resync_local_first, resync_cloud_first } from "../helpers/backend";
 import { confirmPopup } from "../components/popups";
 import * as Toaster from "../helpers/toaster";
 import RoutePage from "../components/routePage";
@@ -79,7 +80,8 @@ class SyncTargetConfigPage extends RoutePage<SyncTargetConfigPageParams> {
           content:
             <LogsView
               title="Sync Logs"
-              getLog={async () => await get_last_sync_log(appId)}
+              appId={appId}
+              readLog={(offset, length) => read_sync_log(appId, offset, length)}
               fullPage={false}
             >
               {(appId == GLOBAL_SYNC_APP_ID) && (
@@ -125,6 +127,32 @@ class SyncTargetConfigPage extends RoutePage<SyncTargetConfigPageParams> {
               getFiltersFunction={() => SyncFilters.get(appId)}
               setFiltersFunction={(filters) => SyncFilters.set(appId, filters)}
             >
+              <IconButton
+                icon={FaEye}
+                onOKActionDescription="Preview Matched Files"
+                onClick={() => preview_target_files(appId).then(e => confirmPopup(
+                  "Matched Files",
+                  <span>
+                    The saved filters match <b>{e.truncated ? "at least " : ""}{e.total_files}</b> file(s) ({formatBytes(e.total_bytes)}).<br />
+                    {(e.unused_rules.length > 0) && <>Rules matching nothing: <i>{e.unused_rules.join(", ")}</i><br /></>}
+                    {(e.huge_rules.length > 0) && <>Rules matching huge trees: <i>{e.huge_rules.join(", ")}</i><br /></>}
+                    <br />
+                    {e.files.slice(0, 20).map(file => <>{file}<br /></>)}
+                    {(e.files.length > 20) && "..."}
+                  </span>
+                )).catch(() => Toaster.toast("Error previewing files"))}>
+              </IconButton>
+              <IconButton
+                icon={FaCompressArrowsAlt}
+                onOKActionDescription="Estimate Compression"
+                onClick={() => estimate_compression(appId).then(e => confirmPopup(
+                  "Compression Estimate",
+                  <span>
+                    {e.files} file(s) ({formatBytes(e.raw_bytes)}) compress to <b>{formatBytes(e.compressed_bytes)}</b> ({Math.round(e.ratio * 100)}%) in {e.seconds.toFixed(1)}s.<br /><br />
+                    Enable "Compress Cloud Data" in Advanced Mode to upload them compressed.
+                  </span>
+                )).catch(() => Toaster.toast("Error estimating compression"))}>
+              </IconButton>
               <IconButton
                 icon={FaCloudArrowUp}
                 onOKActionDescription={`Sync Now (${(appId == GLOBAL_SYNC_APP_ID) ? "Local First" : "Upload to Cloud"})`}
@@ -33,6 +33,35 @@ declare global {
     unAppID: number;
   }
 
+  interface LogPage {
+    content: string;
+    offset: number;
+    next_offset: number;
+    size: number;
+    reset?: boolean;
+  }
+
+  interface SyncDurationStats {
+    group: string | null;
+    runs: number;
+    failures: number;
+    p50_seconds: number;
+    p95_seconds: number;
+    max_seconds: number;
+    spawn_seconds: number | null;
+    list_seconds: number | null;
+    transfer_seconds: number | null;
+    files: number;
+    bytes: number;
+  }
+
+  interface SyncDailyBytes {
+    day: string;
+    runs: number;
+    files: number;
+    bytes: number;
+  }
+
   type UnregisterFunction = () => void;
 
   interface Unregisterable {
@@ -0,0 +1,48 @@
+"""
+Benchmarks of the rclone flags picked from the files of a target against the static ones.
+"""
+
+import shutil
+
+import pytest
+
+import harness
+from rclone_manager import RcloneManager
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.rclone]
+
+
+def daemon_pids() -> list[int]:
+    return [RcloneManager.daemon.pid] if RcloneManager.daemon_available() else []
+
+
+@pytest.mark.parametrize("adaptive", [False, True], ids=["static", "adaptive"])
+@pytest.mark.parametrize("tree", list(harness.SAVE_TREES))
+def test_game_sync(run, plugin, game, config, benchmark_report, tree, adaptive):
+    app_id, save_dir = game["app_id"], game["save_dir"]
+    config("adaptive_sync_args", adaptive)
+    harness.SAVE_TREES[tree](save_dir)
+    run(plugin.set_target_filters(app_id, game["filters"]))
+    name = "adaptive" if adaptive else "static"
+
+    # The first upload records the file profile the next ones are picked from
+    assert run(plugin.sync_local_first(app_id)) == 0
+    shutil.rmtree(save_dir)
+    save_dir.mkdir()
+    harness.SAVE_TREES[tree](save_dir)
+    for path in save_dir.rglob("*"):
+        if path.is_file():
+            path.write_bytes(path.read_bytes()[::-1])
+    expected = harness.list_tree(save_dir)
+
+    result, upload = run(harness.measure(plugin.sync_local_first(app_id), daemon_pids()))
+    assert result == 0
+    assert harness.list_tree(game["cloud_dir"]) == expected
+    benchmark_report.record(f"{name}_game_upload[{tree}]", upload)
+
+    shutil.rmtree(save_dir)
+    save_dir.mkdir()
+    result, download = run(harness.measure(plugin.sync_cloud_first(app_id), daemon_pids()))
+    assert result == 0
+    assert harness.list_tree(save_dir) == expected
+    benchmark_report.record(f"{name}_game_download[{tree}]", download)
@@ -0,0 +1,51 @@
+"""
+Benchmarks of the cloud compression: the bytes stored in the cloud and the wall time of the
+game syncs with and without the compress overlay.
+"""
+
+from pathlib import Path
+
+import pytest
+
+import harness
+from rclone_manager import RcloneManager
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.rclone]
+
+
+def daemon_pids() -> list[int]:
+    return [RcloneManager.daemon.pid] if RcloneManager.daemon_available() else []
+
+
+def get_stored_bytes(root: Path) -> int:
+    return sum(path.stat().st_size for path in root.rglob("*") if path.is_file())
+
+
+@pytest.mark.parametrize("compressed", [False, True], ids=["plain", "compressed"])
+@pytest.mark.parametrize("tree", list(harness.SAVE_TREES))
+def test_game_sync(run, plugin, game, benchmark_report, tree, compressed):
+    app_id, save_dir = game["app_id"], game["save_dir"]
+    raw_bytes = harness.SAVE_TREES[tree](save_dir)
+    expected = harness.list_tree(save_dir)
+    run(plugin.set_target_filters(app_id, game["filters"]))
+    assert run(plugin.set_cloud_compression(compressed))["exit_code"] == 0
+    try:
+        result, upload = run(harness.measure(plugin.sync_local_first(app_id), daemon_pids()))
+        assert result == 0
+        cloud_dir = game["cloud_dir"].parent
+        if compressed:
+            cloud_dir = cloud_dir.with_name(f"{cloud_dir.name}-compressed")
+        upload["bytes"] = get_stored_bytes(cloud_dir)
+        upload["ratio"] = round(upload["bytes"] / raw_bytes, 3)
+        benchmark_report.record(f"{'compressed' if compressed else 'plain'}_game_upload[{tree}]", upload)
+
+        for path in list(save_dir.iterdir()):
+            harness.shutil.rmtree(path) if path.is_dir() else path.unlink()
+        result, download = run(harness.measure(plugin.sync_cloud_first(app_id), daemon_pids()))
+        assert result == 0
+        assert harness.list_tree(save_dir) == expected
+        benchmark_report.record(
+            f"{'compressed' if compressed else 'plain'}_game_download[{tree}]", download
+        )
+    finally:
+        run(plugin.set_cloud_compression(False))
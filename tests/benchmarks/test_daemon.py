@@ -0,0 +1,51 @@
+"""
+Benchmarks of the syncs run as jobs of the rclone rc daemon against a process spawned per sync.
+"""
+
+import pytest
+
+import harness
+from rclone_manager import RcloneManager
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.rclone]
+
+SMALL_UPLOADS = 10
+
+
+@pytest.fixture(params=["daemon", "spawn"])
+def mode(request, plugin, monkeypatch) -> str:
+    if request.param == "spawn":
+        monkeypatch.setattr(RcloneManager, "daemon_available", classmethod(lambda cls: False))
+    elif not RcloneManager.daemon_available():
+        pytest.skip("the rclone rc daemon is not running")
+    return request.param
+
+
+def daemon_pids() -> list[int]:
+    return [RcloneManager.daemon.pid] if RcloneManager.daemon_available() else []
+
+
+def test_game_sync(run, plugin, game, benchmark_report, mode):
+    app_id, save_dir = game["app_id"], game["save_dir"]
+    harness.make_tiny_files(save_dir, count=500)
+    run(plugin.set_target_filters(app_id, game["filters"]))
+
+    result, upload = run(harness.measure(plugin.sync_local_first(app_id), daemon_pids()))
+    assert result == 0
+    benchmark_report.record(f"{mode}_game_upload", upload)
+
+    # Every change of a save runs rclone, where starting it weighs the most
+    saves = sorted(path for path in save_dir.rglob("*.dat"))
+
+    async def small_uploads():
+        for path in saves[:SMALL_UPLOADS]:
+            path.write_bytes(path.read_bytes()[::-1])
+            assert await plugin.sync_local_first(app_id) == 0
+
+    _, uploads = run(harness.measure(small_uploads(), daemon_pids()))
+    benchmark_report.record(f"{mode}_game_small_uploads[{SMALL_UPLOADS}]", uploads)
+    assert harness.list_tree(game["cloud_dir"]) == harness.list_tree(save_dir)
+
+    result, download = run(harness.measure(plugin.sync_cloud_first(app_id), daemon_pids()))
+    assert result == 0
+    benchmark_report.record(f"{mode}_game_download", download)
@@ -0,0 +1,39 @@
+"""
+Benchmarks of the check that skips a game upload when no local file changed.
+"""
+
+import asyncio
+
+import pytest
+
+import harness
+from sync_manifest import SyncManifest
+
+pytestmark = pytest.mark.benchmark
+
+FILES = 10000
+MAX_CHECK_SECONDS = 0.1
+
+
+def test_unchanged_check(run, game, tmp_path, benchmark_report):
+    harness.make_tiny_files(game["save_dir"], count=FILES)
+    manifest = SyncManifest(tmp_path / "manifest")
+    manifest.save(SyncManifest.snapshot([str(game["save_dir"])]), "fingerprint")
+
+    unchanged, check = run(harness.measure(asyncio.to_thread(manifest.is_unchanged, "fingerprint")))
+    assert unchanged
+    benchmark_report.record(f"manifest_unchanged_check[{FILES}]", check)
+    assert check["seconds"] < MAX_CHECK_SECONDS
+
+
+@pytest.mark.rclone
+def test_unchanged_upload(run, plugin, game, benchmark_report):
+    harness.make_tiny_files(game["save_dir"], count=FILES)
+    run(plugin.set_target_filters(game["app_id"], game["filters"]))
+    assert run(plugin.sync_local_first(game["app_id"])) == 0
+
+    result, upload = run(harness.measure(plugin.sync_local_first(game["app_id"])))
+    assert result == 0
+    benchmark_report.record(f"manifest_unchanged_upload[{FILES}]", upload)
+    # No rclone at all, the time is that of the check plus the bookkeeping of the sync
+    assert upload["processes"] == 0
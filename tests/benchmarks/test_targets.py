@@ -0,0 +1,90 @@
+"""
+End to end benchmarks of the sync targets through the methods of the plugin,
+against the local remote of the harness.
+"""
+
+import asyncio, shutil
+
+import pytest
+
+import harness
+from rclone_manager import RcloneManager
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.rclone]
+
+
+def daemon_pids() -> list[int]:
+    return [RcloneManager.daemon.pid] if RcloneManager.daemon_available() else []
+
+
+@pytest.mark.parametrize("tree", list(harness.SAVE_TREES))
+def test_game_sync(run, plugin, game, benchmark_report, tree):
+    app_id, save_dir = game["app_id"], game["save_dir"]
+    harness.SAVE_TREES[tree](save_dir)
+    expected = harness.list_tree(save_dir)
+    run(plugin.set_target_filters(app_id, game["filters"]))
+
+    result, upload = run(harness.measure(plugin.sync_local_first(app_id), daemon_pids()))
+    assert result == 0
+    assert harness.list_tree(game["cloud_dir"]) == expected
+    benchmark_report.record(f"game_upload[{tree}]", upload)
+
+    result, unchanged = run(harness.measure(plugin.sync_local_first(app_id), daemon_pids()))
+    assert result == 0
+    benchmark_report.record(f"game_upload_unchanged[{tree}]", unchanged)
+
+    shutil.rmtree(save_dir)
+    save_dir.mkdir()
+    result, download = run(harness.measure(plugin.sync_cloud_first(app_id), daemon_pids()))
+    assert result == 0
+    assert harness.list_tree(save_dir) == expected
+    benchmark_report.record(f"game_download[{tree}]", download)
+
+
+@pytest.mark.parametrize("tree", list(harness.SAVE_TREES))
+def test_global_sync(run, plugin, game, benchmark_report, tree):
+    save_dir = game["save_dir"]
+    harness.SAVE_TREES[tree](save_dir)
+    run(plugin.create_cloud_destination())
+    run(plugin.set_target_filters(0, game["filters"]))
+    try:
+        result, resync = run(harness.measure(plugin.resync_local_first(), daemon_pids()))
+        assert result == 0
+        benchmark_report.record(f"global_resync[{tree}]", resync)
+
+        result, unchanged = run(harness.measure(plugin.sync_local_first(0), daemon_pids()))
+        assert result == 0
+        benchmark_report.record(f"global_bisync_unchanged[{tree}]", unchanged)
+
+        changed = next(path for path in save_dir.rglob("*") if path.is_file())
+        changed.write_bytes(changed.read_bytes() + b"changed")
+        result, bisync = run(harness.measure(plugin.sync_local_first(0), daemon_pids()))
+        assert result == 0
+        assert (game["cloud_dir"] / changed.relative_to(save_dir)).read_bytes().endswith(b"changed")
+        benchmark_report.record(f"global_bisync[{tree}]", bisync)
+    finally:
+        run(plugin.set_target_filters(0, []))
+
+
+@pytest.mark.parametrize("captures", [1, 20])
+def test_capture_upload(run, plugin, config, monkeypatch, benchmark_report, captures):
+    import capture_uploader
+
+    monkeypatch.setattr(capture_uploader, "CAPTURE_DEBOUNCE_SECONDS", 0)
+    config("capture_upload_destination", f"captures-{captures}")
+    user_id, game_id = 12345, 7
+    capture_dir = harness.HOME / f".steam/steam/userdata/{user_id}/760/remote/{game_id}/screenshots"
+    capture_dir.mkdir(parents=True, exist_ok=True)
+    urls = list()
+    for i in range(captures):
+        name = f"20260101000000_{captures}_{i}.jpg"
+        (capture_dir / name).write_bytes(b"\xff\xd8" + bytes(200 * 1024))
+        urls.append(f"https://steamloopback.host/screenshots/{game_id}/screenshots/{name}")
+
+    async def upload_all():
+        return await asyncio.gather(*(plugin.sync_screenshot(user_id, url) for url in urls))
+
+    results, upload = run(harness.measure(upload_all(), daemon_pids()))
+    assert results == [0] * captures
+    assert len(list((harness.CLOUD_DIR / f"captures-{captures}").iterdir())) == captures
+    benchmark_report.record(f"capture_upload[{captures}]", upload)
@@ -0,0 +1,167 @@
+import harness
+
+harness.install()
+
+from pathlib import Path
+from typing import Any, Awaitable
+import asyncio, itertools, json
+
+import pytest
+
+_app_ids = itertools.count(1000)
+
+
+def pytest_addoption(parser: pytest.Parser):
+    group = parser.getgroup("benchmark")
+    group.addoption(
+        "--benchmark", action="store_true", help="Run the benchmarks under tests/benchmarks."
+    )
+    group.addoption(
+        "--benchmark-json", metavar="PATH", help="Write the benchmark results to a JSON file."
+    )
+    group.addoption(
+        "--benchmark-baseline",
+        metavar="PATH",
+        help="Fail the benchmarks that regressed against the results of an earlier --benchmark-json.",
+    )
+    group.addoption(
+        "--benchmark-tolerance",
+        type=float,
+        default=1.5,
+        help="How many times slower than the baseline a benchmark may get (default 1.5).",
+    )
+
+
+def pytest_configure(config: pytest.Config):
+    config.addinivalue_line("markers", "benchmark: a benchmark, only run with --benchmark")
+    config.addinivalue_line("markers", "rclone: needs an rclone binary")
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]):
+    skip_benchmark = pytest.mark.skip(reason="benchmarks only run with --benchmark")
+    skip_rclone = pytest.mark.skip(reason="no rclone binary, set RCLONE_BIN or add it to the PATH")
+    for item in items:
+        if ("benchmark" in item.keywords) and not config.getoption("--benchmark"):
+            item.add_marker(skip_benchmark)
+        if ("rclone" in item.keywords) and not harness.REAL_RCLONE:
+            item.add_marker(skip_rclone)
+
+
+def pytest_sessionfinish():
+    harness.cleanup()
+
+
+@pytest.fixture(scope="session")
+def loop() -> asyncio.AbstractEventLoop:
+    """
+    The loop every test runs on, the plugin keeps loop-bound state in class attributes.
+    """
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.run_until_complete(loop.shutdown_asyncgens())
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def run(loop: asyncio.AbstractEventLoop):
+    """
+    Runs a coroutine on the loop of the tests.
+    """
+
+    def run(awaitable: Awaitable) -> Any:
+        return loop.run_until_complete(awaitable)
+
+    return run
+
+
+@pytest.fixture(scope="session")
+def plugin(run):
+    """
+    The plugin, started like the loader does.
+    """
+    from main import Plugin
+
+    plugin = Plugin()
+    run(plugin._migration())
+    run(plugin._main())
+    yield plugin
+    run(plugin._unload())
+
+
+@pytest.fixture
+def config(run):
+    """
+    Sets configuration items for a test, restoring them afterwards.
+    """
+    from config import Config
+
+    previous = dict()
+
+    def set_config(key: str, value: Any):
+        previous.setdefault(key, Config.get_config_item(key))
+        Config.set_config(key, value)
+
+    yield set_config
+    for key, value in previous.items():
+        Config.set_config(key, value)
+    run(Config.flush())
+
+
+@pytest.fixture
+def game(config) -> dict[str, Any]:
+    """
+    A game target of its own: an app ID, a save directory under the sync root and a
+    cloud destination no other test uses.
+    """
+    app_id = next(_app_ids)
+    config("sync_root", [str(harness.SAVES_DIR)])
+    config("sync_destination", f"dest-{app_id}")
+    save_dir = harness.SAVES_DIR / str(app_id)
+    save_dir.mkdir(parents=True)
+    return {
+        "app_id": app_id,
+        "save_dir": save_dir,
+        "filters": [f"+ /{app_id}/**"],
+        "cloud_dir": harness.CLOUD_DIR / f"dest-{app_id}" / str(app_id),
+    }
+
+
+class BenchmarkReport:
+    """
+    Collects the results of the benchmarks and compares them with a baseline.
+    """
+
+    def __init__(self, baseline: dict[str, Any], tolerance: float):
+        self.results: dict[str, dict[str, Any]] = dict()
+        self._baseline = baseline
+        self._tolerance = tolerance
+
+    def record(self, name: str, result: dict[str, Any]):
+        """
+        Records the measurement of a benchmark, failing it if it regressed.
+
+        Parameters:
+        name (str): Name of the benchmark.
+        result (dict[str, Any]): The measurement, see harness.measure.
+        """
+        self.results[name] = result
+        print(f"\n{name}: {json.dumps(result)}")
+        if not (baseline := self._baseline.get(name)):
+            return
+        assert result["processes"] <= baseline["processes"], (
+            f"{name} spawned {result['processes']} rclone processes, {baseline['processes']} before"
+        )
+        assert result["seconds"] <= baseline["seconds"] * self._tolerance, (
+            f"{name} took {result['seconds']}s, {baseline['seconds']}s before"
+        )
+
+
+@pytest.fixture(scope="session")
+def benchmark_report(request: pytest.FixtureRequest) -> BenchmarkReport:
+    baseline = dict()
+    if baseline_path := request.config.getoption("--benchmark-baseline"):
+        baseline = json.loads(Path(baseline_path).read_text())
+    report = BenchmarkReport(baseline, request.config.getoption("--benchmark-tolerance"))
+    yield report
+    if (json_path := request.config.getoption("--benchmark-json")) and report.results:
+        Path(json_path).write_text(json.dumps(report.results, indent=4, sort_keys=True))
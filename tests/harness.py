@@ -0,0 +1,353 @@
+"""
+Offline environment of the plugin for the tests and benchmarks.
+
+install() must run before any module of the plugin is imported: it points a stub decky
+module at a temporary directory, provides the settings module of the Decky loader and
+writes an rclone.conf whose "cloud" remote is an alias of a local directory.
+The rclone binary is taken from $RCLONE_BIN or the PATH and wrapped, so that every
+process the plugin spawns is counted.
+"""
+
+from pathlib import Path
+from typing import Any, Awaitable
+import json, logging, os, random, shutil, stat, sys, tempfile, threading, time, types
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+ROOT = Path(tempfile.mkdtemp(prefix="sdh-game-sync-tests-"))
+HOME = ROOT / "home"
+SETTINGS_DIR = ROOT / "settings"
+RUNTIME_DIR = ROOT / "runtime"
+LOG_DIR = ROOT / "logs"
+PLUGIN_DIR = ROOT / "plugin"
+CLOUD_DIR = ROOT / "cloud"
+SAVES_DIR = ROOT / "saves"
+
+REAL_RCLONE = os.environ.get("RCLONE_BIN") or shutil.which("rclone")
+RCLONE_CALLS_LOG = RUNTIME_DIR / "rclone-calls.log"
+
+RSS_SAMPLE_INTERVAL = 0.01
+
+
+def install():
+    """
+    Sets up the directories, the rclone wrapper and the stub modules of the Decky loader.
+    """
+    for directory in (HOME, SETTINGS_DIR, RUNTIME_DIR, LOG_DIR, PLUGIN_DIR, CLOUD_DIR, SAVES_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+    for default_file in (REPO_DIR / "defaults").iterdir():
+        shutil.copy(default_file, PLUGIN_DIR / default_file.name)
+
+    (SETTINGS_DIR / "rclone.conf").write_text(
+        f"[cloud]\ntype = alias\nremote = {CLOUD_DIR}\n"
+    )
+    if REAL_RCLONE:
+        wrapper = RUNTIME_DIR / "rclone"
+        wrapper.write_text(
+            "#!/bin/sh\n"
+            f'echo "$$" >> "{RCLONE_CALLS_LOG}"\n'
+            f'exec "{REAL_RCLONE}" "$@"\n'
+        )
+        wrapper.chmod(wrapper.stat().st_mode | stat.S_IXUSR)
+
+    # rclone keeps the bisync state and its caches under the home directory
+    os.environ["HOME"] = str(HOME)
+    os.environ.pop("XDG_CACHE_HOME", None)
+    os.environ.pop("XDG_CONFIG_HOME", None)
+
+    sys.modules["decky"] = _make_decky()
+    sys.modules["settings"] = _make_settings()
+    sys.path[:0] = [str(REPO_DIR / "py_modules"), str(REPO_DIR)]
+
+
+def cleanup():
+    """
+    Removes the temporary directory of the environment.
+    """
+    shutil.rmtree(ROOT, ignore_errors=True)
+
+
+def _make_decky() -> types.ModuleType:
+    """
+    Builds the decky module of the loader, pointed at the temporary directory.
+
+    Returns:
+    types.ModuleType: The module, the events emitted to the frontend are kept in "emitted".
+    """
+    decky = types.ModuleType("decky")
+    decky.HOME = str(HOME)
+    decky.USER = "deck"
+    decky.DECKY_VERSION = "v0.0.0-tests"
+    decky.DECKY_USER = "deck"
+    decky.DECKY_USER_HOME = str(HOME)
+    decky.DECKY_HOME = str(ROOT)
+    decky.DECKY_PLUGIN_SETTINGS_DIR = str(SETTINGS_DIR)
+    decky.DECKY_PLUGIN_RUNTIME_DIR = str(RUNTIME_DIR)
+    decky.DECKY_PLUGIN_LOG_DIR = str(LOG_DIR)
+    decky.DECKY_PLUGIN_DIR = str(PLUGIN_DIR)
+    decky.DECKY_PLUGIN_NAME = "Game Sync"
+    decky.DECKY_PLUGIN_VERSION = "tests"
+    decky.DECKY_PLUGIN_AUTHOR = "tests"
+    decky.DECKY_PLUGIN_LOG = str(LOG_DIR / "plugin.log")
+
+    decky.logger = logging.getLogger("decky")
+    decky.emitted = list()
+
+    async def emit(event: str, *args: Any):
+        decky.emitted.append((event, args))
+
+    decky.emit = emit
+    return decky
+
+
+def _make_settings() -> types.ModuleType:
+    """
+    Builds the settings module of the loader.
+
+    Returns:
+    types.ModuleType: The module with SettingsManager.
+    """
+    settings = types.ModuleType("settings")
+
+    class SettingsManager:
+        def __init__(self, name: str, settings_directory: str | None = None):
+            self.path = os.path.join(settings_directory or str(SETTINGS_DIR), f"{name}.json")
+            self.settings: dict[str, Any] = dict()
+            self.read()
+
+        def read(self):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.settings.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+
+        def commit(self):
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.settings, f, indent=4, ensure_ascii=False)
+
+        def getSetting(self, key: str, default: Any = None) -> Any:
+            return self.settings.get(key, default)
+
+        def setSetting(self, key: str, value: Any) -> Any:
+            self.settings[key] = value
+            self.commit()
+            return value
+
+    settings.SettingsManager = SettingsManager
+    return settings
+
+
+# Synthetic save trees
+
+
+def make_tiny_files(root: Path, count: int = 2000, size: int = 512, per_dir: int = 100) -> int:
+    """
+    Writes many tiny files, e.g. the slots and thumbnails of a save directory.
+
+    Parameters:
+    root (Path): The directory to write to.
+    count (int): Number of files.
+    size (int): Size of every file in bytes.
+    per_dir (int): Number of files per subdirectory.
+
+    Returns:
+    int: Total bytes written.
+    """
+    rng = random.Random(count)
+    for i in range(count):
+        path = root / f"slot{i // per_dir:03d}" / f"save{i:05d}.dat"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(make_save_data(rng, size))
+    return count * size
+
+
+def make_huge_files(root: Path, count: int = 2, size: int = 32 * 1024 * 1024) -> int:
+    """
+    Writes a few huge files, e.g. the memory card images of an emulator.
+
+    Parameters:
+    root (Path): The directory to write to.
+    count (int): Number of files.
+    size (int): Size of every file in bytes.
+
+    Returns:
+    int: Total bytes written.
+    """
+    rng = random.Random(size)
+    root.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        with (root / f"card{i}.mcd").open("wb") as f:
+            written = 0
+            while written < size:
+                block = make_save_data(rng, min(1024 * 1024, size - written))
+                f.write(block)
+                written += len(block)
+    return count * size
+
+
+def make_proton_prefix(root: Path, depth: int = 12, files: int = 1500, size: int = 2048) -> int:
+    """
+    Writes a deep Proton prefix, with the saves at the bottom of the Windows user profile
+    and config files spread along the way.
+
+    Parameters:
+    root (Path): The directory of the prefix.
+    depth (int): Number of nested directories under the profile.
+    files (int): Number of files.
+    size (int): Size of every file in bytes.
+
+    Returns:
+    int: Total bytes written.
+    """
+    rng = random.Random(depth * files)
+    base = root / "pfx/drive_c/users/steamuser/AppData/LocalLow/Studio/Game"
+    levels = [base]
+    for level in range(depth):
+        levels.append(levels[-1] / f"level{level:02d}")
+    for i in range(files):
+        path = levels[i % len(levels)] / f"file{i:05d}.cfg"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(make_save_data(rng, size))
+    return files * size
+
+
+def make_save_data(rng: random.Random, size: int) -> bytes:
+    """
+    Generates data that compresses like a typical save, i.e. structured records
+    with a random payload of about a quarter of their size.
+
+    Parameters:
+    rng (random.Random): The random source.
+    size (int): Number of bytes.
+
+    Returns:
+    bytes: The data.
+    """
+    record = bytearray()
+    while len(record) < size:
+        record += b"RECORD\x00\x01" + rng.randbytes(8) + bytes(16) + b"\xff" * 8
+    return bytes(record[:size])
+
+
+SAVE_TREES = {
+    "tiny_files": make_tiny_files,
+    "huge_files": make_huge_files,
+    "proton_prefix": make_proton_prefix,
+}
+
+
+# Measurements
+
+
+class RcloneMonitor:
+    """
+    Counts the rclone processes started through the wrapper while it's active and samples
+    their peak resident memory, along with the ones given, e.g. the rc daemon.
+    """
+
+    def __init__(self, pids: list[int] = []):
+        self._pids = {pid: 0 for pid in pids}
+        self._offset = 0
+        self._spawned: list[int] = list()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self) -> "RcloneMonitor":
+        self._offset = _get_size(RCLONE_CALLS_LOG)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._stop_event.set()
+        self._thread.join()
+        self._poll()
+
+    @property
+    def processes(self) -> int:
+        """
+        Number of rclone processes spawned.
+        """
+        return len(self._spawned)
+
+    @property
+    def peak_rss(self) -> int:
+        """
+        Highest peak resident memory in bytes of the rclone processes seen.
+        """
+        return max(self._pids.values(), default=0)
+
+    def _sample(self):
+        while not self._stop_event.wait(RSS_SAMPLE_INTERVAL):
+            self._poll()
+
+    def _poll(self):
+        if _get_size(RCLONE_CALLS_LOG) > self._offset:
+            with RCLONE_CALLS_LOG.open("r") as f:
+                f.seek(self._offset)
+                lines = f.read().splitlines()
+                self._offset = f.tell()
+            for line in lines:
+                pid = int(line)
+                self._spawned.append(pid)
+                self._pids.setdefault(pid, 0)
+        for pid in self._pids:
+            self._pids[pid] = max(self._pids[pid], _get_peak_rss(pid))
+
+
+async def measure(awaitable: Awaitable, pids: list[int] = []) -> tuple[Any, dict[str, Any]]:
+    """
+    Runs a call of the plugin and measures it.
+
+    Parameters:
+    awaitable (Awaitable): The call.
+    pids (list[int]): Long-lived rclone processes to sample as well, e.g. the rc daemon.
+
+    Returns:
+    tuple[Any, dict[str, Any]]: The result of the call and its wall time ("seconds"),
+                                the rclone processes spawned ("processes") and their
+                                peak resident memory ("peak_rss").
+    """
+    with RcloneMonitor(pids) as monitor:
+        start_time = time.perf_counter()
+        result = await awaitable
+        seconds = time.perf_counter() - start_time
+    return result, {
+        "seconds": round(seconds, 4),
+        "processes": monitor.processes,
+        "peak_rss": monitor.peak_rss,
+    }
+
+
+def _get_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def _get_peak_rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def list_tree(root: Path) -> dict[str, bytes]:
+    """
+    Reads the files of a tree.
+
+    Parameters:
+    root (Path): The root of the tree.
+
+    Returns:
+    dict[str, bytes]: The content of the files by path relative to the root.
+    """
+    return {
+        str(path.relative_to(root)): path.read_bytes()
+        for path in root.rglob("*")
+        if path.is_file()
+    }
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+import rclone_manager
+from bandwidth_policy import BandwidthPolicy, get_scheduled_rate, parse_schedule
+from common_defs import SyncPriority
+from rclone_manager import RcloneManager
+from sync_target import SyncScheduler
+
+
+def test_parse_schedule():
+    assert parse_schedule("19:00,2M 8:00,512k  23:30,off") == [
+        (8 * 60, "512k"),
+        (19 * 60, "2M"),
+        (23 * 60 + 30, "off"),
+    ]
+    assert parse_schedule("") == []
+    for schedule in ("24:00,1M", "08:60,1M", "08:00", "8h,1M"):
+        with pytest.raises(ValueError):
+            parse_schedule(schedule)
+
+
+def test_get_scheduled_rate():
+    schedule = "08:00,512k 19:00,2M"
+    assert get_scheduled_rate(schedule, 8 * 60) == "512k"
+    assert get_scheduled_rate(schedule, 12 * 60) == "512k"
+    assert get_scheduled_rate(schedule, 20 * 60) == "2M"
+    # The last entry of the day goes on until the first one
+    assert get_scheduled_rate(schedule, 7 * 60) == "2M"
+    assert get_scheduled_rate("", 12 * 60) is None
+
+
+def test_policy_rate(run, config):
+    assert BandwidthPolicy.get_policy_rate() is None
+    config("bwlimit_game_running", "1M")
+    config("bwlimit_idle", "8M")
+    assert BandwidthPolicy.get_policy_rate() == "8M"
+    assert BandwidthPolicy.get_process_args(True) == ["--bwlimit", "8M"]
+    assert BandwidthPolicy.get_process_args(False) == []
+
+    run(BandwidthPolicy.set_game_running(7, True))
+    try:
+        assert BandwidthPolicy.get_policy_rate() == "1M"
+
+        async def foreground_sync():
+            run_id = await BandwidthPolicy.begin(False)
+            assert BandwidthPolicy.get_rate() == "off"
+            await BandwidthPolicy.end(run_id)
+
+        run(foreground_sync())
+        assert BandwidthPolicy.get_rate() == "1M"
+    finally:
+        run(BandwidthPolicy.set_game_running(7, False))
+
+
+def test_cancel_while_lifting_the_limit(run, config, monkeypatch):
+    config("bwlimit_idle", "8M")
+    applied = asyncio.Event()
+
+    async def slow_rc_call(command, params=None):
+        applied.set()
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(RcloneManager, "daemon_available", classmethod(lambda cls: True))
+    monkeypatch.setattr(RcloneManager, "rc_call", slow_rc_call)
+
+    async def scenario():
+        async def sync_task():
+            return 0
+
+        submitted = asyncio.create_task(
+            SyncScheduler.submit("50", "path2", SyncPriority.GAME_DOWNLOAD, sync_task)
+        )
+        await asyncio.wait_for(applied.wait(), 1)
+        # Cancelled while the daemon is being told to lift the limit
+        assert SyncScheduler.cancel("50") == 1
+        assert await asyncio.wait_for(submitted, 1) == -1
+
+    run(scenario())
+    assert BandwidthPolicy.get_stats()["runs"] == 0
+    assert BandwidthPolicy.get_rate() == "8M"
+    assert SyncScheduler.get_stats()["running"] == []
+
+
+@pytest.mark.rclone
+def test_prefetch_without_daemon_limited(run, plugin, game, config, monkeypatch):
+    config("save_prefetch", True)
+    config("bwlimit_idle", "4M")
+    (game["save_dir"] / "save.dat").write_bytes(b"cloud save")
+    run(plugin.set_target_filters(game["app_id"], game["filters"]))
+    assert run(plugin.sync_local_first(game["app_id"])) == 0
+    (game["save_dir"] / "save.dat").write_bytes(b"newer local save")
+
+    copies = list()
+    limited = list()
+    spawn = rclone_manager.create_subprocess_exec
+
+    async def recording_spawn(program, *args, **kwargs):
+        if "copy" in args:
+            copies.append(args)
+        return await spawn(program, *args, **kwargs)
+
+    monkeypatch.setattr(RcloneManager, "daemon_available", classmethod(lambda cls: False))
+    monkeypatch.setattr(rclone_manager, "create_subprocess_exec", recording_spawn)
+    monkeypatch.setattr(BandwidthPolicy, "detach", classmethod(
+        lambda cls, process: limited.append(cls._processes.pop(process.pid).rate)
+    ))
+    assert run(plugin.prefetch_saves(game["app_id"])) == 0
+
+    (copy_args,) = copies
+    assert copy_args[-2:] == ("--bwlimit", "4M")
+    # Toggled along with the syncs while it ran
+    assert limited == ["4M"]
+    assert BandwidthPolicy.get_stats()["processes"] == 0
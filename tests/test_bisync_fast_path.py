@@ -0,0 +1,88 @@
+import subprocess
+
+import pytest
+
+import harness
+from bisync_fast_path import (
+    LISTING_HEADER,
+    _canonical_path,
+    find_listing_changes,
+    get_listing_paths,
+    parse_time,
+    read_listing,
+)
+
+
+def test_parse_time():
+    assert parse_time("1970-01-01T00:00:01Z") == 1.0
+    assert parse_time("1970-01-01T01:00:00+0100") == 0.0
+    assert parse_time("1970-01-01T01:00:00+01:00") == 0.0
+    # Nanoseconds are kept
+    assert parse_time("2024-01-31T12:00:00.123456789+0000") - parse_time("2024-01-31T12:00:00Z") == pytest.approx(
+        0.123456789, abs=1e-6
+    )
+    for text in ("2024-01-31 12:00:00Z", "2024-01-31T12:00:00", "yesterday"):
+        with pytest.raises(ValueError):
+            parse_time(text)
+
+
+def test_canonical_path():
+    # rclone names the sessions of the root "..path2"
+    assert _canonical_path("/") == ""
+    assert _canonical_path("/home/deck/saves") == "home_deck_saves"
+    assert _canonical_path("cloud:deck-sync") == "cloud_deck-sync"
+    assert _canonical_path("cloud{a1b2c}:deck sync/") == "cloud_deck_sync"
+
+
+def test_find_listing_changes():
+    listing = {"a": (1, 10.0), "b": (2, 20.0), "c": (3, 30.0)}
+    assert find_listing_changes(listing, dict(listing), 0.001) == []
+    assert find_listing_changes(listing, {**listing, "a": (1, 10.0005)}, 0.001) == []
+    assert find_listing_changes(listing, {**listing, "a": (1, 11.0)}, 0.001) == ["a"]
+    assert find_listing_changes(listing, {**listing, "b": (5, 20.0)}, 0.001) == ["b"]
+    assert sorted(find_listing_changes(listing, {"a": (1, 10.0), "d": (4, 40.0)}, 0.001)) == ["b", "c", "d"]
+    # Stops after a few changes
+    assert len(find_listing_changes({}, {str(i): (i, 0.0) for i in range(20)}, 0.001)) == 5
+
+
+def test_read_listing(tmp_path):
+    listing = tmp_path / "session.path1.lst"
+    assert read_listing(listing) is None
+
+    listing.write_text(
+        f"{LISTING_HEADER} - 2024-01-31 12:00:00.000000000 +0000\n"
+        '- 4 md5:abc - 2024-01-31T12:00:00.5+0000 "1000/save.dat"\n'
+        '- 2 - - 2024-01-31T12:00:00Z "1000/slot \\"1\\".dat"\n'
+        'd 0 - - 2024-01-31T12:00:00Z "1000"\n'
+    )
+    assert read_listing(listing) == {
+        "1000/save.dat": (4, parse_time("2024-01-31T12:00:00Z") + 0.5),
+        '1000/slot "1".dat': (2, parse_time("2024-01-31T12:00:00Z")),
+    }
+
+    listing.write_text(f"{LISTING_HEADER}\n" "- 4 - - not-a-time \"1000/save.dat\"\n")
+    assert read_listing(listing) is None
+    listing.write_text("# other format\n")
+    assert read_listing(listing) is None
+
+
+@pytest.mark.rclone
+def test_reads_the_listings_of_rclone(tmp_path):
+    path1, path2 = tmp_path / "path1", tmp_path / "path2"
+    (path1 / "1000").mkdir(parents=True)
+    path2.mkdir()
+    (path1 / "1000" / "save.dat").write_bytes(b"save")
+    (path1 / "top level.sav").write_bytes(b"top")
+    subprocess.run(
+        [harness.REAL_RCLONE, "bisync", str(path1), str(path2), "--resync"],
+        capture_output=True,
+        check=True,
+        env={"HOME": harness.HOME, "PATH": "/usr/bin:/bin"},
+    )
+
+    for listing_path in get_listing_paths(str(path1), str(path2)):
+        listing = read_listing(listing_path)
+        assert listing is not None
+        assert sorted(listing) == ["1000/save.dat", "top level.sav"]
+        assert listing["1000/save.dat"][0] == 4
+        assert listing["1000/save.dat"][1] == pytest.approx((path1 / "1000" / "save.dat").stat().st_mtime, abs=0.001)
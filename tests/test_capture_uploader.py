@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+import capture_uploader
+from capture_uploader import CaptureUploader
+
+CAPTURE_DIR = "/home/deck/.steam/steam/userdata/1/760/remote/1000/screenshots"
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch) -> list[list[str]]:
+    """
+    Replaces the capture sync target, recording the names uploaded by every rclone run.
+    The runs fail while "fail" is in the list.
+    """
+    uploads = list()
+    files_from_path = tmp_path / "captures.files"
+
+    class FakeCaptureSyncTarget:
+        def __init__(self, path: str, files_from=None):
+            if files_from:
+                assert path == CAPTURE_DIR and files_from == files_from_path
+                self._names = files_from.read_text().splitlines()
+            else:
+                self._names = [path.rsplit("/", 1)[1]]
+
+        async def sync(self) -> int:
+            await asyncio.sleep(0.01)
+            uploads.append(self._names)
+            return 1 if "fail" in uploads else 0
+
+    monkeypatch.setattr(capture_uploader, "CaptureSyncTarget", FakeCaptureSyncTarget)
+    monkeypatch.setattr(capture_uploader, "CAPTURE_FILES_FROM_PATH", files_from_path)
+    monkeypatch.setattr(capture_uploader, "CAPTURE_DEBOUNCE_SECONDS", 0.1)
+    monkeypatch.setattr(CaptureUploader, "_pending", dict())
+    return uploads
+
+
+async def upload_burst(names: list[str]) -> list[int]:
+    async def upload(i: int, name: str) -> int:
+        await asyncio.sleep(i * 0.02)
+        return await CaptureUploader.upload(f"{CAPTURE_DIR}/{name}")
+
+    return await asyncio.gather(*(upload(i, name) for i, name in enumerate(names)))
+
+
+def test_burst_uploaded_once(run, uploads):
+    names = [f"2026010100000{i}_1.jpg" for i in range(5)]
+    assert run(upload_burst(names)) == [0] * 5
+    assert uploads == [names]
+
+    # A single capture is uploaded on its own
+    assert run(upload_burst(["20260101000010_1.jpg"])) == [0]
+    assert uploads[1:] == [["20260101000010_1.jpg"]]
+    assert CaptureUploader._pending == {}
+
+
+def test_full_batch_not_delayed(run, uploads, monkeypatch):
+    monkeypatch.setattr(capture_uploader, "CAPTURE_DEBOUNCE_SECONDS", 60)
+    monkeypatch.setattr(capture_uploader, "CAPTURE_BATCH_SIZE", 3)
+    names = ["a.jpg", "b.jpg", "c.jpg"]
+    assert run(asyncio.wait_for(upload_burst(names), 5)) == [0] * 3
+    assert uploads == [names]
+
+
+def test_failed_upload_stays_pending(run, uploads):
+    uploads.append("fail")
+    assert run(upload_burst(["a.jpg", "b.jpg"])) == [1, 1]
+    # The batch, then one by one
+    assert uploads == ["fail", ["a.jpg", "b.jpg"], ["a.jpg"], ["b.jpg"]]
+    assert sorted(CaptureUploader._pending) == [f"{CAPTURE_DIR}/a.jpg", f"{CAPTURE_DIR}/b.jpg"]
+
+    # Uploaded with the next capture
+    uploads.clear()
+    assert run(upload_burst(["c.jpg"])) == [0]
+    assert uploads == [["a.jpg", "b.jpg", "c.jpg"]]
+    assert CaptureUploader._pending == {}
@@ -0,0 +1,140 @@
+import asyncio, os
+
+import pytest
+
+import change_journal, harness
+from change_journal import ChangeJournal
+from filter_matcher import FilterMatcher
+
+FINGERPRINT = "fingerprint"
+
+
+@pytest.fixture
+def save_dir(tmp_path):
+    save_dir = tmp_path / "saves"
+    (save_dir / "slot0").mkdir(parents=True)
+    (save_dir / "slot0" / "save.dat").write_bytes(b"save")
+    (save_dir / "other.dat").write_bytes(b"other")
+    return save_dir
+
+
+def start(run, save_dir, id: str = "journal") -> ChangeJournal:
+    journal = ChangeJournal(id, str(save_dir.parent), FilterMatcher(["+ /saves/**", "- *"]))
+
+    async def start():
+        journal.start([str(save_dir)], True, FINGERPRINT)
+
+    run(start())
+    return journal
+
+
+def stop(run, journal: ChangeJournal, discard: bool = False):
+    async def stop():
+        journal.discard() if discard else journal.stop()
+
+    run(stop())
+
+
+def settle(run):
+    # Lets the loop handle the pending inotify events
+    run(asyncio.sleep(0.05))
+
+
+def get_files(journal: ChangeJournal) -> list[str]:
+    return journal.get_files_from().read_text().splitlines()
+
+
+def test_records_changes(run, save_dir):
+    journal = start(run, save_dir)
+    (save_dir / "slot0" / "save.dat").write_bytes(b"changed")
+    (save_dir / "slot1").mkdir()
+    (save_dir / "slot1" / "new.dat").write_bytes(b"new")
+    settle(run)
+    stop(run, journal)
+
+    assert get_files(journal) == ["saves/slot0/save.dat", "saves/slot1/new.dat"]
+    assert (change_journal.JOURNAL_DIR / "journal.log").exists()
+    stop(run, journal, discard=True)
+    assert not (change_journal.JOURNAL_DIR / "journal.log").exists()
+
+
+def test_resume_after_crash(run, save_dir):
+    journal = start(run, save_dir, "crashed")
+    (save_dir / "slot0" / "save.dat").write_bytes(b"changed")
+    settle(run)
+    # The plugin dies without stopping the journal, the game goes on writing
+    journal._log.close()
+    journal._log = None
+    (save_dir / "other.dat").write_bytes(b"changed while not watched")
+
+    resumed = change_journal.resume_journal(
+        "crashed", [str(save_dir)], str(save_dir.parent), FilterMatcher(["+ /saves/**"]), FINGERPRINT
+    )
+    assert resumed is not None
+    assert get_files(resumed) == ["saves/other.dat", "saves/slot0/save.dat"]
+    stop(run, journal)
+
+
+def test_resume_after_reload_records_moved_directories(run, save_dir, tmp_path):
+    stop(run, start(run, save_dir, "reloaded"))
+    moved = tmp_path / "moved"
+    moved.mkdir()
+    (moved / "old.dat").write_bytes(b"old")
+    os.utime(moved / "old.dat", ns=(0, 0))
+    moved.rename(save_dir / "moved")
+
+    resumed = change_journal.resume_journal(
+        "reloaded", [str(save_dir)], str(save_dir.parent), FilterMatcher(["+ /saves/**"]), FINGERPRINT
+    )
+    assert "saves/moved/old.dat" in get_files(resumed)
+
+
+def test_resume_requires_the_same_fingerprint(run, save_dir):
+    stop(run, start(run, save_dir, "filters-changed"))
+    assert change_journal.resume_journal(
+        "filters-changed", [str(save_dir)], str(save_dir.parent), FilterMatcher([]), "other"
+    ) is None
+    assert not (change_journal.JOURNAL_DIR / "filters-changed.log").exists()
+
+
+def test_partial_record_is_not_resumed(run, save_dir):
+    stop(run, start(run, save_dir, "partial"))
+    with (change_journal.JOURNAL_DIR / "partial.log").open("a") as f:
+        f.write(str(save_dir / "slot"))
+    assert change_journal.resume_journal(
+        "partial", [str(save_dir)], str(save_dir.parent), FilterMatcher([]), FINGERPRINT
+    ) is None
+
+
+def test_start_skips_malformed_filters(run, plugin, game, config):
+    config("change_journal", True)
+    from sync_target import GameSyncTarget
+
+    target = GameSyncTarget(game["app_id"])
+    target.get_filters = lambda: [f"+ /{game['app_id']}/[unterminated"]
+    run(target.start_change_journal())
+    assert str(game["app_id"]) not in change_journal._active_journals
+
+
+@pytest.mark.rclone
+def test_upload_after_reload(run, plugin, game, config, caplog):
+    config("change_journal", True)
+    app_id, save_dir = game["app_id"], game["save_dir"]
+    (save_dir / "save.dat").write_bytes(b"save")
+    (save_dir / "other.dat").write_bytes(b"other")
+    run(plugin.set_target_filters(app_id, game["filters"]))
+    assert run(plugin.sync_local_first(app_id)) == 0
+
+    run(plugin.start_change_journal(app_id))
+    (save_dir / "save.dat").write_bytes(b"changed")
+    settle(run)
+
+    async def reload():
+        change_journal.stop_all_journals()
+
+    run(reload())
+    (save_dir / "other.dat").write_bytes(b"changed while reloading")
+    assert run(plugin.sync_local_first(app_id)) == 0
+    assert "resumed with 2 paths" in caplog.text
+    assert harness.list_tree(game["cloud_dir"]) == harness.list_tree(save_dir)
+    assert not (change_journal.JOURNAL_DIR / f"{app_id}.log").exists()
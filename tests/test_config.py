@@ -0,0 +1,40 @@
+import asyncio, json, threading
+
+import config as config_module
+from config import Config
+
+
+def test_burst_of_changes_is_written_once(run, plugin, config, monkeypatch):
+    monkeypatch.setattr(config_module, "CONFIG_WRITE_DELAY", 0.05)
+    replace = config_module.os.replace
+    writes = list()
+
+    def counting_replace(source, destination):
+        writes.append((destination, threading.get_ident()))
+        return replace(source, destination)
+
+    monkeypatch.setattr(config_module.os, "replace", counting_replace)
+    config("log_level", "INFO")
+    run(Config.flush())
+    writes.clear()
+
+    async def burst():
+        for i in range(50):
+            await plugin.set_config("log_level", "DEBUG" if i % 2 else "INFO")
+        assert writes == []
+        await asyncio.sleep(0.2)
+
+    run(burst())
+    ((path, thread),) = writes
+    assert path == Config._config.path
+    # Written by a worker thread, off the event loop
+    assert thread != threading.get_ident()
+    with open(Config._config.path, "r", encoding="utf-8") as f:
+        assert json.load(f)["log_level"] == "DEBUG"
+
+
+def test_set_config_without_a_loop_writes_at_once(config):
+    writes = Config._writes
+    config("log_level", "DEBUG")
+    assert Config._writes == writes + 1
+    assert Config.get_config_item("log_level") == "DEBUG"
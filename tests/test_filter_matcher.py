@@ -0,0 +1,102 @@
+import subprocess
+
+import pytest
+
+import harness
+from filter_matcher import (
+    FilterMatcher,
+    get_compiled_filter_file,
+    glob_to_regex,
+    list_filtered_files,
+    normalize_filters,
+)
+
+TREE = [
+    "1000/save.dat",
+    "1000/slot1/save.dat",
+    "1000/slot1/save.bak",
+    "1000/cache/shader.bin",
+    "1001/profile.cfg",
+    "Game {1}/save[1].dat",
+    "home/deck/.config/game/settings.ini",
+    "home/deck/.config/other/settings.ini",
+    "home/deck/Documents/a.txt",
+    "top.sav",
+]
+
+RULE_SETS = [
+    ["+ /1000/**", "- **"],
+    ["- *.bak", "+ /1000/**", "- **"],
+    ["- /1000/cache/**", "+ /1000/**", "- **"],
+    ["+ *.sav", "+ *.dat", "- *"],
+    ["+ /1000/slot?/*.{dat,bak}", "- **"],
+    ["+ /home/deck/.config/game/**", "- /home/**", "+ /top.sav"],
+    ["+ /Game \\{1\\}/save\\[1\\].dat", "- **"],
+    ["+ /100[01]/*", "- **"],
+    ["- /1000/slot1/", "+ /1000/**", "- **"],
+    ["# comment", "", "+ /1001/**", "!", "+ /1000/*.dat", "- **"],
+]
+
+
+@pytest.fixture(scope="module")
+def tree(tmp_path_factory):
+    root = tmp_path_factory.mktemp("tree")
+    for path in TREE:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_bytes(path.encode())
+    return root
+
+
+def test_normalize_filters():
+    assert normalize_filters(
+        ["# comment", " + /a/** ", "", "+ /a/**", "; other", "- **", "+ /b/**"]
+    ) == ["+ /a/**", "- **"]
+    assert normalize_filters(["+ /a/**", "!", "+ /b/**"]) == ["+ /b/**"]
+
+
+def test_glob_to_regex():
+    assert glob_to_regex("/a/*.dat").match("a/save.dat")
+    assert not glob_to_regex("/a/*.dat").match("a/b/save.dat")
+    assert glob_to_regex("/a/**").match("a/b/save.dat")
+    assert glob_to_regex("*.dat").match("deep/down/save.dat")
+    assert glob_to_regex("/s?ve.{dat,bak}").match("save.bak")
+    assert not glob_to_regex("/s?ve.{dat,bak}").match("sve.bak")
+    with pytest.raises(ValueError):
+        glob_to_regex("/[unterminated")
+    with pytest.raises(ValueError):
+        FilterMatcher(["not a rule"])
+
+
+def test_include_dir():
+    matcher = FilterMatcher(["+ /1000/**", "- **"])
+    assert matcher.include_dir("1000/slot1")
+    assert not matcher.include_dir("1001")
+    assert not matcher.include("1001/profile.cfg")
+
+    matcher = FilterMatcher(["- /1000/slot1/", "+ /1000/**", "- **"])
+    assert not matcher.include("1000/slot1/save.dat")
+    assert matcher.include("1000/save.dat")
+
+
+def test_compiled_filter_file():
+    path = get_compiled_filter_file(["# comment", "+ /a/**", "- **"])
+    assert path.read_text() == "+ /a/**\n- **\n"
+    assert get_compiled_filter_file(["+ /a/**", "- **"]) == path
+
+
+@pytest.mark.rclone
+@pytest.mark.parametrize("rules", RULE_SETS, ids=[" ".join(rules) for rules in RULE_SETS])
+def test_matches_rclone(tree, tmp_path, rules):
+    filter_file = tmp_path / "rules.filter"
+    filter_file.write_text("\n".join(rules) + "\n")
+    listing = subprocess.run(
+        [harness.REAL_RCLONE, "lsf", "-R", "--files-only", "--filter-from", str(filter_file), str(tree)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    expected = sorted(listing.stdout.splitlines())
+
+    matcher = FilterMatcher(rules)
+    assert sorted(path for path in TREE if matcher.include(path)) == expected
+    assert sorted(list_filtered_files(matcher, str(tree), False)) == expected
@@ -0,0 +1,83 @@
+import pytest
+
+import harness
+import sync_target
+
+pytestmark = pytest.mark.rclone
+
+
+@pytest.fixture
+def events(monkeypatch) -> list[str]:
+    """
+    Records the pauses of the game process and the rclone runs, in order.
+    """
+    events = list()
+    upload = sync_target._SyncTarget._rclone_execute
+
+    async def recording_upload(self, winner, extra_args=[]):
+        events.append("upload")
+        return await upload(self, winner, extra_args)
+
+    monkeypatch.setattr(sync_target.process_control, "pause", lambda pid: events.append("pause"))
+    monkeypatch.setattr(sync_target.process_control, "resume", lambda pid: events.append("resume"))
+    monkeypatch.setattr(sync_target._SyncTarget, "_rclone_execute", recording_upload)
+    return events
+
+
+def test_snapshot_upload_pauses_for_the_copy_only(run, plugin, game, config, events):
+    config("snapshot_upload", True)
+    harness.make_tiny_files(game["save_dir"], count=20)
+    run(plugin.set_target_filters(game["app_id"], game["filters"]))
+
+    assert run(plugin.sync_local_first(game["app_id"], 4242)) == 0
+    assert events == ["pause", "resume", "upload"]
+    assert harness.list_tree(game["cloud_dir"]) == harness.list_tree(game["save_dir"])
+
+
+def test_too_many_files_to_snapshot(run, plugin, game, config, events, monkeypatch):
+    config("snapshot_upload", True)
+    monkeypatch.setattr(sync_target, "list_filtered_files", lambda *args: None)
+    harness.make_tiny_files(game["save_dir"], count=20)
+    run(plugin.set_target_filters(game["app_id"], game["filters"]))
+
+    assert run(plugin.sync_local_first(game["app_id"], 4242)) == 0
+    assert events == ["pause", "upload", "resume"]
+
+
+def test_unknown_roots(run, plugin, game, config, events):
+    config("snapshot_upload", True)
+    harness.make_tiny_files(game["save_dir"], count=20)
+    run(plugin.set_target_filters(game["app_id"], [f"+ {game['app_id']}/**"]))
+
+    assert run(plugin.sync_local_first(game["app_id"], 4242)) == 0
+    assert events == ["pause", "upload", "resume"]
+
+
+def test_snapshot_store_upload(run, plugin, game, config, events):
+    config("snapshot_store", True)
+    harness.make_tiny_files(game["save_dir"], count=20)
+    run(plugin.set_target_filters(game["app_id"], game["filters"]))
+
+    assert run(plugin.sync_local_first(game["app_id"], 4242)) == 0
+    assert events[0] == "pause"
+    assert events[-1] == "resume"
+
+
+def test_freeze_logged_against_the_whole_upload(run, plugin, game, config, events, monkeypatch, caplog):
+    config("snapshot_upload", True)
+    harness.make_tiny_files(game["save_dir"], count=20)
+    run(plugin.set_target_filters(game["app_id"], game["filters"]))
+
+    async def failed_snapshot(self, roots):
+        await sync_target.asyncio.sleep(0.2)
+        return None, None, None
+
+    monkeypatch.setattr(sync_target.GameSyncTarget, "_take_upload_snapshot", failed_snapshot)
+    assert run(plugin.sync_local_first(game["app_id"], 4242)) == 0
+    assert events == ["pause", "upload", "resume"]
+    (frozen, total), = [
+        (float(record.args[1]), float(record.args[2]))
+        for record in caplog.records
+        if record.msg.startswith("Upload of") and "froze" in record.msg
+    ]
+    assert total - frozen >= 0.2
@@ -0,0 +1,115 @@
+import asyncio, gzip
+
+import decky
+import pytest
+
+import log_reader
+from log_reader import LogFollower, read_log, rotate_logs
+
+LINES = [f"line {i:04d}\n" for i in range(1000)]
+
+
+@pytest.fixture(params=["plain", "gzip"])
+def log_file(request, tmp_path):
+    """
+    A log of 1000 lines of 10 bytes, as written or rotated and compressed.
+    """
+    content = "".join(LINES).encode()
+    if request.param == "plain":
+        path = tmp_path / "rclone 1.log"
+        path.write_bytes(content)
+    else:
+        path = tmp_path / "rclone 1.log.gz"
+        path.write_bytes(gzip.compress(content))
+    return path
+
+
+def test_read_pages(log_file):
+    page = read_log(log_file, 0, 95)
+    # Cut at the last complete line
+    assert page == {"content": "".join(LINES[:9]), "offset": 0, "next_offset": 90, "size": 10000}
+
+    content = ""
+    offset = 0
+    while offset < 10000:
+        page = read_log(log_file, offset, 4096)
+        assert page["content"].endswith("\n")
+        content += page["content"]
+        offset = page["next_offset"]
+    assert content == "".join(LINES)
+
+    # Capped to a page
+    assert len(read_log(log_file, 0, 10**9)["content"]) <= log_reader.LOG_PAGE_SIZE
+    # Read again from the start once the file got shorter
+    assert read_log(log_file, 20000, 20)["offset"] == 0
+
+
+def test_read_tail(log_file):
+    page = read_log(log_file, tail_lines=3)
+    assert page["content"] == "".join(LINES[-3:])
+    assert page["offset"] == 9970
+    assert page["next_offset"] == page["size"] == 10000
+    assert read_log(log_file)["content"] == "".join(LINES[-log_reader.LOG_TAIL_LINES :])
+    # Never longer than a page
+    assert read_log(log_file, tail_lines=1000, length=100)["offset"] == 9900
+
+
+def test_read_long_line(tmp_path):
+    path = tmp_path / "rclone 1.log"
+    path.write_text("x" * 300 + "\n")
+    page = read_log(path, 0, 100)
+    assert page["content"] == "x" * 100
+    assert page["next_offset"] == 100
+
+
+def test_rotate_logs(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_reader, "MAX_COMPRESSED_LOGS", 2)
+    for i in range(5):
+        (tmp_path / f"rclone {i}.log").write_text(f"sync {i}\n")
+    (tmp_path / "other.log").write_text("other\n")
+
+    rotate_logs(tmp_path, "rclone *.log", 2)
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "other.log",
+        "rclone 1.log.gz",
+        "rclone 2.log.gz",
+        "rclone 3.log",
+        "rclone 4.log",
+    ]
+    assert read_log(tmp_path / "rclone 2.log.gz", 0)["content"] == "sync 2\n"
+
+
+def test_follow(run, tmp_path, monkeypatch):
+    monkeypatch.setattr(log_reader, "LOG_FOLLOW_INTERVAL", 0.01)
+    first, second = tmp_path / "rclone 1.log", tmp_path / "rclone 2.log"
+    first.write_text("started\n")
+    current = [first]
+
+    async def follow() -> list[dict]:
+        decky.emitted.clear()
+        LogFollower.follow("1000", lambda: current[0], first.stat().st_size)
+        try:
+            await asyncio.sleep(0.05)
+            with first.open("a") as f:
+                f.write("copied\n")
+            await asyncio.sleep(0.05)
+
+            # A new sync logs to a new file
+            second.write_text("next sync\n")
+            current[0] = second
+            await asyncio.sleep(0.05)
+
+            # Then gets truncated
+            second.write_text("cut\n")
+            await asyncio.sleep(0.05)
+        finally:
+            LogFollower.unfollow("1000")
+        assert "1000" not in LogFollower._tasks
+        return [args[1] for event, args in decky.emitted if event == "log_update" and args[0] == "1000"]
+
+    pages = run(follow())
+    assert [(page["content"], page["offset"], page["reset"]) for page in pages] == [
+        ("copied\n", 8, False),
+        ("next sync\n", 0, True),
+        ("cut\n", 0, True),
+    ]
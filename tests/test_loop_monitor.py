@@ -0,0 +1,43 @@
+from collections import deque
+import asyncio, logging, time
+
+from loop_monitor import LOOP_MONITOR_SAMPLES, LoopMonitor
+
+
+def block_the_loop(seconds: float):
+    time.sleep(seconds)
+
+
+def test_blocked_loop_reported(run, plugin, monkeypatch, caplog):
+    caplog.set_level(logging.INFO)
+
+    async def blocked_loop():
+        # The loop was idle between the calls of the test, which counts as a delay
+        await asyncio.sleep(0.3)
+        monkeypatch.setattr(LoopMonitor, "_delays", deque(maxlen=LOOP_MONITOR_SAMPLES))
+        monkeypatch.setattr(LoopMonitor, "_max_delay", 0)
+        monkeypatch.setattr(LoopMonitor, "_stalls", 0)
+        caplog.clear()
+
+        await asyncio.sleep(0.5)
+        before = await plugin.get_loop_stats()
+        block_the_loop(0.6)
+        await asyncio.sleep(0.5)
+        return before, await plugin.get_loop_stats()
+
+    before, after = run(blocked_loop())
+    assert before["stalls"] == 0
+    assert before["max_ms"] < 250
+    assert after["stalls"] == 1
+    assert after["samples"] > before["samples"]
+    assert 500 <= after["max_ms"] < 1000
+    assert after["max_ever_ms"] == after["max_ms"]
+
+    # The watchdog points at the blocking call
+    (stack,) = [r.getMessage() for r in caplog.records if r.getMessage().startswith("Event loop blocked for over")]
+    assert "in block_the_loop" in stack
+    assert any(r.getMessage().startswith("Event loop was blocked for") for r in caplog.records)
+
+    # And the statistics are logged when the plugin unloads
+    run(LoopMonitor.stop())
+    assert "Event loop delay: {'samples'" in caplog.text
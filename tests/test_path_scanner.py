@@ -0,0 +1,40 @@
+import os
+
+import path_scanner
+from path_scanner import PathScanner
+
+
+def test_file_rewritten_in_place(run, tmp_path):
+    (tmp_path / "slot1").mkdir()
+    save = tmp_path / "slot1" / "save.dat"
+    save.write_bytes(b"save")
+    (tmp_path / "broken").symlink_to(tmp_path / "missing")
+    assert run(PathScanner.scan(str(tmp_path), True)) == {"files": 2, "bytes": 4, "truncated": False}
+
+    mtime_ns = os.stat(save.parent).st_mtime_ns
+    save.write_bytes(b"a much bigger save")
+    assert os.stat(save.parent).st_mtime_ns == mtime_ns
+    assert run(PathScanner.scan(str(tmp_path), True))["bytes"] == 18
+    assert run(PathScanner.scan(str(tmp_path), False)) == {"files": 1, "bytes": 0, "truncated": False}
+
+
+def test_limit(run, tmp_path):
+    for i in range(20):
+        (tmp_path / f"{i}.dat").write_bytes(b"save")
+    assert run(PathScanner.scan(str(tmp_path), True, 19))["truncated"]
+    assert not run(PathScanner.scan(str(tmp_path), True, 20))["truncated"]
+
+
+def test_syncpath_stops_past_the_limit(run, plugin, config, tmp_path, monkeypatch):
+    config("sync_root", [str(tmp_path)])
+    limits = list()
+    scan = PathScanner.scan
+
+    async def recording_scan(path, recursive, limit=path_scanner.SCAN_FILE_LIMIT):
+        limits.append(limit)
+        return await scan(path, recursive, limit)
+
+    monkeypatch.setattr(PathScanner, "scan", recording_scan)
+    (tmp_path / "save.dat").write_bytes(b"save")
+    assert run(plugin.test_syncpath(f"{tmp_path}/**")) == 1
+    assert limits == [9000]
@@ -0,0 +1,104 @@
+from pathlib import Path
+
+import pytest
+
+import process_control
+
+
+@pytest.fixture
+def cgroups(tmp_path, monkeypatch) -> dict:
+    """
+    A fake cgroup hierarchy: the game (pid 10) with two children, all in the "game" cgroup.
+    Moves are recorded in "moves", pids listed in "stuck" cannot be moved.
+    """
+    game = tmp_path / "game"
+    game.mkdir()
+    (game / "cgroup.freeze").write_text("0")
+    state = {
+        "tree": [10, 11, 12],
+        "cgroups": {pid: game for pid in (10, 11, 12)},
+        "stuck": set(),
+        "moves": list(),
+        "game": game,
+        "freezer": tmp_path / "game-sync-freeze-10",
+    }
+
+    def move_to_cgroup(pid: int, cgroup: Path) -> bool:
+        if pid in state["stuck"] and cgroup == state["freezer"]:
+            return False
+        state["moves"].append((pid, cgroup))
+        state["cgroups"][pid] = cgroup
+        cgroup.mkdir(exist_ok=True)
+        (cgroup / "cgroup.events").write_text("populated 1\nfrozen 1\n")
+        (cgroup / "cgroup.procs").write_text(
+            "\n".join(str(p) for p, c in state["cgroups"].items() if c == cgroup)
+        )
+        return True
+
+    monkeypatch.setattr(process_control, "get_process_tree", lambda pid: list(state["tree"]))
+    monkeypatch.setattr(process_control, "_get_cgroup", lambda pid: state["cgroups"].get(pid))
+    monkeypatch.setattr(process_control, "_move_to_cgroup", move_to_cgroup)
+    return state
+
+
+def test_freeze_and_thaw(cgroups):
+    assert process_control._freeze(10)
+    assert set(cgroups["cgroups"].values()) == {cgroups["freezer"]}
+    assert (cgroups["freezer"] / "cgroup.freeze").read_text() == "1"
+
+    process_control._thaw(10)
+    assert set(cgroups["cgroups"].values()) == {cgroups["game"]}
+    assert 10 not in process_control._frozen_trees
+
+
+def test_freeze_fails_if_the_root_stays_behind(cgroups):
+    cgroups["stuck"].add(10)
+    assert not process_control._freeze(10)
+    assert set(cgroups["cgroups"].values()) == {cgroups["game"]}
+    assert 10 not in process_control._frozen_trees
+
+
+def test_freeze_fails_if_a_child_stays_behind(cgroups):
+    cgroups["stuck"].add(12)
+    assert not process_control._freeze(10)
+    assert set(cgroups["cgroups"].values()) == {cgroups["game"]}
+    assert 10 not in process_control._frozen_trees
+
+
+def test_freeze_moves_children_forked_while_moving(cgroups, monkeypatch):
+    move_to_cgroup = process_control._move_to_cgroup
+
+    def forking_move(pid: int, cgroup: Path) -> bool:
+        # The game forks a child into its original cgroup right before it's moved
+        if pid == 10 and 13 not in cgroups["tree"]:
+            cgroups["tree"].append(13)
+            cgroups["cgroups"][13] = cgroups["game"]
+        return move_to_cgroup(pid, cgroup)
+
+    monkeypatch.setattr(process_control, "_move_to_cgroup", forking_move)
+    assert process_control._freeze(10)
+    assert cgroups["cgroups"][13] == cgroups["freezer"]
+    process_control._thaw(10)
+
+
+def test_pause_twice(cgroups, config):
+    config("cgroup_freezer", True)
+    process_control.pause(10)
+    process_control.pause(10)
+    assert set(cgroups["cgroups"].values()) == {cgroups["freezer"]}
+    assert (cgroups["freezer"] / "cgroup.freeze").read_text() == "1"
+
+    process_control.resume(10)
+    assert set(cgroups["cgroups"].values()) == {cgroups["game"]}
+    assert 10 not in process_control._frozen_trees
+
+
+def test_pause_falls_back_to_sigstop(cgroups, config, monkeypatch):
+    config("cgroup_freezer", True)
+    cgroups["stuck"].add(12)
+    signals = list()
+    monkeypatch.setattr(process_control, "_signal_tree", lambda pid, sig: signals.append(sig))
+    process_control.pause(10)
+    assert signals == [process_control.signal.SIGSTOP]
+    process_control.resume(10)
+    assert signals == [process_control.signal.SIGSTOP, process_control.signal.SIGCONT]
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+from packaging.version import Version
+
+import rclone_capabilities
+from common_defs import DEFAULT_VERSION
+from rclone_capabilities import RcloneCapabilities
+
+FAKE_RCLONE = """#!/bin/sh
+echo "$@" >> "{calls}"
+case "$1" in
+  --version) echo "rclone v{version}" ;;
+  help) if [ "$2" = flags ]; then echo "      --fast-list   Use recursive list"; else
+        printf 'Available commands:\\n  bisync   Perform bidirectional sync\\n  rcd   Run rclone listening\\n'; fi ;;
+  bisync) echo "      --resilient   Allow future runs to retry" ;;
+esac
+"""
+
+
+@pytest.fixture
+def fake_rclone(tmp_path, monkeypatch):
+    """
+    Installs a fake rclone binary under tmp_path, returning a function that replaces it.
+    """
+    bin_path = tmp_path / "rclone"
+    calls = tmp_path / "calls"
+    monkeypatch.setattr(rclone_capabilities, "RCLONE_BIN_PATH", bin_path)
+    monkeypatch.setattr(rclone_capabilities, "RCLONE_CAPABILITIES_PATH", tmp_path / "rclone_capabilities.json")
+    monkeypatch.setattr(RcloneCapabilities, "_capabilities", None)
+
+    def install(version: str, in_place: bool = False):
+        new_path = bin_path if in_place else tmp_path / "rclone.new"
+        new_path.write_text(FAKE_RCLONE.format(calls=calls, version=version))
+        new_path.chmod(0o755)
+        new_path.replace(bin_path)
+        calls.write_text("")
+
+    def get_calls() -> list[str]:
+        return calls.read_text().splitlines()
+
+    install.get_calls = get_calls
+    return install
+
+
+def test_probed_once(run, fake_rclone):
+    fake_rclone("1.60.0")
+    capabilities = run(RcloneCapabilities.get())
+    assert capabilities["version"] == "1.60.0"
+    assert capabilities["commands"] == ["bisync", "rcd"]
+    assert capabilities["flags"] == ["--fast-list"]
+    assert capabilities["bisync_flags"] == ["--resilient"]
+    assert len(fake_rclone.get_calls()) == 4
+
+    assert run(RcloneCapabilities.has_command("rcd"))
+    assert not run(RcloneCapabilities.has_command("serve"))
+    assert run(RcloneCapabilities.has_flag("--resilient", bisync=True))
+    assert not run(RcloneCapabilities.has_flag("--resilient"))
+    # Kept in memory, then on disk across restarts
+    RcloneCapabilities._capabilities = None
+    assert run(RcloneCapabilities.get_version()) == Version("1.60.0")
+    assert len(fake_rclone.get_calls()) == 4
+
+
+def test_probed_again_when_swapped(run, fake_rclone):
+    fake_rclone("1.60.0")
+    assert run(RcloneCapabilities.get_version()) == Version("1.60.0")
+
+    # A different size
+    fake_rclone("1.61.10")
+    assert run(RcloneCapabilities.get_version()) == Version("1.61.10")
+    assert len(fake_rclone.get_calls()) == 4
+
+    # The same size and inode, only the modification time changed
+    st = rclone_capabilities.RCLONE_BIN_PATH.stat()
+    fake_rclone("1.61.11", in_place=True)
+    os.utime(rclone_capabilities.RCLONE_BIN_PATH, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    new_st = rclone_capabilities.RCLONE_BIN_PATH.stat()
+    assert (new_st.st_size, new_st.st_ino) == (st.st_size, st.st_ino)
+    assert run(RcloneCapabilities.get_version()) == Version("1.61.11")
+    assert len(fake_rclone.get_calls()) == 4
+
+    # Missing
+    rclone_capabilities.RCLONE_BIN_PATH.unlink()
+    assert run(RcloneCapabilities.get_version()) == DEFAULT_VERSION
+    assert run(RcloneCapabilities.has_command("rcd"))
@@ -0,0 +1,167 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gzip, hashlib, io, logging, threading, zipfile
+
+import pytest
+from packaging.version import Version
+
+import rclone_manager
+from common_defs import logger
+from rclone_manager import RcloneManager
+from sync_target import get_sync_target
+
+
+@pytest.fixture
+def log_level():
+    """
+    Sets the level of the plugin logger for a test, restoring it afterwards.
+    """
+    previous = logger.level
+    yield logger.setLevel
+    logger.setLevel(previous)
+
+
+@pytest.mark.rclone
+@pytest.mark.parametrize(
+    "level, expected, unexpected",
+    [
+        (logging.DEBUG, ["save.dat: Copied (new)", "Unchanged skipping"], []),
+        (logging.INFO, ["save.dat: Copied (new)"], ["Unchanged skipping"]),
+        (logging.ERROR, [], ["save.dat: Copied (new)"]),
+    ],
+    ids=["debug", "info", "error"],
+)
+def test_daemon_job_output_in_the_sync_log(run, plugin, game, log_level, level, expected, unexpected):
+    assert RcloneManager.daemon_available()
+    log_level(level)
+    (game["save_dir"] / "other.dat").write_bytes(b"other")
+    run(plugin.set_target_filters(game["app_id"], game["filters"]))
+    assert run(plugin.sync_local_first(game["app_id"])) == 0
+    (game["save_dir"] / "save.dat").write_bytes(b"save")
+    assert run(plugin.sync_local_first(game["app_id"])) == 0
+
+    sync_log = get_sync_target(game["app_id"]).get_last_log_path().read_text()
+    for text in expected:
+        assert text in sync_log
+    for text in unexpected:
+        assert text not in sync_log
+    # Followed by the summary of the job
+    assert "rc job" in sync_log
+
+
+@pytest.mark.rclone
+def test_daemon_log_rotated(run, plugin, monkeypatch):
+    log_dir = rclone_manager.RCLONE_RC_LOG_PATH.parent
+    for old_log in log_dir.glob("rclone-rcd *"):
+        old_log.unlink()
+
+    # On restart
+    rclone_manager.RCLONE_RC_LOG_PATH.write_text("previous daemon\n")
+    assert run(RcloneManager.start_daemon())
+    (rotated,) = log_dir.glob("rclone-rcd *.log.gz")
+    assert gzip.decompress(rotated.read_bytes()) == b"previous daemon\n"
+    rotated.unlink()
+
+    # Once too big while the daemon runs, the daemon goes on logging to the same file
+    monkeypatch.setattr(rclone_manager, "RCLONE_RC_LOG_MAX_SIZE", 0)
+    run(RcloneManager.rc_job("rc/noop", {}, log_level="DEBUG"))
+    (rotated,) = log_dir.glob("rclone-rcd *.log.gz")
+    assert b"rc/noop" in gzip.decompress(rotated.read_bytes())
+    assert rclone_manager.RCLONE_RC_LOG_PATH.stat().st_size == 0
+    monkeypatch.undo()
+    run(RcloneManager.rc_job("rc/noop", {}))
+    assert b"rc/noop" in rclone_manager.RCLONE_RC_LOG_PATH.read_bytes()
+    assert not rclone_manager.RCLONE_RC_LOG_PATH.read_bytes().startswith(b"\0")
+
+
+class _ReleaseHandler(BaseHTTPRequestHandler):
+    """
+    Serves the files of a fake rclone release, cutting off the ones listed as truncated.
+    """
+
+    files: dict[str, bytes] = dict()
+    truncated: set[str] = set()
+
+    def do_GET(self):
+        content = self.files.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content[: len(content) // 2] if self.path in self.truncated else content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def release(config, monkeypatch, tmp_path):
+    """
+    A fake release of rclone 99.0.0 on a local HTTP server, replacing a binary under tmp_path.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ReleaseHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config("rclone_download_url", f"http://127.0.0.1:{server.server_port}/")
+    config("rclone_arch", "amd64")
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("rclone-v99.0.0-linux-amd64/README.txt", "readme")
+        zip_file.writestr("rclone-v99.0.0-linux-amd64/rclone", "new rclone")
+    zip_name = "rclone-v99.0.0-linux-amd64.zip"
+    _ReleaseHandler.files = {
+        "/version.txt": b"rclone v99.0.0\n",
+        "/v99.0.0/SHA256SUMS": (
+            "-----BEGIN PGP SIGNED MESSAGE-----\n\n"
+            f"{hashlib.sha256(archive.getvalue()).hexdigest()}  {zip_name}\n"
+        ).encode(),
+        f"/v99.0.0/{zip_name}": archive.getvalue(),
+    }
+    _ReleaseHandler.truncated = set()
+
+    bin_path = tmp_path / "rclone"
+    bin_path.write_text("old rclone")
+
+    async def get_current_rclone_version():
+        return Version("1.0.0")
+
+    monkeypatch.setattr(rclone_manager, "RCLONE_BIN_PATH", bin_path)
+    monkeypatch.setattr(RcloneManager, "_get_current_rclone_version", get_current_rclone_version)
+    yield {"handler": _ReleaseHandler, "zip_path": f"/v99.0.0/{zip_name}", "bin_path": bin_path}
+    server.shutdown()
+    server.server_close()
+
+
+def test_update(run, release):
+    inode = release["bin_path"].stat().st_ino
+    assert run(RcloneManager.update_rclone())
+    assert release["bin_path"].read_text() == "new rclone"
+    # Swapped in by a rename, never written in place
+    assert release["bin_path"].stat().st_ino != inode
+    assert release["bin_path"].stat().st_mode & 0o777 == 0o755
+    assert sorted(path.name for path in release["bin_path"].parent.iterdir()) == ["rclone"]
+
+
+def test_update_checksum_mismatch(run, release):
+    release["handler"].files[release["zip_path"]] += b"tampered"
+    with pytest.raises(Exception, match="Checksum mismatch"):
+        run(RcloneManager.update_rclone())
+    assert release["bin_path"].read_text() == "old rclone"
+    assert sorted(path.name for path in release["bin_path"].parent.iterdir()) == ["rclone"]
+
+
+def test_update_truncated_download(run, release):
+    release["handler"].truncated.add(release["zip_path"])
+    with pytest.raises(Exception):
+        run(RcloneManager.update_rclone())
+    assert release["bin_path"].read_text() == "old rclone"
+    assert sorted(path.name for path in release["bin_path"].parent.iterdir()) == ["rclone"]
+
+
+def test_update_error_returned_to_the_frontend(run, plugin, release):
+    release["handler"].files[release["zip_path"]] += b"tampered"
+    result = run(plugin.update_rclone())
+    assert not result["updated"]
+    assert "Checksum mismatch" in result["error"]
+    assert release["bin_path"].read_text() == "old rclone"
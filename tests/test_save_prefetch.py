@@ -0,0 +1,57 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from save_prefetch import find_outdated_files, move_staged_files
+
+MTIME = 1700000000
+
+
+def rfc3339(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+@pytest.fixture
+def save_dir(tmp_path):
+    save_dir = tmp_path / "saves"
+    (save_dir / "slot1").mkdir(parents=True)
+    for path in ("save.dat", "slot1/save.dat"):
+        (save_dir / path).write_bytes(b"save")
+        os.utime(save_dir / path, (MTIME, MTIME))
+    return save_dir
+
+
+def test_find_outdated_files(save_dir):
+    assert find_outdated_files(str(save_dir), {}) == []
+    assert find_outdated_files(
+        str(save_dir),
+        {
+            "save.dat": (4, rfc3339(MTIME)),
+            "slot1/save.dat": (4, rfc3339(MTIME + 0.5)),
+        },
+    ) == []
+    assert find_outdated_files(
+        str(save_dir),
+        {
+            "save.dat": (5, rfc3339(MTIME)),
+            "slot1/save.dat": (4, rfc3339(MTIME + 2)),
+            "slot2/save.dat": (4, rfc3339(MTIME)),
+        },
+    ) == ["save.dat", "slot1/save.dat", "slot2/save.dat"]
+
+
+def test_find_outdated_files_malformed_time(save_dir):
+    with pytest.raises(ValueError):
+        find_outdated_files(str(save_dir), {"save.dat": (4, "yesterday")})
+
+
+def test_move_staged_files(save_dir, tmp_path):
+    staging_dir = tmp_path / "staging"
+    (staging_dir / "slot2").mkdir(parents=True)
+    (staging_dir / "save.dat").write_bytes(b"cloud")
+    (staging_dir / "slot2" / "save.dat").write_bytes(b"cloud")
+    move_staged_files(staging_dir, str(save_dir), ["save.dat", "slot2/save.dat"])
+    assert (save_dir / "save.dat").read_bytes() == b"cloud"
+    assert (save_dir / "slot2" / "save.dat").read_bytes() == b"cloud"
+    assert not (staging_dir / "save.dat").exists()
@@ -0,0 +1,140 @@
+from pathlib import Path
+import hashlib, json, os, random
+
+import pytest
+
+import harness
+from snapshot_store import CHUNK_MAX_SIZE, CHUNK_MIN_SIZE, SnapshotStore, chunk_file
+
+
+def list_files(root: Path) -> dict[str, tuple[int, int]]:
+    files = dict()
+    for path in root.rglob("*"):
+        if path.is_file():
+            st = path.stat()
+            files[str(path.relative_to(root))] = (st.st_size, st.st_mtime_ns)
+    return files
+
+
+def test_chunk_file(tmp_path):
+    data = random.Random(1).randbytes(3 * 1024 * 1024 + 7)
+    path = tmp_path / "data.bin"
+    path.write_bytes(data)
+
+    staging_dir = tmp_path / "staging"
+    known = set()
+    chunks = chunk_file(str(path), staging_dir, known)
+    assert sum(size for _, size in chunks) == len(data)
+    assert all(CHUNK_MIN_SIZE <= size <= CHUNK_MAX_SIZE for _, size in chunks[:-1])
+    assert known == {digest for digest, _ in chunks}
+    rebuilt = b"".join((staging_dir / digest[:2] / digest).read_bytes() for digest, _ in chunks)
+    assert rebuilt == data
+    assert chunk_file(str(path)) == chunks
+
+
+def test_chunk_file_insertion(tmp_path):
+    data = random.Random(2).randbytes(2 * 1024 * 1024)
+    path = tmp_path / "data.bin"
+    path.write_bytes(data)
+    before = chunk_file(str(path))
+
+    path.write_bytes(data[: len(data) // 2] + b"inserted" + data[len(data) // 2 :])
+    after = chunk_file(str(path))
+    # Only the chunks around the insertion change
+    assert len({digest for digest, _ in after} - {digest for digest, _ in before}) <= 2
+
+
+def test_chunk_file_small_and_empty(tmp_path):
+    empty = tmp_path / "empty"
+    empty.write_bytes(b"")
+    assert chunk_file(str(empty)) == []
+
+    small = tmp_path / "small"
+    small.write_bytes(b"save")
+    assert chunk_file(str(small)) == [[hashlib.sha256(b"save").hexdigest(), 4]]
+
+
+@pytest.fixture
+def store_dirs(tmp_path) -> dict[str, Path]:
+    dirs = {name: tmp_path / name for name in ("local", "restored", "chunks", "snapshots", "state")}
+    for path in dirs.values():
+        path.mkdir()
+    return dirs
+
+
+def make_store(dirs: dict[str, Path], local: str) -> SnapshotStore:
+    return SnapshotStore(
+        "1234",
+        str(dirs[local]),
+        str(dirs["chunks"]),
+        str(dirs["snapshots"]),
+        dirs["state"] / f"{local}.snapshot.json",
+        dirs["state"] / f"{local}-staging",
+    )
+
+
+@pytest.mark.rclone
+def test_round_trip(run, plugin, store_dirs):
+    local = store_dirs["local"]
+    harness.make_tiny_files(local, count=50, size=4096)
+    harness.make_huge_files(local / "cards", count=1, size=1024 * 1024)
+    store = make_store(store_dirs, "local")
+
+    stats = run(store.upload(list_files(local)))
+    assert stats["exit_code"] == 0
+    assert stats["changed_files"] == 51
+    assert run(store.upload(list_files(local)))["changed_files"] == 0
+
+    card = local / "cards" / "card0.mcd"
+    data = card.read_bytes()
+    card.write_bytes(data[:4096] + b"changed" + data[4096:])
+    (local / "slot000" / "save00000.dat").unlink()
+    (local / "slot000" / "new.dat").write_bytes(b"new save")
+    stats = run(store.upload(list_files(local)))
+    assert stats["exit_code"] == 0
+    assert stats["changed_files"] == 2
+    # The card shares most of its chunks with the previous snapshot
+    assert stats["new_chunks"] < stats["chunks"] // 4
+
+    restored = store_dirs["restored"]
+    (restored / "stale.dat").write_bytes(b"not in the snapshot")
+    stats = run(make_store(store_dirs, "restored").restore(list_files(restored), delete_missing=True))
+    assert stats["exit_code"] == 0
+    assert stats["deleted_files"] == 1
+    assert harness.list_tree(restored) == harness.list_tree(local)
+    for path, (size, mtime_ns) in list_files(local).items():
+        assert os.stat(restored / path).st_mtime_ns == mtime_ns
+
+
+@pytest.mark.rclone
+def test_mirror_marker(run, plugin, store_dirs):
+    harness.make_tiny_files(store_dirs["local"], count=5)
+    store = make_store(store_dirs, "local")
+    assert run(store.upload(list_files(store_dirs["local"])))["exit_code"] == 0
+
+    assert run(store.upload_mirror_marker()) == 0
+    assert json.loads((store_dirs["snapshots"] / "latest.json").read_text())["mirror"]
+    assert run(make_store(store_dirs, "restored").restore({})) is None
+
+
+@pytest.mark.rclone
+def test_big_files_go_through_the_mirror(run, plugin, game, config, monkeypatch):
+    import sync_target
+
+    config("snapshot_store", True)
+    monkeypatch.setattr(sync_target, "CHUNK_FILE_MAX_SIZE", 64 * 1024)
+    run(plugin.set_target_filters(game["app_id"], game["filters"]))
+    harness.make_huge_files(game["save_dir"], count=1, size=32 * 1024)
+    assert run(plugin.sync_local_first(game["app_id"])) == 0
+    assert not game["cloud_dir"].exists()
+
+    # Restores must not go back to the snapshot once the files are in the mirror
+    harness.make_huge_files(game["save_dir"], count=1, size=128 * 1024)
+    expected = harness.list_tree(game["save_dir"])
+    assert run(plugin.sync_local_first(game["app_id"])) == 0
+    assert harness.list_tree(game["cloud_dir"]) == expected
+
+    for path in game["save_dir"].iterdir():
+        path.unlink()
+    assert run(plugin.sync_cloud_first(game["app_id"])) == 0
+    assert harness.list_tree(game["save_dir"]) == expected
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+import sqlite3, time
+
+import pytest
+
+import sync_history
+from sync_history import SyncHistory
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    """
+    The sync history in a database of its own.
+    """
+    SyncHistory.close()
+    monkeypatch.setattr(sync_history, "SYNC_HISTORY_PATH", tmp_path / "sync_history.sqlite3")
+    yield tmp_path / "sync_history.sqlite3"
+    SyncHistory.close()
+
+
+def make_run(target: str = "1000", start: float | None = None, duration: float = 1.0, **columns) -> dict:
+    start = time.time() if start is None else start
+    return {
+        "target": target,
+        "mode": "copy",
+        "winner": "path1",
+        "execution": "daemon",
+        "rclone_version": "1.75.1",
+        "profile": "default",
+        "start": start,
+        "end": start + duration,
+        "duration": duration,
+        "files": 1,
+        "bytes": 100,
+        "exit_code": 0,
+        **columns,
+    }
+
+
+def test_migrates_databases_without_profiles(run, history):
+    connection = sqlite3.connect(history)
+    connection.execute(
+        "CREATE TABLE runs (id INTEGER PRIMARY KEY, target TEXT NOT NULL, mode TEXT NOT NULL,"
+        " winner TEXT NOT NULL, execution TEXT NOT NULL, rclone_version TEXT, start REAL NOT NULL,"
+        " end REAL NOT NULL, duration REAL NOT NULL, spawn_seconds REAL, list_seconds REAL,"
+        " transfer_seconds REAL, files INTEGER, bytes INTEGER, exit_code INTEGER NOT NULL)"
+    )
+    old_run = make_run(target="old")
+    del old_run["profile"]
+    connection.execute(
+        f"INSERT INTO runs ({', '.join(old_run)}) VALUES ({', '.join('?' * len(old_run))})",
+        tuple(old_run.values()),
+    )
+    connection.commit()
+    connection.close()
+
+    run(SyncHistory.record(make_run(target="new", profile="small_files")))
+    runs = {row["target"]: row for row in run(SyncHistory.get_runs())}
+    assert runs["old"]["profile"] is None
+    assert runs["new"]["profile"] == "small_files"
+
+
+def test_prunes_old_runs(run, history, config, monkeypatch):
+    config("sync_history_days", 1)
+    monkeypatch.setattr(sync_history, "SYNC_HISTORY_PRUNE_INTERVAL", 2)
+    monkeypatch.setattr(SyncHistory, "_inserts", 0)
+    run(SyncHistory.record(make_run(target="recent")))
+    run(SyncHistory.record(make_run(target="expired", start=time.time() - 2 * 86400)))
+    assert [row["target"] for row in run(SyncHistory.get_runs())] == ["recent"]
+
+    # Also when the database is opened
+    run(SyncHistory.record(make_run(target="expired", start=time.time() - 2 * 86400)))
+    SyncHistory.close()
+    assert [row["target"] for row in run(SyncHistory.get_runs())] == ["recent"]
+
+
+def test_duration_stats(run, history):
+    for duration in range(20, 0, -1):
+        failed = int(duration == 3)
+        run(SyncHistory.record(make_run(target="slow", duration=float(duration), exit_code=failed)))
+    run(SyncHistory.record(make_run(target="fast", duration=0.5, execution="subprocess")))
+
+    slow, fast = run(SyncHistory.get_duration_stats())
+    assert slow["group"] == "slow"
+    assert (slow["runs"], slow["failures"]) == (20, 1)
+    assert (slow["p50_seconds"], slow["p95_seconds"], slow["max_seconds"]) == (11.0, 20.0, 20.0)
+    assert (slow["files"], slow["bytes"]) == (20, 2000)
+    assert (fast["p50_seconds"], fast["p95_seconds"], fast["max_seconds"]) == (0.5, 0.5, 0.5)
+
+    by_execution = run(SyncHistory.get_duration_stats(group_by="execution"))
+    assert [group["group"] for group in by_execution] == ["daemon", "subprocess"]
+
+
+def test_duration_stats_grouped_by_columns_only(run, history):
+    with pytest.raises(ValueError):
+        run(SyncHistory.get_duration_stats(group_by="target; DROP TABLE runs"))
+    with pytest.raises(ValueError):
+        SyncHistory._query_duration_stats(30, "target; DROP TABLE runs")
+
+
+def test_daily_bytes(run, history):
+    noon = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    for days_ago, files, bytes in ((2, 1, 100), (1, 2, 200), (1, 3, 300), (40, 4, 400)):
+        start = (noon - timedelta(days=days_ago)).timestamp()
+        run(SyncHistory.record(make_run(start=start, files=files, bytes=bytes)))
+
+    assert run(SyncHistory.get_daily_bytes()) == [
+        {"day": (noon - timedelta(days=2)).strftime("%Y-%m-%d"), "runs": 1, "files": 1, "bytes": 100},
+        {"day": (noon - timedelta(days=1)).strftime("%Y-%m-%d"), "runs": 2, "files": 5, "bytes": 500},
+    ]
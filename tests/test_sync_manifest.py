@@ -0,0 +1,73 @@
+import os
+
+from sync_manifest import SyncManifest
+
+
+def make_state_dir(tmp_path):
+    # Away from the parent of the roots, whose signature is recorded too
+    state_dir = tmp_path / "state"
+    state_dir.mkdir()
+    return state_dir
+
+
+def test_get_filter_roots():
+    assert SyncManifest.get_filter_roots(
+        ["# comment", "- *.bak", "+ /1000/**", "+ /home/deck/save.dat", "+ /1001/slot*/x"], "/saves"
+    ) == ["/saves/1000", "/saves/home/deck/save.dat", "/saves/1001"]
+    # Unanchored includes may match anywhere
+    assert SyncManifest.get_filter_roots(["+ *.sav"], "/saves") is None
+
+
+def test_get_fingerprint(tmp_path):
+    filter_file = tmp_path / "1000.filter"
+    filter_file.write_text("+ /1000/**\n")
+    fingerprint = SyncManifest.get_fingerprint("copy", "/saves", filter_file)
+    assert SyncManifest.get_fingerprint("copy", "/saves", filter_file) == fingerprint
+    assert SyncManifest.get_fingerprint("sync", "/saves", filter_file) != fingerprint
+    filter_file.write_text("+ /1001/**\n")
+    assert SyncManifest.get_fingerprint("copy", "/saves", filter_file) != fingerprint
+
+
+def test_is_unchanged(tmp_path):
+    save_dir = tmp_path / "saves" / "1000"
+    (save_dir / "slot1").mkdir(parents=True)
+    save = save_dir / "slot1" / "save.dat"
+    save.write_bytes(b"save")
+    manifest = SyncManifest(make_state_dir(tmp_path) / "1000.manifest")
+    assert not manifest.is_unchanged("fingerprint")
+
+    manifest.save(SyncManifest.snapshot([str(save_dir)]), "fingerprint")
+    assert manifest.is_unchanged("fingerprint")
+    assert not manifest.is_unchanged("other")
+
+    st = save.stat()
+    save.write_bytes(b"SAVE")
+    os.utime(save, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    assert not manifest.is_unchanged("fingerprint")
+
+    manifest.save(SyncManifest.snapshot([str(save_dir)]), "fingerprint")
+    (save_dir / "slot2").mkdir()
+    assert not manifest.is_unchanged("fingerprint")
+
+    manifest.clear()
+    assert not manifest.is_unchanged("fingerprint")
+
+
+def test_missing_root_created_later(tmp_path):
+    manifest = SyncManifest(make_state_dir(tmp_path) / "1000.manifest")
+    root = tmp_path / "saves" / "1000"
+    root.parent.mkdir()
+    manifest.save(SyncManifest.snapshot([str(root)]), "fingerprint")
+    assert manifest.is_unchanged("fingerprint")
+    root.mkdir()
+    assert not manifest.is_unchanged("fingerprint")
+
+
+def test_symlink_loops(tmp_path):
+    root = tmp_path / "1000"
+    root.mkdir()
+    (root / "save.dat").write_bytes(b"save")
+    (root / "loop").symlink_to(root)
+    entries = SyncManifest.snapshot([str(root)])
+    assert str(root / "save.dat") in entries
+    assert str(root / "loop" / "loop") not in entries
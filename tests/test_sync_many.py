@@ -0,0 +1,57 @@
+import shutil
+
+import pytest
+
+import harness
+from rclone_manager import RcloneManager
+
+pytestmark = pytest.mark.rclone
+
+
+@pytest.fixture
+def listings(monkeypatch) -> list[str]:
+    """
+    Records the paths of the cloud listed.
+    """
+    listings = list()
+    list_remote_files = RcloneManager.list_remote_files
+
+    async def recording_list_remote_files(fs):
+        listings.append(fs)
+        return await list_remote_files(fs)
+
+    monkeypatch.setattr(RcloneManager, "list_remote_files", recording_list_remote_files)
+    return listings
+
+
+def test_batch_shares_one_listing(run, plugin, game, config, listings, caplog):
+    config("save_prefetch", False)
+    # Other games on the same cloud destination, one with nothing uploaded yet
+    app_ids = [game["app_id"], 990001, 990002, 990003]
+    for app_id in app_ids:
+        (harness.SAVES_DIR / str(app_id)).mkdir(exist_ok=True)
+        run(plugin.set_target_filters(app_id, [f"+ /{app_id}/**"]))
+    for app_id in app_ids[:3]:
+        harness.make_tiny_files(harness.SAVES_DIR / str(app_id), count=20 + app_id % 7)
+
+    assert run(plugin.sync_many_local_first(app_ids)) == {app_id: 0 for app_id in app_ids}
+    assert listings == []
+    expected = {app_id: harness.list_tree(harness.SAVES_DIR / str(app_id)) for app_id in app_ids}
+    for app_id in app_ids[:3]:
+        assert harness.list_tree(game["cloud_dir"].parent / str(app_id)) == expected[app_id]
+
+    for app_id in app_ids:
+        shutil.rmtree(harness.SAVES_DIR / str(app_id))
+    caplog.clear()
+    assert run(plugin.sync_many_cloud_first(app_ids)) == {app_id: 0 for app_id in app_ids}
+    assert listings == [f"cloud:dest-{game['app_id']}"]
+    # The games download the files picked from the listing, the one without any is skipped
+    assert caplog.text.count("FilesFromRaw") + caplog.text.count("--files-from-raw") == 3
+    assert f'No files of "{app_ids[3]}" in the cloud' in caplog.text
+    for app_id in app_ids[:3]:
+        assert harness.list_tree(harness.SAVES_DIR / str(app_id)) == expected[app_id]
+    assert not (harness.SAVES_DIR / str(app_ids[3])).exists()
+
+    for app_id in app_ids[1:]:
+        run(plugin.set_target_filters(app_id, []))
+        shutil.rmtree(harness.SAVES_DIR / str(app_id), ignore_errors=True)
@@ -0,0 +1,52 @@
+import decky
+import pytest
+
+import harness
+from rclone_manager import RcloneManager
+
+pytestmark = pytest.mark.rclone
+
+SIZE = 24 * 1024 * 1024
+
+
+@pytest.fixture(params=["daemon", "subprocess"])
+def slow_sync(request, run, plugin, config, monkeypatch):
+    """
+    Limits the bandwidth of the syncs so that they last a few seconds, through the rc daemon or
+    the arguments of the rclone process.
+    """
+    if request.param == "daemon":
+        assert RcloneManager.daemon_available()
+        run(RcloneManager.rc_call("core/bwlimit", {"rate": "8M"}))
+        yield
+        run(RcloneManager.rc_call("core/bwlimit", {"rate": "off"}))
+    else:
+        monkeypatch.setattr(RcloneManager, "daemon_available", classmethod(lambda cls: False))
+        config("additional_sync_args", ["--bwlimit", "8M"])
+        yield
+
+
+def test_progress_events(run, plugin, game, slow_sync):
+    harness.make_huge_files(game["save_dir"], count=1, size=SIZE)
+    run(plugin.set_target_filters(game["app_id"], game["filters"]))
+
+    decky.emitted.clear()
+    assert run(plugin.sync_local_first(game["app_id"])) == 0
+    events = [
+        args[1] for event, args in decky.emitted if event == "sync_progress" and args[0] == str(game["app_id"])
+    ]
+
+    # Reset as the sync starts
+    assert events[0] == {"finished": False, "exit_code": None}
+    # Then updated while the file transfers
+    running = [progress for progress in events[1:-1] if 0 < progress.get("bytes", 0) < SIZE]
+    assert running
+    assert all(not progress["finished"] for progress in running)
+    assert all(progress["total_bytes"] == SIZE for progress in running)
+    assert [progress["bytes"] for progress in running] == sorted(progress["bytes"] for progress in running)
+    # And complete once it finished
+    assert events[-1]["finished"]
+    assert events[-1]["exit_code"] == 0
+    assert events[-1]["bytes"] == SIZE
+    assert events[-1]["transfers"] == 1
+    assert run(plugin.get_sync_progress(game["app_id"])) == events[-1]
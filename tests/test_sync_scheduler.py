@@ -0,0 +1,191 @@
+import asyncio
+
+from common_defs import RcloneSyncWinner, SyncPriority
+from sync_target import GameSyncTarget, SyncScheduler
+
+
+def make_task(result: int, log: list[str] | None = None, name: str = "", delay: float = 0):
+    async def sync_task() -> int:
+        if log is not None:
+            log.append(name)
+        await asyncio.sleep(delay)
+        return result
+
+    return sync_task
+
+
+def test_cancel_right_after_submit(run):
+    async def scenario():
+        started = list()
+        submitted = asyncio.create_task(
+            SyncScheduler.submit("42", "path1", SyncPriority.GAME_UPLOAD, make_task(0, started))
+        )
+        # The job is dispatched, but its task didn't get to run yet
+        await asyncio.sleep(0)
+        assert SyncScheduler.cancel("42") == 1
+        assert await asyncio.wait_for(submitted, 1) == -1
+        assert not started
+        assert "42" not in SyncScheduler.get_stats()["running"]
+
+        # The target is free for the next sync
+        result = SyncScheduler.submit("42", "path1", SyncPriority.GAME_UPLOAD, make_task(0))
+        assert await asyncio.wait_for(result, 1) == 0
+
+    run(scenario())
+
+
+def test_cancel_running_sync(run):
+    async def scenario():
+        submitted = asyncio.create_task(
+            SyncScheduler.submit("43", "path1", SyncPriority.GAME_UPLOAD, make_task(0, delay=10))
+        )
+        await asyncio.sleep(0.05)
+        assert SyncScheduler.get_stats()["running"] == ["43"]
+        assert SyncScheduler.cancel("43") == 1
+        assert await asyncio.wait_for(submitted, 1) == -1
+        assert SyncScheduler.get_stats()["running"] == []
+
+    run(scenario())
+
+
+def test_waiting_requests_are_coalesced(run):
+    async def scenario():
+        log = list()
+        running = asyncio.create_task(
+            SyncScheduler.submit("44", "path1", SyncPriority.GAME_UPLOAD, make_task(0, log, "first", 0.05))
+        )
+        await asyncio.sleep(0)
+        followups = [
+            SyncScheduler.submit("44", "path1", SyncPriority.GAME_UPLOAD, make_task(i, log, f"followup{i}"))
+            for i in (1, 2, 3)
+        ]
+        results = await asyncio.wait_for(asyncio.gather(running, *followups), 1)
+        # The first waiting request runs its task for the others
+        assert log == ["first", "followup1"]
+        assert results == [0, 1, 1, 1]
+
+    run(scenario())
+
+
+def test_game_syncs_pausing_other_processes_are_not_coalesced(run, game, monkeypatch):
+    paused = list()
+
+    async def recording_execute(self, winner, extra_args=[]):
+        paused.append(self._pause_pid)
+        await asyncio.sleep(0.05)
+        return 0
+
+    monkeypatch.setattr(GameSyncTarget, "_rclone_execute", recording_execute)
+
+    async def scenario():
+        running = asyncio.create_task(GameSyncTarget(game["app_id"]).sync(RcloneSyncWinner.LOCAL))
+        await asyncio.sleep(0)
+        waiting = [
+            GameSyncTarget(game["app_id"]).sync(RcloneSyncWinner.LOCAL),
+            GameSyncTarget(game["app_id"]).sync(RcloneSyncWinner.LOCAL, 4242),
+            GameSyncTarget(game["app_id"]).sync(RcloneSyncWinner.LOCAL, 4242),
+        ]
+        assert await asyncio.wait_for(asyncio.gather(running, *waiting), 1) == [0, 0, 0, 0]
+
+    run(scenario())
+    assert paused == [None, None, 4242]
+
+
+def test_priority_order(run, config):
+    config("sync_parallelism", 1)
+
+    async def scenario():
+        log = list()
+        blocker = asyncio.create_task(
+            SyncScheduler.submit("45", "path1", SyncPriority.GAME_UPLOAD, make_task(0, log, "blocker", 0.05))
+        )
+        await asyncio.sleep(0)
+        waiting = [
+            SyncScheduler.submit("global", "path1", SyncPriority.GLOBAL_SYNC, make_task(0, log, "global")),
+            SyncScheduler.submit("capture", "path1", SyncPriority.CAPTURE_UPLOAD, make_task(0, log, "capture")),
+            SyncScheduler.submit("46", "path2", SyncPriority.GAME_DOWNLOAD, make_task(0, log, "download")),
+        ]
+        await asyncio.wait_for(asyncio.gather(blocker, *waiting), 1)
+        assert log == ["blocker", "download", "global", "capture"]
+
+    run(scenario())
+
+
+def test_syncs_wait_while_held(run, config, monkeypatch):
+    import cloud_compression
+    from rclone_manager import RcloneManager
+
+    async def scenario():
+        log = list()
+        moving = asyncio.Event()
+        moved = asyncio.Event()
+
+        async def slow_move(source, destination):
+            log.append("move")
+            moving.set()
+            await moved.wait()
+            return 3
+
+        async def create_compress_remote():
+            pass
+
+        monkeypatch.setattr(RcloneManager, "move", slow_move)
+        monkeypatch.setattr(RcloneManager, "create_compress_remote", create_compress_remote)
+        migration = asyncio.create_task(cloud_compression.migrate(True))
+        await moving.wait()
+
+        # A sync submitted during the move waits for it, a second migration is refused
+        submitted = asyncio.create_task(
+            SyncScheduler.submit("47", "path1", SyncPriority.GAME_UPLOAD, make_task(0, log, "sync"))
+        )
+        await asyncio.sleep(0.05)
+        assert log == ["move"]
+        assert SyncScheduler.get_stats()["held"]
+        try:
+            await cloud_compression.migrate(True)
+        except Exception as e:
+            assert str(e) == "SYNC_IN_PROGRESS"
+        else:
+            raise AssertionError("a second migration ran")
+
+        moved.set()
+        assert (await migration)["exit_code"] == 0
+        assert await asyncio.wait_for(submitted, 1) == 0
+        assert log == ["move", "sync"]
+        assert not SyncScheduler.get_stats()["held"]
+
+    config("cloud_compression", False)
+    run(scenario())
+
+
+def test_daemon_restart_waits_for_running_syncs(run, plugin, config, monkeypatch):
+    from config import Config
+    from rclone_manager import RcloneManager
+
+    # Restored by the fixture after the test
+    config("additional_sync_args", Config.get_config_item("additional_sync_args"))
+
+    async def scenario():
+        log = list()
+
+        async def start_daemon():
+            log.append("restart")
+            return False
+
+        monkeypatch.setattr(RcloneManager, "start_daemon", start_daemon)
+        running = asyncio.create_task(
+            SyncScheduler.submit("48", "path1", SyncPriority.GAME_UPLOAD, make_task(0, log, "running", 0.1))
+        )
+        await asyncio.sleep(0.01)
+        await plugin.set_config("additional_sync_args", ["--fast-list"])
+        waiting = asyncio.create_task(
+            SyncScheduler.submit("49", "path1", SyncPriority.GAME_UPLOAD, make_task(0, log, "waiting"))
+        )
+        await asyncio.sleep(0.01)
+        assert log == ["running"]
+
+        assert await asyncio.wait_for(asyncio.gather(running, waiting), 1) == [0, 0]
+        assert log == ["running", "restart", "waiting"]
+        assert not SyncScheduler.get_stats()["held"]
+
+    run(scenario())
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import utils
+from common_defs import PLUGIN_CONFIG_DIR, PLUGIN_STATE_DIR
+from target_registry import TargetRegistry
+
+
+def get_mtime_ns() -> int:
+    return os.stat(PLUGIN_CONFIG_DIR).st_mtime_ns
+
+
+def test_recorded_state_leaves_the_config_directory_alone(plugin, game):
+    TargetRegistry.set_filters(str(game["app_id"]), game["filters"])
+    mtime_ns = get_mtime_ns()
+    TargetRegistry.record_sync(str(game["app_id"]), 0, 1, 4)
+    TargetRegistry.record_file_profile(str(game["app_id"]), {"files": 1, "size": 4})
+    assert get_mtime_ns() == mtime_ns
+
+
+@pytest.mark.rclone
+def test_sync_leaves_the_config_directory_alone(run, plugin, game):
+    run(plugin.set_target_filters(game["app_id"], game["filters"]))
+    (game["save_dir"] / "save.dat").write_bytes(b"save")
+    mtime_ns = get_mtime_ns()
+    assert run(plugin.sync_local_first(game["app_id"])) == 0
+    assert run(plugin.sync_local_first(game["app_id"])) == 0
+    assert get_mtime_ns() == mtime_ns
+
+
+def test_filter_files_changed_out_of_band(game):
+    assert game["app_id"] not in TargetRegistry.get_target_ids()
+    (PLUGIN_CONFIG_DIR / f"{game['app_id']}.filter").write_text("\n".join(game["filters"]))
+    assert game["app_id"] in TargetRegistry.get_target_ids()
+    assert TargetRegistry.get_filters(str(game["app_id"])) == game["filters"]
+
+    (PLUGIN_CONFIG_DIR / f"{game['app_id']}.filter").unlink()
+    assert game["app_id"] not in TargetRegistry.get_target_ids()
+
+
+def test_migrate_state_files():
+    legacy = [PLUGIN_CONFIG_DIR / name for name in ("9999.manifest", "9999.snapshot.json")]
+    for path in legacy:
+        path.write_text("{}")
+    utils.migrate_state_files()
+    for path in legacy:
+        assert not path.exists()
+        assert (PLUGIN_STATE_DIR / path.name).read_text() == "{}"
+        (PLUGIN_STATE_DIR / path.name).unlink()
+
+
+def test_filter_file_edited_in_place(game):
+    TargetRegistry.set_filters(str(game["app_id"]), game["filters"])
+    mtime_ns = get_mtime_ns()
+    with (PLUGIN_CONFIG_DIR / f"{game['app_id']}.filter").open("a") as f:
+        f.write("\n- *.bak")
+    assert get_mtime_ns() == mtime_ns
+    assert TargetRegistry.get_filters(str(game["app_id"])) == game["filters"] + ["- *.bak"]
+
+
+def test_config_writes_do_not_read_the_filter_files_again(run, game, config, monkeypatch):
+    import target_registry
+    from config import Config
+
+    TargetRegistry.set_filters(str(game["app_id"]), game["filters"])
+    TargetRegistry.get_target_ids()
+    reads = list()
+    monkeypatch.setattr(target_registry, "get_filters", lambda path: reads.append(path) or [])
+    config("sync_history_days", Config.get_config_item("sync_history_days") + 1)
+    run(Config.flush())
+    assert game["app_id"] in TargetRegistry.get_target_ids()
+    assert reads == []